@@ -1,5 +1,9 @@
-from config import DEFAULT_MODEL, client
-import json
+from config import DEFAULT_MODEL, STREAM_EXECUTION
+from request_pool import request_pool
+from json_stream import StreamingJSONObjectParser
+from structured_output import parse_json, parse_stats
+from contextlib import aclosing
+import time
 
 class ExecutionNode:
     def __init__(self, name, description, reputation_score):
@@ -11,7 +15,7 @@ class ExecutionNode:
         self.description = description
         self.reputation_score = reputation_score
 
-    def process_task(self, task, expected_format, context=None):
+    def build_messages(self, task, context=None):
         # Build a prompt that asks for a detailed chain-of-thought and a final answer in JSON format.
         prompt = f"You are an AI agent. {self.description}\n"
         if context:
@@ -24,21 +28,126 @@ class ExecutionNode:
             f"Task: {task}\n"
             "Be clear, thorough, and precise in your explanation."
         )
+        return [
+            {"role": "system", "content": f"You are an AI agent. {self.description}"},
+            {"role": "user", "content": prompt}
+        ]
+
+    def report_progress(self, node_name, event, details):
+        """
+        Default progress handler for streamed tasks.
+        """
+        print(f"[{node_name}] {event}: {details}")
+
+    @staticmethod
+    def early_result(parser, call_site):
+        """
+        The fields of a reply whose stream was closed once the answer was complete, counted in parse_stats
+        like replies parsed in full.
+        """
+        parse_stats.record(call_site, "repaired" if parser.repaired else "parsed")
+        return dict(parser.fields)
+
+    def stream_task(self, messages, call_site, on_event=None, stop_after_final_answer=True):
+        """
+        Streams the completion and parses the JSON reply incrementally, reporting progress through
+        on_event(node name, event, details): "first_token" once output starts and "field" whenever a
+        top-level field closes. With stop_after_final_answer, the stream is closed as soon as both
+        "chain_of_thought" and "final_answer" are complete, so the caller can move on right away.
+        """
+        on_event = on_event or self.report_progress
+        parser = StreamingJSONObjectParser()
+        started = time.monotonic()
+        stream = request_pool.stream(
+            call_site=call_site,
+            model=DEFAULT_MODEL,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=12000,
+        )
+        try:
+            for text in stream:
+                if not parser.text:
+                    on_event(self.name, "first_token", {"latency": round(time.monotonic() - started, 3)})
+                for key, _ in parser.feed(text):
+                    on_event(self.name, "field", {"key": key, "latency": round(time.monotonic() - started, 3)})
+                if stop_after_final_answer and "chain_of_thought" in parser.fields and "final_answer" in parser.fields:
+                    return self.early_result(parser, call_site)
+        finally:
+            stream.close()
+        return parse_json(parser.text, call_site)
+
+    async def stream_task_async(self, messages, call_site, on_event=None, stop_after_final_answer=True):
+        """
+        Async version of stream_task.
+        """
+        on_event = on_event or self.report_progress
+        parser = StreamingJSONObjectParser()
+        started = time.monotonic()
+        stream = request_pool.stream_async(
+            call_site=call_site,
+            model=DEFAULT_MODEL,
+            messages=messages,
+            temperature=0.3,
+            max_tokens=12000,
+        )
+        async with aclosing(stream):
+            async for text in stream:
+                if not parser.text:
+                    on_event(self.name, "first_token", {"latency": round(time.monotonic() - started, 3)})
+                for key, _ in parser.feed(text):
+                    on_event(self.name, "field", {"key": key, "latency": round(time.monotonic() - started, 3)})
+                if stop_after_final_answer and "chain_of_thought" in parser.fields and "final_answer" in parser.fields:
+                    return self.early_result(parser, call_site)
+        return parse_json(parser.text, call_site)
+
+    def process_task(self, task, expected_format, context=None, call_site="process_task", on_event=None, stop_after_final_answer=True):
+        """
+        call_site labels the request in the shared request pool (e.g. "validate_with_node" when
+        the node is acting as a validator). With STREAM_EXECUTION enabled the completion is streamed
+        (see stream_task); validators pass stop_after_final_answer=False since their replies carry
+        further fields.
+        """
+        messages = self.build_messages(task, context)
+        print(f"[{self.name}] Processing task...")
+        try:
+            if STREAM_EXECUTION:
+                return self.stream_task(messages, call_site, on_event, stop_after_final_answer)
+            response = request_pool.create(
+                call_site=call_site,
+                model=DEFAULT_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=12000,
+            )
+            result = response.choices[0].message.content.strip()
+            parsed_result = parse_json(result, call_site)
+            return parsed_result
+        except Exception as e:
+            error_msg = f"Error processing task: {e}"
+            print(f"[{self.name}] {error_msg}")
+            return {"chain_of_thought": "", "final_answer": error_msg}
+
+    async def process_task_async(self, task, expected_format, context=None, call_site="process_task", on_event=None, stop_after_final_answer=True):
+        """
+        Same as process_task, but awaits the async client instead of blocking a thread.
+        """
+        messages = self.build_messages(task, context)
         print(f"[{self.name}] Processing task...")
         try:
-            response = client.chat.completions.create(
+            if STREAM_EXECUTION:
+                return await self.stream_task_async(messages, call_site, on_event, stop_after_final_answer)
+            response = await request_pool.create_async(
+                call_site=call_site,
                 model=DEFAULT_MODEL,
-                messages=[
-                    {"role": "system", "content": f"You are an AI agent. {self.description}"},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=messages,
                 temperature=0.3,
                 max_tokens=12000,
             )
             result = response.choices[0].message.content.strip()
-            parsed_result = json.loads(result)
+            parsed_result = parse_json(result, call_site)
             return parsed_result
         except Exception as e:
             error_msg = f"Error processing task: {e}"
             print(f"[{self.name}] {error_msg}")
-            return {"chain_of_thought": "", "final_answer": error_msg}
\ No newline at end of file
+            return {"chain_of_thought": "", "final_answer": error_msg}
@@ -1,21 +1,44 @@
+import re
 import json
 import string
-from config import DEFAULT_MODEL, client, VALIDATORS_COUNT
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import contextvars
+from config import (
+    DEFAULT_MODEL, VALIDATORS_COUNT, LLM_TIEBREAK, ROUTING_TIEBREAK_MARGIN, MAX_CONCURRENT_SUBTASKS,
+    VALIDATION_EARLY_STOP, VALIDATION_CONFIDENCE_Z, VALIDATION_MIN_VOTES, COMPARATIVE_VALIDATION, cassette
+)
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from request_pool import request_pool
+from routing import LazyRoutingIndex
+from scheduler import TaskGraph
+from checkpoint import CheckpointJournal
+from context_builder import ContextBuilder
+from reputation import reputation_store
+from decomposition_cache import decomposition_cache
+from answer_store import answer_store
+from ValidationNode import FAILED_EVALUATION
+from structured_output import parse_json
+from tracing import tracer
+from progress import report_progress
+import time
 import random 
 
+def subtask_span_attributes(manager, task_obj, dependency_results, complex_task=None):
+    return {"subtask_id": task_obj["id"], "dependencies": list(task_obj.get("dependencies", []))}
+
 # ---------------------------
 # Agent Manager
 # ---------------------------
 class ManagingNode:
     def __init__(self, execution_nodes):
         self.execution_nodes = execution_nodes
+        self.routing_index = LazyRoutingIndex(execution_nodes)
+        self.context_builder = ContextBuilder()
+        self.reputation = reputation_store
+        self.decompositions = decomposition_cache
+        self.answers = answer_store
 
-    def analyze_task(self, complex_task):
-        """
-        Decomposes the complex task into subtasks with dependency information.
-        Returns a JSON array of objects with keys: "id", "task", and "dependencies".
-        """
+    def build_decomposition_messages(self, complex_task):
         prompt = (
             "Decompose the following complex task into clear, base-level tasks that can be solved by specialized AI agents. "
             "For each task, provide an 'id' (e.g., T1, T2, ...), a 'task' description, and a list of 'dependencies' (other task IDs that must be completed first). "
@@ -23,31 +46,77 @@ class ManagingNode:
             "Return only a RAW JSON TEXT (without 'json' text at the beginning) array of objects with keys 'id', 'task', and 'dependencies'.\n\n"
             f"Complex Task: {complex_task}"
         )
+        return [
+            {"role": "system", "content": "You are an expert in task decomposition."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def reuse_decomposition(self, subtasks, similarity):
+        print(f"\n[Manager] Reusing a stored decomposition (similarity {similarity:.3f}): {subtasks}\n")
+        return subtasks
+
+    @tracer.traced("decomposition")
+    def analyze_task(self, complex_task):
+        """
+        Decomposes the complex task into subtasks with dependency information.
+        Returns a JSON array of objects with keys: "id", "task", and "dependencies".
+        A decomposition of the same or a near-duplicate task is reused from the decomposition cache.
+        """
+        memoized = self.decompositions.lookup(complex_task)
+        if memoized is not None:
+            return self.reuse_decomposition(*memoized)
+        messages = self.build_decomposition_messages(complex_task)
         print("\n[Manager] Decomposing the complex task into dependent subtasks...\n")
         try:
-            response = client.chat.completions.create(
+            response = request_pool.create(
+                call_site="analyze_task",
                 model=DEFAULT_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an expert in task decomposition."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=messages,
                 temperature=0.3,
                 max_tokens=12000,
             )
             output = response.choices[0].message.content.strip()
-            subtasks = json.loads(output)
+            subtasks = parse_json(output, "analyze_task", expect=list)
             if not isinstance(subtasks, list):
                 subtasks = [subtasks]
+            self.decompositions.store(complex_task, subtasks)
         except Exception as e:
             print(f"Error in task decomposition: {e}")
             subtasks = [{"id": "T1", "task": complex_task, "dependencies": []}]
         print(f"[Manager] Identified subtasks (with dependencies): {subtasks}\n")
         return subtasks
 
-    def compute_match_score(self, subtask, description):
+    @tracer.traced("decomposition")
+    async def analyze_task_async(self, complex_task):
         """
-        Computes a match score (from 1 to 10) indicating how well the agent's description fits the subtask.
+        Async version of analyze_task.
         """
+        # The lookup may embed the task, which is blocking, so it runs off the loop.
+        memoized = await asyncio.to_thread(self.decompositions.lookup, complex_task)
+        if memoized is not None:
+            return self.reuse_decomposition(*memoized)
+        messages = self.build_decomposition_messages(complex_task)
+        print("\n[Manager] Decomposing the complex task into dependent subtasks...\n")
+        try:
+            response = await request_pool.create_async(
+                call_site="analyze_task",
+                model=DEFAULT_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=12000,
+            )
+            output = response.choices[0].message.content.strip()
+            subtasks = parse_json(output, "analyze_task", expect=list)
+            if not isinstance(subtasks, list):
+                subtasks = [subtasks]
+            await asyncio.to_thread(self.decompositions.store, complex_task, subtasks)
+        except Exception as e:
+            print(f"Error in task decomposition: {e}")
+            subtasks = [{"id": "T1", "task": complex_task, "dependencies": []}]
+        print(f"[Manager] Identified subtasks (with dependencies): {subtasks}\n")
+        return subtasks
+
+    def build_match_score_messages(self, subtask, description):
         prompt = (
             "You are an expert evaluator. Please rate on a scale of 1 to 10 how well the following "
             "agent description matches the given subtask. Provide only the number as your answer.\n\n"
@@ -55,13 +124,29 @@ class ManagingNode:
             f"Agent Description: {description}\n"
             "Answer (number only):"
         )
+        return [
+            {"role": "system", "content": "You are an expert evaluator of task-agent compatibility."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def fallback_match_score(self, subtask, description, error):
+        print(f"[Manager] LLM failed to compute match score: {error}. Falling back to simple matching.")
+        translator = str.maketrans('', '', string.punctuation)
+        subtask_words = set(subtask.translate(translator).lower().split())
+        desc_words = set(description.translate(translator).lower().split())
+        fallback_score = len(subtask_words.intersection(desc_words))
+        print(f"[Manager] Fallback match score: {fallback_score} for agent description: '{description}'")
+        return fallback_score
+
+    def compute_match_score(self, subtask, description):
+        """
+        Computes a match score (from 1 to 10) indicating how well the agent's description fits the subtask.
+        """
         try:
-            response = client.chat.completions.create(
+            response = request_pool.create(
+                call_site="compute_match_score",
                 model=DEFAULT_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an expert evaluator of task-agent compatibility."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self.build_match_score_messages(subtask, description),
                 temperature=0,
                 max_tokens=1200,
             )
@@ -70,22 +155,34 @@ class ManagingNode:
             print(f"[Manager] LLM computed match score: {score} for agent description: '{description}'")
             return score
         except Exception as e:
-            print(f"[Manager] LLM failed to compute match score: {e}. Falling back to simple matching.")
-            translator = str.maketrans('', '', string.punctuation)
-            subtask_words = set(subtask.translate(translator).lower().split())
-            desc_words = set(description.translate(translator).lower().split())
-            fallback_score = len(subtask_words.intersection(desc_words))
-            print(f"[Manager] Fallback match score: {fallback_score} for agent description: '{description}'")
-            return fallback_score
+            return self.fallback_match_score(subtask, description, e)
 
-    def assign_execution_nodes(self, subtask):
+    async def compute_match_score_async(self, subtask, description):
+        try:
+            response = await request_pool.create_async(
+                call_site="compute_match_score",
+                model=DEFAULT_MODEL,
+                messages=self.build_match_score_messages(subtask, description),
+                temperature=0,
+                max_tokens=1200,
+            )
+            result = response.choices[0].message.content.strip()
+            score = int(''.join(filter(str.isdigit, result)))
+            print(f"[Manager] LLM computed match score: {score} for agent description: '{description}'")
+            return score
+        except Exception as e:
+            return self.fallback_match_score(subtask, description, e)
+
+    def agents_needed(self, subtask):
         """
-        Uses LLM reasoning to decide which agents to assign for a given subtask.
-        Prioritizes agents based on their description match and reputation score.
-        Returns a tuple (list of chosen nodes, expected response format).
+        Number of agents to assign, based on the length of the subtask description.
         """
+        word_count = len(subtask.split())
+        return 1 if word_count < 20 else (2 if word_count < 40 else 3)
+
+    def build_delegation_messages(self, subtask, candidates, domain):
         agents_info = "\n".join(
-            [f"{node.name}: {node.description} (Reputation score: {node.reputation_score})" for node in self.execution_nodes]
+            [f"{node.name}: {node.description} (Reputation score: {self.reputation.reputation(node, domain):.0f})" for node in candidates]
         )
 
         prompt = (
@@ -97,100 +194,355 @@ class ManagingNode:
             "Agents:\n" + agents_info + "\n\n"
             "Return your answer as a RAW JSON TEXT (without the word 'json' at the beginning) array of agent names (e.g., [\"Node_A\", \"Node_C\"]). Only return the JSON array."
         )
+        return [
+            {"role": "system", "content": "You are an expert in AI agent task delegation."},
+            {"role": "user", "content": prompt}
+        ]
 
-        try:
-            response = client.chat.completions.create(
-                model=DEFAULT_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an expert in AI agent task delegation."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=12000,
-            )
-            output = response.choices[0].message.content.strip()
-            print(f"[Manager] LLM delegation response: {output}")
-            
-            chosen_names = json.loads(output)
-            chosen_nodes = [node for node in self.execution_nodes if node.name in chosen_names]
-            
-            if not chosen_nodes:
-                raise ValueError("LLM did not return any valid agent names.")
-            
-            expected_format = "json"
-            return chosen_nodes, expected_format
+    def chosen_by_delegation(self, response, candidates):
+        output = response.choices[0].message.content.strip()
+        print(f"[Manager] LLM delegation response: {output}")
+
+        chosen_names = parse_json(output, "assign_execution_nodes", expect=list)
+        chosen_nodes = [node for node in candidates if node.name in chosen_names]
+
+        if not chosen_nodes:
+            raise ValueError("LLM did not return any valid agent names.")
+        return chosen_nodes
+
+    def delegate_with_llm(self, subtask, candidates):
+        """
+        Asks the LLM which of the candidate agents are best suited for the subtask.
+        Returns the list of chosen nodes (in candidate order); raises if no valid agent was returned.
+        """
+        response = request_pool.create(
+            call_site="assign_execution_nodes",
+            model=DEFAULT_MODEL,
+            messages=self.build_delegation_messages(subtask, candidates, self.reputation.domain_of(subtask)),
+            temperature=0.3,
+            max_tokens=12000,
+        )
+        return self.chosen_by_delegation(response, candidates)
 
+    async def delegate_with_llm_async(self, subtask, candidates):
+        domain = await self.reputation.domain_of_async(subtask)
+        response = await request_pool.create_async(
+            call_site="assign_execution_nodes",
+            model=DEFAULT_MODEL,
+            messages=self.build_delegation_messages(subtask, candidates, domain),
+            temperature=0.3,
+            max_tokens=12000,
+        )
+        return self.chosen_by_delegation(response, candidates)
+
+    def top_scored_nodes(self, subtask, match_scores, domain):
+        """
+        The agents_needed(subtask) nodes with the best blend of match score and reputation.
+        """
+        scored_nodes = []
+        for node, match_score in zip(self.execution_nodes, match_scores):
+            reputation_weight = self.reputation.reputation(node, domain) / 100  # Normalize reputation (0-1 range)
+            final_score = (match_score * 0.7) + (reputation_weight * 0.3)  # Weighted scoring
+            scored_nodes.append((final_score, node))
+
+        # Sort nodes by final weighted score and select the top agents
+        scored_nodes.sort(key=lambda x: x[0], reverse=True)
+        return [node for _, node in scored_nodes[:self.agents_needed(subtask)]]
+
+    def assign_with_llm(self, subtask):
+        """
+        Uses LLM reasoning over all agents to decide which agents to assign for a given subtask,
+        falling back to per-agent match scoring if the delegation call fails.
+        Returns the list of chosen nodes.
+        """
+        try:
+            return self.delegate_with_llm(subtask, self.execution_nodes)
         except Exception as e:
             print(f"[Manager] LLM failed to assign agents: {e}. Falling back to heuristic assignment.")
-            
             # Compute scores based on description match and reputation score
-            word_count = len(subtask.split())
-            num_agents = 1 if word_count < 20 else (2 if word_count < 40 else 3)
-
-            scored_nodes = []
-            for node in self.execution_nodes:
-                match_score = self.compute_match_score(subtask, node.description)
-                reputation_weight = node.reputation_score / 100  # Normalize reputation (0-1 range)
-                final_score = (match_score * 0.7) + (reputation_weight * 0.3)  # Weighted scoring
-                scored_nodes.append((final_score, node))
-
-            # Sort nodes by final weighted score and select the top agents
-            scored_nodes.sort(key=lambda x: x[0], reverse=True)
-            chosen_nodes = [node for _, node in scored_nodes[:num_agents]]
-            expected_format = "json"
-            return chosen_nodes, expected_format
+            match_scores = [self.compute_match_score(subtask, node.description) for node in self.execution_nodes]
+            return self.top_scored_nodes(subtask, match_scores, self.reputation.domain_of(subtask))
 
-    def validate_with_node(self, node, task, response, context):
+    async def assign_with_llm_async(self, subtask):
+        try:
+            return await self.delegate_with_llm_async(subtask, self.execution_nodes)
+        except Exception as e:
+            print(f"[Manager] LLM failed to assign agents: {e}. Falling back to heuristic assignment.")
+            match_scores = await asyncio.gather(
+                *(self.compute_match_score_async(subtask, node.description) for node in self.execution_nodes)
+            )
+            return self.top_scored_nodes(subtask, match_scores, await self.reputation.domain_of_async(subtask))
+
+    def tiebreak_contenders(self, ranked, num_agents):
         """
-        Uses an execution node (via its normal process_task method) to evaluate a previously produced answer.
-        Returns a tuple: (node name, evaluation dict, aggregated average score).
+        Returns (settled, contenders) if the selection cut-off of the index ranking is ambiguous, else None:
+        agents clearly above the cut-off keep their slot, and the LLM picks among the tied ones.
         """
-        validation_prompt = (
-            "You are an AI evaluator. Your task is to assess the following answer to a given task. "
-            "Evaluate the answer based on the following criteria:\n"
-            "1. Logical Coherence (0-10)\n"
-            "2. Completeness (0-10)\n"
-            "3. Correctness (0-10)\n"
-            "4. Clarity (0-10)\n"
-            "5. Instruction-Following (0-10)\n\n"
-            f"Task: {task}\n"
-            f"Response: {json.dumps(response)}\n"
-            f"Context: {context if context else 'None'}\n\n"
-            "Return your evaluation as RAW JSON (without the word 'json' at the beginning) with the following keys:\n"
-            '{\n'
-            '  "logical_coherence": <number>,\n'
-            '  "completeness": <number>,\n'
-            '  "correctness": <number>,\n'
-            '  "clarity": <number>,\n'
-            '  "instruction_following": <number>,\n'
-            '  "final_verdict": "Accepted" or "Rejected",\n'
-            '  "improvement_suggestions": "<brief feedback>"\n'
-            '}'
-        )
-        print(f"[{node.name}] Validating response for task: '{task}'")
+        if not LLM_TIEBREAK or len(ranked) <= num_agents:
+            return None
+        cutoff = ranked[num_agents - 1][0]
+        if cutoff - ranked[num_agents][0] >= ROUTING_TIEBREAK_MARGIN:
+            return None
+        settled = [node for score, node in ranked if score - cutoff >= ROUTING_TIEBREAK_MARGIN]
+        contenders = [node for score, node in ranked if abs(score - cutoff) < ROUTING_TIEBREAK_MARGIN]
+        print(f"[Manager] Near-tie between {[node.name for node in contenders]}; asking LLM to break it.")
+        return settled, contenders
+
+    @staticmethod
+    def break_tie(settled, contenders, picked, num_agents):
+        chosen_nodes = settled + [node for node in picked if node not in settled]
+        for node in contenders:
+            if len(chosen_nodes) >= num_agents:
+                break
+            if node not in chosen_nodes:
+                chosen_nodes.append(node)
+        return chosen_nodes[:num_agents]
+
+    @tracer.traced("delegation")
+    def assign_execution_nodes(self, subtask):
+        """
+        Decides which agents to assign for a given subtask using the embedding routing index,
+        which ranks agents by description match and learned reputation in a single vectorized pass.
+        The LLM delegation call is only used as a tie-breaker when the selection cut-off is ambiguous.
+        Returns a tuple (list of chosen nodes, expected response format).
+        """
+        expected_format = "json"
+        num_agents = self.agents_needed(subtask)
+
         try:
-            # Use the node’s standard process_task to perform validation
-            eval_result = node.process_task(validation_prompt, expected_format="json", context=context)
-            avg_score = (
-                eval_result.get("logical_coherence", 0) +
-                eval_result.get("completeness", 0) +
-                eval_result.get("correctness", 0) +
-                eval_result.get("clarity", 0) +
-                eval_result.get("instruction_following", 0)
-            ) / 5
-            return (node.name, eval_result, avg_score)
+            index = self.routing_index.get()
+            domain = self.reputation.domain_of(subtask)
+            ranked = index.rank(subtask, [self.reputation.reputation(node, domain) for node in index.execution_nodes])
         except Exception as e:
-            print(f"[{node.name}] Error during validation: {e}")
-            fallback_evaluation = {
-                "logical_coherence": 0,
-                "completeness": 0,
-                "correctness": 0,
-                "clarity": 0,
-                "instruction_following": 0,
-                "final_verdict": "Rejected",
-                "improvement_suggestions": "Evaluation failed due to an error."
+            print(f"[Manager] Routing index unavailable: {e}. Falling back to LLM delegation.")
+            return self.assign_with_llm(subtask), expected_format
+
+        chosen_nodes = [node for _, node in ranked[:num_agents]]
+
+        tie = self.tiebreak_contenders(ranked, num_agents)
+        if tie:
+            settled, contenders = tie
+            try:
+                chosen_nodes = self.break_tie(settled, contenders, self.delegate_with_llm(subtask, contenders), num_agents)
+            except Exception as e:
+                print(f"[Manager] LLM tie-break failed: {e}. Keeping the index ranking.")
+
+        print(f"[Manager] Routed subtask to agents: {[node.name for node in chosen_nodes]}")
+        return chosen_nodes, expected_format
+
+    @tracer.traced("delegation")
+    async def assign_execution_nodes_async(self, subtask):
+        """
+        Async version of assign_execution_nodes: embeddings and the LLM tie-break or fallback are awaited.
+        """
+        expected_format = "json"
+        num_agents = self.agents_needed(subtask)
+
+        try:
+            index = await self.routing_index.get_async()
+            domain = await self.reputation.domain_of_async(subtask)
+            ranked = await index.rank_async(subtask, [self.reputation.reputation(node, domain) for node in index.execution_nodes])
+        except Exception as e:
+            print(f"[Manager] Routing index unavailable: {e}. Falling back to LLM delegation.")
+            return await self.assign_with_llm_async(subtask), expected_format
+
+        chosen_nodes = [node for _, node in ranked[:num_agents]]
+
+        tie = self.tiebreak_contenders(ranked, num_agents)
+        if tie:
+            settled, contenders = tie
+            try:
+                picked = await self.delegate_with_llm_async(subtask, contenders)
+                chosen_nodes = self.break_tie(settled, contenders, picked, num_agents)
+            except Exception as e:
+                print(f"[Manager] LLM tie-break failed: {e}. Keeping the index ranking.")
+
+        print(f"[Manager] Routed subtask to agents: {[node.name for node in chosen_nodes]}")
+        return chosen_nodes, expected_format
+
+    def pick_validators(self, *validated):
+        # Pick a subset of nodes as validators
+        if len(self.execution_nodes) <= VALIDATORS_COUNT:
+            return self.execution_nodes
+        # Recorded and replayed runs seed the draw with what is being validated, so a replay asks the
+        # same validators regardless of thread interleaving.
+        rng = random.Random(json.dumps(validated, sort_keys=True, default=str)) if cassette is not None else random
+        return rng.sample(self.execution_nodes, VALIDATORS_COUNT)
+
+    @staticmethod
+    def trimmed_mean(votes):
+        if len(votes) > 2:
+            sorted_votes = sorted(votes)
+            trimmed_votes = sorted_votes[1:-1]
+            return sum(trimmed_votes) / len(trimmed_votes)
+        return sum(votes) / len(votes)
+
+    def quorum_decided(self, votes, remaining, threshold):
+        """
+        Sequential-decision check for a validator quorum. Returns True once collecting the remaining
+        votes can no longer change whether the trimmed mean reaches the threshold (every missing vote
+        could still be anywhere between 0 and 10), or, if VALIDATION_CONFIDENCE_Z is set, once the
+        confidence interval around the mean of the votes so far lies entirely on one side of it.
+        """
+        if not VALIDATION_EARLY_STOP or not votes or remaining == 0:
+            return False
+        lowest = self.trimmed_mean(votes + [0] * remaining)
+        highest = self.trimmed_mean(votes + [10] * remaining)
+        if lowest >= threshold or highest < threshold:
+            return True
+        if VALIDATION_CONFIDENCE_Z is not None and len(votes) >= VALIDATION_MIN_VOTES:
+            mean = sum(votes) / len(votes)
+            variance = sum((vote - mean) ** 2 for vote in votes) / (len(votes) - 1)
+            margin = VALIDATION_CONFIDENCE_Z * (variance / len(votes)) ** 0.5
+            return mean - margin >= threshold or mean + margin < threshold
+        return False
+
+    def collect_votes(self, task_obj, resp, context, threshold):
+        """
+        Validates a response concurrently with a sample of execution nodes.
+        Stops waiting (and cancels validators that have not started) as soon as the quorum is decided.
+        Returns the list of validation scores received (0 for validators that raised).
+        """
+        votes = []
+        validators = self.pick_validators(task_obj["task"], resp)
+        executor = ThreadPoolExecutor(max_workers=len(validators))
+        try:
+            future_to_validator = {
+                executor.submit(contextvars.copy_context().run, self.validate_with_node, validator, task_obj["task"], resp, context): validator
+                for validator in validators
             }
-            return (node.name, fallback_evaluation, 0)
+            for future in as_completed(future_to_validator):
+                try:
+                    result_tuple = future.result()
+                    score = result_tuple[2]
+                    votes.append(score)
+                except Exception as e:
+                    print(f"[Manager] Validation error for task {task_obj['id']}: {e}")
+                    votes.append(0)
+                remaining = len(validators) - len(votes)
+                if self.quorum_decided(votes, remaining, threshold):
+                    if remaining:
+                        print(f"[Manager] Validation of task {task_obj['id']} decided after {len(votes)} votes; "
+                              f"skipping {remaining} remaining validators.")
+                    break
+        finally:
+            # Validator calls already in flight finish in the background; their votes are ignored.
+            executor.shutdown(wait=False, cancel_futures=True)
+        return votes
+
+    async def collect_votes_async(self, task_obj, resp, context, threshold):
+        """
+        Async version of collect_votes; all validators run as coroutines on the event loop and the
+        ones still pending are cancelled once the quorum is decided.
+        """
+        validators = self.pick_validators(task_obj["task"], resp)
+        pending = {
+            asyncio.create_task(self.validate_with_node_async(validator, task_obj["task"], resp, context))
+            for validator in validators
+        }
+        votes = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        votes.append(future.result()[2])
+                    except Exception as e:
+                        print(f"[Manager] Validation error for task {task_obj['id']}: {e}")
+                        votes.append(0)
+                if self.quorum_decided(votes, len(pending), threshold):
+                    if pending:
+                        print(f"[Manager] Validation of task {task_obj['id']} decided after {len(votes)} votes; "
+                              f"cancelling {len(pending)} remaining validators.")
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return votes
+
+    def collect_comparative_votes(self, task_obj, responses, context, threshold):
+        """
+        Validates all candidate responses at once: each sampled validator scores every candidate in a
+        single call. Stops once the quorum is decided for every candidate.
+        Returns one list of validation scores per candidate.
+        """
+        votes = [[] for _ in responses]
+        validators = self.pick_validators(task_obj["task"], responses)
+        executor = ThreadPoolExecutor(max_workers=len(validators))
+        try:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self.validate_candidates_with_node, validator, task_obj["task"], responses, context)
+                for validator in validators
+            ]
+            received = 0
+            for future in as_completed(futures):
+                try:
+                    scores = future.result()[2]
+                except Exception as e:
+                    print(f"[Manager] Validation error for task {task_obj['id']}: {e}")
+                    scores = [0] * len(responses)
+                for candidate_votes, score in zip(votes, scores):
+                    candidate_votes.append(score)
+                received += 1
+                remaining = len(validators) - received
+                if all(self.quorum_decided(candidate_votes, remaining, threshold) for candidate_votes in votes):
+                    if remaining:
+                        print(f"[Manager] Validation of task {task_obj['id']} decided after {received} votes; "
+                              f"skipping {remaining} remaining validators.")
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return votes
+
+    async def collect_comparative_votes_async(self, task_obj, responses, context, threshold):
+        """
+        Async version of collect_comparative_votes.
+        """
+        votes = [[] for _ in responses]
+        validators = self.pick_validators(task_obj["task"], responses)
+        pending = {
+            asyncio.create_task(self.validate_candidates_with_node_async(validator, task_obj["task"], responses, context))
+            for validator in validators
+        }
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        scores = future.result()[2]
+                    except Exception as e:
+                        print(f"[Manager] Validation error for task {task_obj['id']}: {e}")
+                        scores = [0] * len(responses)
+                    for candidate_votes, score in zip(votes, scores):
+                        candidate_votes.append(score)
+                if all(self.quorum_decided(candidate_votes, len(pending), threshold) for candidate_votes in votes):
+                    if pending:
+                        print(f"[Manager] Validation of task {task_obj['id']} decided after {len(votes[0])} votes; "
+                              f"cancelling {len(pending)} remaining validators.")
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return votes
+
+    @tracer.traced("execution", attributes=lambda self, node, *args: {"node": node.name})
+    def execute_with_node(self, node, task, expected_format, context):
+        started = time.monotonic()
+        resp = node.process_task(task, expected_format, context)
+        self.reputation.record_latency(node.name, self.reputation.domain_of(task), time.monotonic() - started)
+        return resp
+
+    @tracer.traced("execution", attributes=lambda self, node, *args: {"node": node.name})
+    async def execute_with_node_async(self, node, task, expected_format, context):
+        started = time.monotonic()
+        resp = await node.process_task_async(task, expected_format, context)
+        domain = await self.reputation.domain_of_async(task)
+        self.reputation.record_latency(node.name, domain, time.monotonic() - started)
+        return resp
 
     def process_single_task(self, task_obj, context):
         max_attempts = 3
@@ -198,17 +550,19 @@ class ManagingNode:
         best_response = None
         best_avg_score = -1
         attempt = 0
+        domain = self.reputation.domain_of(task_obj["task"])
 
         while attempt < max_attempts:
             attempt += 1
             print(f"[Manager] Processing subtask {task_obj['id']} (attempt {attempt})")
             nodes, expected_format = self.assign_execution_nodes(task_obj["task"])
+            report_progress("assignment", subtask_id=task_obj["id"], attempt=attempt, nodes=[node.name for node in nodes])
 
             # Execute the subtask concurrently across the chosen execution nodes.
             responses = []
             with ThreadPoolExecutor(max_workers=len(nodes)) as executor:
                 future_to_node = {
-                    executor.submit(node.process_task, task_obj["task"], expected_format, context): node
+                    executor.submit(contextvars.copy_context().run, self.execute_with_node, node, task_obj["task"], expected_format, context): node
                     for node in nodes
                 }
                 for future in as_completed(future_to_node):
@@ -219,32 +573,18 @@ class ManagingNode:
                     except Exception as e:
                         print(f"[Manager] Error processing task {task_obj['id']} by {node.name}: {e}")
 
-            # Validate each response concurrently using execution nodes.
+            # Validate the responses using execution nodes: all candidates in one call per validator
+            # in comparative mode, otherwise each response separately.
+            if COMPARATIVE_VALIDATION and len(responses) > 1:
+                all_votes = self.collect_comparative_votes(task_obj, [resp for _, resp in responses], context, threshold)
+            else:
+                all_votes = [self.collect_votes(task_obj, resp, context, threshold) for _, resp in responses]
             validated_results = []
-            for node, resp in responses:
-                votes = []
-                # Pick a subset of nodes as validators
-                validators = self.execution_nodes if len(self.execution_nodes) <= VALIDATORS_COUNT else random.sample(self.execution_nodes, VALIDATORS_COUNT)
-                with ThreadPoolExecutor(max_workers=len(validators)) as executor:
-                    future_to_validator = {
-                        executor.submit(self.validate_with_node, validator, task_obj["task"], resp, context): validator
-                        for validator in validators
-                    }
-                    for future in as_completed(future_to_validator):
-                        try:
-                            result_tuple = future.result()
-                            score = result_tuple[2]
-                            votes.append(score)
-                        except Exception as e:
-                            print(f"[Manager] Validation error for task {task_obj['id']}: {e}")
-                            votes.append(0)
+            for (node, resp), votes in zip(responses, all_votes):
                 if votes:
-                    if len(votes) > 2:
-                        sorted_votes = sorted(votes)
-                        trimmed_votes = sorted_votes[1:-1]
-                        avg_score = sum(trimmed_votes) / len(trimmed_votes)
-                    else:
-                        avg_score = sum(votes) / len(votes)
+                    avg_score = self.trimmed_mean(votes)
+                    self.reputation.record_validation(node.name, domain, avg_score, avg_score >= threshold)
+                    report_progress("validation", subtask_id=task_obj["id"], node=node.name, score=avg_score, accepted=avg_score >= threshold)
                     validated_results.append((node, resp, avg_score))
                     print(f"[Manager] Agent {node.name} obtained average validation score: {avg_score}")
                     if avg_score > best_avg_score:
@@ -261,29 +601,13 @@ class ManagingNode:
                     print(f"[Manager] None of the responses for subtask {task_obj['id']} met the threshold of {threshold}.")
                     node = best_candidate[0]
                     improved_context = context + "\nPlease review your previous reasoning and final answer, identify any weaknesses, and provide an improved version."
-                    improved_resp = node.process_task(task_obj["task"], expected_format, improved_context)
-                    votes = []
-                    validators = self.execution_nodes if len(self.execution_nodes) <= VALIDATORS_COUNT else random.sample(self.execution_nodes, VALIDATORS_COUNT)
-                    with ThreadPoolExecutor(max_workers=len(validators)) as executor:
-                        future_to_validator = {
-                            executor.submit(self.validate_with_node, validator, task_obj["task"], improved_resp, context): validator
-                            for validator in validators
-                        }
-                        for future in as_completed(future_to_validator):
-                            try:
-                                result_tuple = future.result()
-                                score = result_tuple[2]
-                                votes.append(score)
-                            except Exception as e:
-                                print(f"[Manager] Validation error for improved response for task {task_obj['id']}: {e}")
-                                votes.append(0)
+                    with tracer.span("improvement", node=node.name):
+                        improved_resp = node.process_task(task_obj["task"], expected_format, improved_context)
+                        votes = self.collect_votes(task_obj, improved_resp, context, threshold)
                     if votes:
-                        if len(votes) > 2:
-                            sorted_votes = sorted(votes)
-                            trimmed_votes = sorted_votes[1:-1]
-                            avg_score = sum(trimmed_votes) / len(trimmed_votes)
-                        else:
-                            avg_score = sum(votes) / len(votes)
+                        avg_score = self.trimmed_mean(votes)
+                        self.reputation.record_validation(node.name, domain, avg_score, avg_score >= threshold)
+                        report_progress("validation", subtask_id=task_obj["id"], node=node.name, score=avg_score, accepted=avg_score >= threshold)
                         print(f"[Manager] Improved response got average validation score: {avg_score}")
                         if avg_score >= threshold:
                             return node.name, improved_resp, avg_score
@@ -299,11 +623,86 @@ class ManagingNode:
             print(f"[Manager] No valid response obtained for subtask {task_obj['id']}.")
             return "NoAgent", {"chain_of_thought": "", "final_answer": "No valid response obtained"}, 0
 
-    def analyze_additional_steps(self, subtask_id, subtask_text, result):
+    async def process_single_task_async(self, task_obj, context):
         """
-        After obtaining and validating a subtask result, determine if additional steps are needed.
-        Returns a JSON array of additional steps (each with "id", "task", and "blocking" flag).
+        Async version of process_single_task. Executions and validations are coroutines awaited with
+        asyncio.gather, so cancelling the subtask cancels every LLM call it has in flight.
         """
+        max_attempts = 3
+        threshold = 7  # Acceptance threshold for average validation score
+        best_response = None
+        best_avg_score = -1
+        attempt = 0
+        domain = await self.reputation.domain_of_async(task_obj["task"])
+
+        while attempt < max_attempts:
+            attempt += 1
+            print(f"[Manager] Processing subtask {task_obj['id']} (attempt {attempt})")
+            nodes, expected_format = await self.assign_execution_nodes_async(task_obj["task"])
+            report_progress("assignment", subtask_id=task_obj["id"], attempt=attempt, nodes=[node.name for node in nodes])
+
+            # Execute the subtask concurrently across the chosen execution nodes.
+            results = await asyncio.gather(
+                *(self.execute_with_node_async(node, task_obj["task"], expected_format, context) for node in nodes),
+                return_exceptions=True
+            )
+            responses = []
+            for node, resp in zip(nodes, results):
+                if isinstance(resp, Exception):
+                    print(f"[Manager] Error processing task {task_obj['id']} by {node.name}: {resp}")
+                else:
+                    responses.append((node, resp))
+
+            # Validate all responses at once.
+            if COMPARATIVE_VALIDATION and len(responses) > 1:
+                all_votes = await self.collect_comparative_votes_async(task_obj, [resp for _, resp in responses], context, threshold)
+            else:
+                all_votes = await asyncio.gather(*(self.collect_votes_async(task_obj, resp, context, threshold) for _, resp in responses))
+            validated_results = []
+            for (node, resp), votes in zip(responses, all_votes):
+                if votes:
+                    avg_score = self.trimmed_mean(votes)
+                    self.reputation.record_validation(node.name, domain, avg_score, avg_score >= threshold)
+                    report_progress("validation", subtask_id=task_obj["id"], node=node.name, score=avg_score, accepted=avg_score >= threshold)
+                    validated_results.append((node, resp, avg_score))
+                    print(f"[Manager] Agent {node.name} obtained average validation score: {avg_score}")
+                    if avg_score > best_avg_score:
+                        best_avg_score = avg_score
+                        best_response = (node, resp, avg_score)
+
+            if validated_results:
+                best_candidate = max(validated_results, key=lambda x: x[2])
+                if best_candidate[2] >= threshold:
+                    print(f"[Manager] Best candidate for subtask {task_obj['id']} on attempt {attempt}: "
+                          f"Agent {best_candidate[0].name} with average score {best_candidate[2]}")
+                    return best_candidate[0].name, best_candidate[1], best_candidate[2]
+                else:
+                    print(f"[Manager] None of the responses for subtask {task_obj['id']} met the threshold of {threshold}.")
+                    node = best_candidate[0]
+                    improved_context = context + "\nPlease review your previous reasoning and final answer, identify any weaknesses, and provide an improved version."
+                    with tracer.span("improvement", node=node.name):
+                        improved_resp = await node.process_task_async(task_obj["task"], expected_format, improved_context)
+                        votes = await self.collect_votes_async(task_obj, improved_resp, context, threshold)
+                    if votes:
+                        avg_score = self.trimmed_mean(votes)
+                        self.reputation.record_validation(node.name, domain, avg_score, avg_score >= threshold)
+                        report_progress("validation", subtask_id=task_obj["id"], node=node.name, score=avg_score, accepted=avg_score >= threshold)
+                        print(f"[Manager] Improved response got average validation score: {avg_score}")
+                        if avg_score >= threshold:
+                            return node.name, improved_resp, avg_score
+                        else:
+                            print(f"[Manager] Improved response still did not meet threshold. Retrying...")
+            else:
+                print(f"[Manager] No valid responses received for subtask {task_obj['id']} on attempt {attempt}.")
+
+        if best_response:
+            print(f"[Manager] Returning best available response for subtask {task_obj['id']} with average score {best_avg_score}")
+            return best_response[0].name, best_response[1], best_avg_score
+        else:
+            print(f"[Manager] No valid response obtained for subtask {task_obj['id']}.")
+            return "NoAgent", {"chain_of_thought": "", "final_answer": "No valid response obtained"}, 0
+
+    def build_additional_steps_messages(self, subtask_id, subtask_text, result):
         prompt = (
             "You are an expert analyst. Based on the validated result of a subtask, determine whether any additional steps are required "
             "to ensure the overall solution is complete and correct. If additional steps are needed, return a RAW JSON TEXT (without 'json' text at the beginning) array of objects, "
@@ -314,19 +713,29 @@ class ManagingNode:
             f"Validated Result: {json.dumps(result)}\n\n"
             "Return only the RAW JSON TEXT (without 'json' text at the beginning) array."
         )
+        return [
+            {"role": "system", "content": "You are an expert analyst for additional task identification."},
+            {"role": "user", "content": prompt}
+        ]
+
+    @tracer.traced("additional_steps")
+    def analyze_additional_steps(self, subtask_id, subtask_text, result):
+        """
+        After obtaining and validating a subtask result, determine if additional steps are needed.
+        Returns a JSON array of additional steps (each with "id", "task", and "blocking" flag).
+        """
+        messages = self.build_additional_steps_messages(subtask_id, subtask_text, result)
         print(f"[Manager] Analyzing additional steps for subtask {subtask_id}...")
         try:
-            response = client.chat.completions.create(
+            response = request_pool.create(
+                call_site="analyze_additional_steps",
                 model=DEFAULT_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an expert analyst for additional task identification."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=messages,
                 temperature=0.3,
                 max_tokens=12000,
             )
             output = response.choices[0].message.content.strip()
-            additional_steps = json.loads(output)
+            additional_steps = parse_json(output, "analyze_additional_steps", expect=list)
             if not isinstance(additional_steps, list):
                 additional_steps = [additional_steps]
             print(f"[Manager] Additional steps suggested for {subtask_id}: {additional_steps}")
@@ -335,12 +744,33 @@ class ManagingNode:
             print(f"[Manager] Failed to analyze additional steps for subtask {subtask_id}: {e}")
             return []
 
-    def validate_with_node(self, node, task, response, context):
+    @tracer.traced("additional_steps")
+    async def analyze_additional_steps_async(self, subtask_id, subtask_text, result):
         """
-        Uses an execution node (via its normal process_task method) to evaluate a previously produced answer.
-        Returns a tuple: (node name, evaluation dict, aggregated average score).
+        Async version of analyze_additional_steps.
         """
-        validation_prompt = (
+        messages = self.build_additional_steps_messages(subtask_id, subtask_text, result)
+        print(f"[Manager] Analyzing additional steps for subtask {subtask_id}...")
+        try:
+            response = await request_pool.create_async(
+                call_site="analyze_additional_steps",
+                model=DEFAULT_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=12000,
+            )
+            output = response.choices[0].message.content.strip()
+            additional_steps = parse_json(output, "analyze_additional_steps", expect=list)
+            if not isinstance(additional_steps, list):
+                additional_steps = [additional_steps]
+            print(f"[Manager] Additional steps suggested for {subtask_id}: {additional_steps}")
+            return additional_steps
+        except Exception as e:
+            print(f"[Manager] Failed to analyze additional steps for subtask {subtask_id}: {e}")
+            return []
+
+    def build_validation_prompt(self, task, response, context):
+        return (
             "You are an AI evaluator. Your task is to assess the following answer to a given task. "
             "Evaluate the answer based on the following criteria:\n"
             "1. Logical Coherence (0-10)\n"
@@ -362,99 +792,300 @@ class ManagingNode:
             '  "improvement_suggestions": "<brief feedback>"\n'
             '}'
         )
+
+    @staticmethod
+    def evaluation_score(eval_result):
+        return (
+            eval_result.get("logical_coherence", 0) +
+            eval_result.get("completeness", 0) +
+            eval_result.get("correctness", 0) +
+            eval_result.get("clarity", 0) +
+            eval_result.get("instruction_following", 0)
+        ) / 5
+
+    @tracer.traced("validator", attributes=lambda self, node, *args: {"node": node.name})
+    def validate_with_node(self, node, task, response, context):
+        """
+        Uses an execution node (via its normal process_task method) to evaluate a previously produced answer.
+        Returns a tuple: (node name, evaluation dict, aggregated average score).
+        """
+        validation_prompt = self.build_validation_prompt(task, response, context)
         print(f"[{node.name}] Validating response for task: '{task}'")
         try:
             # Use the node’s standard process_task to perform validation
-            eval_result = node.process_task(validation_prompt, expected_format="json", context=context)
-            avg_score = (
-                eval_result.get("logical_coherence", 0) +
-                eval_result.get("completeness", 0) +
-                eval_result.get("correctness", 0) +
-                eval_result.get("clarity", 0) +
-                eval_result.get("instruction_following", 0)
-            ) / 5
-            return (node.name, eval_result, avg_score)
+            eval_result = node.process_task(validation_prompt, expected_format="json", context=context, call_site="validate_with_node", stop_after_final_answer=False)
+            return (node.name, eval_result, self.evaluation_score(eval_result))
         except Exception as e:
             print(f"[{node.name}] Error during validation: {e}")
-            fallback_evaluation = {
-                "logical_coherence": 0,
-                "completeness": 0,
-                "correctness": 0,
-                "clarity": 0,
-                "instruction_following": 0,
-                "final_verdict": "Rejected",
-                "improvement_suggestions": "Evaluation failed due to an error."
-            }
-            return (node.name, fallback_evaluation, 0)
+            return (node.name, dict(FAILED_EVALUATION), 0)
+
+    @tracer.traced("validator", attributes=lambda self, node, *args: {"node": node.name})
+    async def validate_with_node_async(self, node, task, response, context):
+        """
+        Async version of validate_with_node.
+        """
+        validation_prompt = self.build_validation_prompt(task, response, context)
+        print(f"[{node.name}] Validating response for task: '{task}'")
+        try:
+            eval_result = await node.process_task_async(validation_prompt, expected_format="json", context=context, call_site="validate_with_node", stop_after_final_answer=False)
+            return (node.name, eval_result, self.evaluation_score(eval_result))
+        except Exception as e:
+            print(f"[{node.name}] Error during validation: {e}")
+            return (node.name, dict(FAILED_EVALUATION), 0)
 
-    def delegate_tasks(self, subtasks):
+    def build_comparative_validation_prompt(self, task, responses, context):
+        candidates = "\n\n".join(
+            f"Candidate {index}: {json.dumps(response)}" for index, response in enumerate(responses, start=1)
+        )
+        return (
+            "You are an AI evaluator. Your task is to assess each of the following candidate answers to the same task, "
+            "independently of one another. Evaluate every candidate based on the following criteria:\n"
+            "1. Logical Coherence (0-10)\n"
+            "2. Completeness (0-10)\n"
+            "3. Correctness (0-10)\n"
+            "4. Clarity (0-10)\n"
+            "5. Instruction-Following (0-10)\n\n"
+            f"Task: {task}\n"
+            f"Context: {context if context else 'None'}\n\n"
+            f"{candidates}\n\n"
+            "Return your evaluation as RAW JSON (without the word 'json' at the beginning) with one entry per candidate, in order:\n"
+            '{"evaluations": [\n'
+            '  {\n'
+            '    "candidate": <candidate number>,\n'
+            '    "logical_coherence": <number>,\n'
+            '    "completeness": <number>,\n'
+            '    "correctness": <number>,\n'
+            '    "clarity": <number>,\n'
+            '    "instruction_following": <number>,\n'
+            '    "final_verdict": "Accepted" or "Rejected",\n'
+            '    "improvement_suggestions": "<brief feedback>"\n'
+            '  }\n'
+            ']}'
+        )
+
+    def candidate_scores(self, eval_result, count):
+        """
+        Extracts per-candidate evaluations from a comparative validation reply.
+        The evaluations may sit at the top level or inside "final_answer" (the executor's response format).
+        Returns (list of evaluation dicts, list of scores); candidates that were not scored get 0.
         """
-        Schedules and executes subtasks based on dependencies.
-        Validates each subtask's result and checks for additional steps.
+        evaluations = eval_result.get("evaluations")
+        if evaluations is None:
+            final_answer = eval_result.get("final_answer")
+            if isinstance(final_answer, str):
+                try:
+                    final_answer = json.loads(final_answer)
+                except ValueError:
+                    final_answer = None
+            if isinstance(final_answer, dict):
+                evaluations = final_answer.get("evaluations")
+            elif isinstance(final_answer, list):
+                evaluations = final_answer
+        by_candidate = {}
+        for position, evaluation in enumerate(evaluations or [], start=1):
+            if isinstance(evaluation, dict):
+                by_candidate.setdefault(evaluation.get("candidate", position), evaluation)
+        results, scores = [], []
+        for index in range(1, count + 1):
+            evaluation = by_candidate.get(index)
+            try:
+                score = self.evaluation_score(evaluation) if evaluation else 0
+            except TypeError:
+                score = 0
+            results.append(evaluation or dict(FAILED_EVALUATION))
+            scores.append(score)
+        return results, scores
+
+    @tracer.traced("validator", attributes=lambda self, node, task, responses, context: {"node": node.name, "candidates": len(responses)})
+    def validate_candidates_with_node(self, node, task, responses, context):
+        """
+        Comparative validation: one call scores every candidate response for the task.
+        Returns a tuple: (node name, list of evaluation dicts, list of average scores).
+        """
+        validation_prompt = self.build_comparative_validation_prompt(task, responses, context)
+        print(f"[{node.name}] Validating {len(responses)} candidate responses for task: '{task}'")
+        try:
+            eval_result = node.process_task(validation_prompt, expected_format="json", context=context, call_site="validate_candidates", stop_after_final_answer=False)
+            evaluations, scores = self.candidate_scores(eval_result, len(responses))
+            return (node.name, evaluations, scores)
+        except Exception as e:
+            print(f"[{node.name}] Error during validation: {e}")
+            return (node.name, [dict(FAILED_EVALUATION) for _ in responses], [0] * len(responses))
+
+    @tracer.traced("validator", attributes=lambda self, node, task, responses, context: {"node": node.name, "candidates": len(responses)})
+    async def validate_candidates_with_node_async(self, node, task, responses, context):
+        """
+        Async version of validate_candidates_with_node.
+        """
+        validation_prompt = self.build_comparative_validation_prompt(task, responses, context)
+        print(f"[{node.name}] Validating {len(responses)} candidate responses for task: '{task}'")
+        try:
+            eval_result = await node.process_task_async(validation_prompt, expected_format="json", context=context, call_site="validate_candidates", stop_after_final_answer=False)
+            evaluations, scores = self.candidate_scores(eval_result, len(responses))
+            return (node.name, evaluations, scores)
+        except Exception as e:
+            print(f"[{node.name}] Error during validation: {e}")
+            return (node.name, [dict(FAILED_EVALUATION) for _ in responses], [0] * len(responses))
+
+    @tracer.traced("subtask", attributes=subtask_span_attributes)
+    def execute_subtask(self, task_obj, dependency_results, complex_task=None):
+        """
+        Builds the subtask's dependency context, processes and validates the subtask, then checks it
+        for additional steps. A result validated earlier for the same subtask and upstream results is
+        taken from the answer store instead. Runs on a scheduler worker thread, so the dispatcher is
+        never blocked by any of these LLM calls. Returns a tuple (agent name, result, validation score,
+        additional steps).
+        """
+        stored = self.answers.lookup(task_obj["task"], dependency_results, complex_task)
+        if stored is not None:
+            agent_name, result, score = stored
+            print(f"[Manager] Subtask {task_obj['id']} served from the answer store (agent {agent_name}, score {score})")
+            report_progress("answer_reused", subtask_id=task_obj["id"], agent=agent_name, score=score)
+        else:
+            context = self.context_builder.build(task_obj["task"], dependency_results)
+            agent_name, result, score = self.process_single_task(task_obj, context)
+            self.answers.store(task_obj["task"], dependency_results, agent_name, result, score, complex_task)
+        additional_steps = self.analyze_additional_steps(task_obj["id"], task_obj["task"], result)
+        return agent_name, result, score, additional_steps
+
+    def delegate_tasks(self, subtasks, journal=None, complex_task=None):
+        """
+        Schedules and executes subtasks as a dataflow graph: each subtask is dispatched as soon as its
+        last dependency completes (longest critical path first), with at most MAX_CONCURRENT_SUBTASKS
+        running at once. Validates each subtask's result and inserts additional steps into the live graph.
+        With a checkpoint journal, subtasks it already holds are restored instead of run, and every
+        newly completed subtask is recorded in it. complex_task scopes answer store entries of subtasks
+        without dependencies to the task they were decomposed from.
         Returns a dictionary mapping task IDs to their results.
         """
-        completed_tasks = {}  # { task_id: {"task": <subtask>, "result": <result>, "agents": [agent_name], "validation_score": score} }
-        remaining_tasks = {task["id"]: task for task in subtasks}
+        graph = TaskGraph(subtasks)
+        if journal:
+            journal.restore(graph)
+        running = {}  # { future: task_id }
 
-        while remaining_tasks:
-            # Find tasks whose dependencies have been completed.
-            ready_tasks = [
-                task for task in remaining_tasks.values()
-                if all(dep in completed_tasks for dep in task.get("dependencies", []))
-            ]
-            if not ready_tasks:
-                print("No tasks ready to execute; possible circular dependency detected.")
-                break
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_SUBTASKS) as executor:
+            while True:
+                while graph.has_ready() and len(running) < MAX_CONCURRENT_SUBTASKS:
+                    task_obj = graph.pop_ready()
+                    dependency_results = graph.dependency_results(task_obj)
+                    print(f"[Manager] Dispatching subtask {task_obj['id']} "
+                          f"(critical path length {graph.critical_path_length(task_obj['id'])})")
+                    running[executor.submit(contextvars.copy_context().run, self.execute_subtask, task_obj, dependency_results, complex_task)] = task_obj["id"]
 
-            futures = {}
-            with ThreadPoolExecutor(max_workers=len(ready_tasks)) as executor:
-                for task_obj in ready_tasks:
-                    context = ""
-                    if task_obj.get("dependencies"):
-                        dep_results = [
-                            f"{dep}: {completed_tasks[dep]['result']['final_answer']}"
-                            for dep in task_obj["dependencies"] if dep in completed_tasks
-                        ]
-                        context = "\n".join(dep_results)
-                    futures[executor.submit(self.process_single_task, task_obj, context)] = task_obj["id"]
+                if not running:
+                    break
 
-            for future in as_completed(futures):
-                tid = futures[future]
-                try:
-                    agent_name, result, score = future.result()
-                    completed_tasks[tid] = {
-                        "task": remaining_tasks[tid]["task"],
-                        "result": result,
-                        "agents": [agent_name],
-                        "validation_score": score
-                    }
-                    # Analyze if any additional steps are needed.
-                    additional_steps = self.analyze_additional_steps(tid, remaining_tasks[tid]["task"], result)
-                    for step in additional_steps:
-                        # Ensure additional step has a dependencies list.
-                        if "dependencies" not in step:
-                            step["dependencies"] = []
-                        # If blocking, add dependency on the parent task.
-                        if step.get("blocking", False):
-                            step["dependencies"].append(tid)
-                        # Add the additional step if not already processed.
-                        if step["id"] not in completed_tasks and step["id"] not in remaining_tasks:
-                            remaining_tasks[step["id"]] = step
-                except Exception as e:
-                    print(f"Error processing task {tid}: {e}")
-            # Remove executed tasks.
-            for task_obj in ready_tasks:
-                tid = task_obj["id"]
-                if tid in remaining_tasks:
-                    del remaining_tasks[tid]
-        return completed_tasks
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tid = running.pop(future)
+                    try:
+                        agent_name, result, score, additional_steps = future.result()
+                        info = {
+                            "task": graph.tasks[tid]["task"],
+                            "result": result,
+                            "agents": [agent_name],
+                            "validation_score": score
+                        }
+                        graph.complete(tid, info)
+                        report_progress("subtask_completed", subtask_id=tid, agent=agent_name, score=score)
+                        inserted = graph.insert_additional_steps(tid, additional_steps)
+                        if journal:
+                            journal.record_completion(tid, info, inserted)
+                        if inserted:
+                            print(f"[Manager] Inserted additional steps after {tid}: {[step['id'] for step in inserted]}")
+                            report_progress("additional_steps", subtask_id=tid, steps=[step["id"] for step in inserted])
+                    except Exception as e:
+                        print(f"Error processing task {tid}: {e}")
+                        graph.fail(tid)
+                        report_progress("subtask_failed", subtask_id=tid, error=str(e))
 
-    def compile_final_answer(self, completed_tasks, complex_task):
+        blocked = graph.blocked()
+        if blocked:
+            print(f"No tasks ready to execute; unresolved or circular dependencies for: {blocked}")
+        return graph.completed
+
+    @tracer.traced("subtask", attributes=subtask_span_attributes)
+    async def execute_subtask_async(self, task_obj, dependency_results, complex_task=None):
         """
-        Synthesizes a final answer by combining all validated subtask responses.
+        Async version of execute_subtask.
         """
+        # The store is SQLite plus cached embeddings, both blocking, so it is used off the loop.
+        stored = await asyncio.to_thread(self.answers.lookup, task_obj["task"], dependency_results, complex_task)
+        if stored is not None:
+            agent_name, result, score = stored
+            print(f"[Manager] Subtask {task_obj['id']} served from the answer store (agent {agent_name}, score {score})")
+            report_progress("answer_reused", subtask_id=task_obj["id"], agent=agent_name, score=score)
+        else:
+            context = await self.context_builder.build_async(task_obj["task"], dependency_results)
+            agent_name, result, score = await self.process_single_task_async(task_obj, context)
+            await asyncio.to_thread(self.answers.store, task_obj["task"], dependency_results, agent_name, result, score, complex_task)
+        additional_steps = await self.analyze_additional_steps_async(task_obj["id"], task_obj["task"], result)
+        return agent_name, result, score, additional_steps
+
+    async def delegate_tasks_async(self, subtasks, journal=None, complex_task=None):
+        """
+        Async version of delegate_tasks: the same dataflow scheduling, with every subtask running
+        as a task on the current event loop. If the scheduler is cancelled (or fails), all subtasks
+        still in flight are cancelled and awaited before it returns.
+        Returns a dictionary mapping task IDs to their results.
+        """
+        graph = TaskGraph(subtasks)
+        if journal:
+            journal.restore(graph)
+        running = {}  # { asyncio.Task: task_id }
+
+        try:
+            while True:
+                while graph.has_ready() and len(running) < MAX_CONCURRENT_SUBTASKS:
+                    task_obj = graph.pop_ready()
+                    dependency_results = graph.dependency_results(task_obj)
+                    print(f"[Manager] Dispatching subtask {task_obj['id']} "
+                          f"(critical path length {graph.critical_path_length(task_obj['id'])})")
+                    running[asyncio.create_task(self.execute_subtask_async(task_obj, dependency_results, complex_task))] = task_obj["id"]
+
+                if not running:
+                    break
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    tid = running.pop(future)
+                    try:
+                        agent_name, result, score, additional_steps = future.result()
+                        info = {
+                            "task": graph.tasks[tid]["task"],
+                            "result": result,
+                            "agents": [agent_name],
+                            "validation_score": score
+                        }
+                        graph.complete(tid, info)
+                        report_progress("subtask_completed", subtask_id=tid, agent=agent_name, score=score)
+                        inserted = graph.insert_additional_steps(tid, additional_steps)
+                        if journal:
+                            await asyncio.to_thread(journal.record_completion, tid, info, inserted)
+                        if inserted:
+                            print(f"[Manager] Inserted additional steps after {tid}: {[step['id'] for step in inserted]}")
+                            report_progress("additional_steps", subtask_id=tid, steps=[step["id"] for step in inserted])
+                    except Exception as e:
+                        print(f"Error processing task {tid}: {e}")
+                        graph.fail(tid)
+                        report_progress("subtask_failed", subtask_id=tid, error=str(e))
+        finally:
+            for future in running:
+                future.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        blocked = graph.blocked()
+        if blocked:
+            print(f"No tasks ready to execute; unresolved or circular dependencies for: {blocked}")
+        return graph.completed
+
+    def build_synthesis_messages(self, completed_tasks, complex_task):
         valid_responses = []
-        for tid, info in completed_tasks.items():
+        # Results are listed by subtask ID rather than in completion order, so the prompt does not depend
+        # on how the subtasks happened to interleave.
+        by_id = lambda item: [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", str(item[0]))]
+        for tid, info in sorted(completed_tasks.items(), key=by_id):
             valid_responses.append(f"Task {tid} ({info['task']}): {info['result']['final_answer']}")
         synthesis_prompt = (
             "You are an expert synthesizer. Given the following responses for various subtasks of a complex task, "
@@ -463,13 +1094,43 @@ class ManagingNode:
             f"Complex Task: {complex_task}\n\n"
             "Please provide the final answer in a clear and coherent manner."
         )
+        messages = [
+            {"role": "system", "content": "You are an expert synthesizer."},
+            {"role": "user", "content": synthesis_prompt}
+        ]
+        return messages, valid_responses
+
+    @tracer.traced("synthesis")
+    def compile_final_answer(self, completed_tasks, complex_task):
+        """
+        Synthesizes a final answer by combining all validated subtask responses.
+        """
+        messages, valid_responses = self.build_synthesis_messages(completed_tasks, complex_task)
+        try:
+            response = request_pool.create(
+                call_site="compile_final_answer",
+                model=DEFAULT_MODEL,
+                messages=messages,
+                temperature=0.3,
+                max_tokens=12000,
+            )
+            final_answer = response.choices[0].message.content.strip()
+            return final_answer
+        except Exception as e:
+            print(f"Error synthesizing final answer: {e}")
+            return "\n".join(valid_responses)
+
+    @tracer.traced("synthesis")
+    async def compile_final_answer_async(self, completed_tasks, complex_task):
+        """
+        Async version of compile_final_answer.
+        """
+        messages, valid_responses = self.build_synthesis_messages(completed_tasks, complex_task)
         try:
-            response = client.chat.completions.create(
+            response = await request_pool.create_async(
+                call_site="compile_final_answer",
                 model=DEFAULT_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an expert synthesizer."},
-                    {"role": "user", "content": synthesis_prompt}
-                ],
+                messages=messages,
                 temperature=0.3,
                 max_tokens=12000,
             )
@@ -479,8 +1140,43 @@ class ManagingNode:
             print(f"Error synthesizing final answer: {e}")
             return "\n".join(valid_responses)
 
-    def process_complex_task(self, complex_task):
-        subtasks = self.analyze_task(complex_task)
-        completed_tasks = self.delegate_tasks(subtasks)
+    def open_journal(self, complex_task, task_id=None):
+        """
+        Opens the checkpoint journal of a complex task (and its batch or service task ID, if any).
+        Returns (journal, subtasks recorded in it); both are None when checkpointing is disabled, and
+        the subtasks are None for a fresh task.
+        """
+        journal = CheckpointJournal.for_task(complex_task, task_id)
+        if journal and journal.resumable:
+            print(f"[Manager] Resuming from checkpoint {journal.path}")
+            return journal, journal.subtasks
+        return journal, None
+
+    @tracer.traced("run")
+    def process_complex_task(self, complex_task, task_id=None):
+        journal, subtasks = self.open_journal(complex_task, task_id)
+        if subtasks is None:
+            subtasks = self.analyze_task(complex_task)
+            if journal:
+                journal.record_decomposition(subtasks)
+        report_progress("decomposition", subtasks=subtasks)
+        completed_tasks = self.delegate_tasks(subtasks, journal, complex_task)
         final_answer = self.compile_final_answer(completed_tasks, complex_task)
-        return final_answer
\ No newline at end of file
+        if journal:
+            journal.discard()
+        return final_answer
+
+    @tracer.traced("run")
+    async def process_complex_task_async(self, complex_task, task_id=None):
+        # The journal reads and fsyncs its file, so it is kept off the event loop.
+        journal, subtasks = await asyncio.to_thread(self.open_journal, complex_task, task_id)
+        if subtasks is None:
+            subtasks = await self.analyze_task_async(complex_task)
+            if journal:
+                await asyncio.to_thread(journal.record_decomposition, subtasks)
+        report_progress("decomposition", subtasks=subtasks)
+        completed_tasks = await self.delegate_tasks_async(subtasks, journal, complex_task)
+        final_answer = await self.compile_final_answer_async(completed_tasks, complex_task)
+        if journal:
+            await asyncio.to_thread(journal.discard)
+        return final_answer
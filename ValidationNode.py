@@ -1,18 +1,23 @@
 import json
-from config import DEFAULT_MODEL, client
+from config import DEFAULT_MODEL
+from request_pool import request_pool
+from structured_output import parse_json
+
+FAILED_EVALUATION = {
+    "logical_coherence": 0,
+    "completeness": 0,
+    "correctness": 0,
+    "clarity": 0,
+    "instruction_following": 0,
+    "final_verdict": "Rejected",
+    "improvement_suggestions": "Evaluation failed due to an error."
+}
 
 class ValidationNode:
     def __init__(self, name):
         self.name = name
 
-    def agent_as_a_judge(self, task, response, context):
-        """
-        Implements the Agent-as-a-Judge framework for evaluating agentic responses.
-        - Provides intermediate feedback.
-        - Evaluates both chain-of-thought and final response.
-        - Uses compare-based and metrics-based evaluations.
-        """
-
+    def build_judge_messages(self, task, response, context):
         prompt = (
             "You are an advanced AI judge evaluating AI-generated responses. Your task is to analyze the reasoning steps, "
             "identify strengths and weaknesses, and provide a fair and detailed assessment. "
@@ -38,45 +43,68 @@ class ValidationNode:
             '  "improvement_suggestions": "<brief feedback on how to improve the response>"\n'
             "}"
         )
+        return [
+            {"role": "system", "content": "You are an AI Judge."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def agent_as_a_judge(self, task, response, context):
+        """
+        Implements the Agent-as-a-Judge framework for evaluating agentic responses.
+        - Provides intermediate feedback.
+        - Evaluates both chain-of-thought and final response.
+        - Uses compare-based and metrics-based evaluations.
+        """
+        messages = self.build_judge_messages(task, response, context)
 
         print(f"[{self.name}] Evaluating response...")
 
         try:
-            api_response = client.chat.completions.create(
+            api_response = request_pool.create(
+                call_site="agent_as_a_judge",
                 model=DEFAULT_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an AI Judge."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=messages,
                 temperature=0,
                 max_tokens=1500,
             )
 
-            evaluation = json.loads(api_response.choices[0].message.content.strip())
+            evaluation = parse_json(api_response.choices[0].message.content.strip(), "agent_as_a_judge")
 
             return evaluation
 
         except Exception as e:
             print(f"    [{self.name}] Error during validation: {e}")
-            return {
-                "logical_coherence": 0,
-                "completeness": 0,
-                "correctness": 0,
-                "clarity": 0,
-                "instruction_following": 0,
-                "final_verdict": "Rejected",
-                "improvement_suggestions": "Evaluation failed due to an error."
-            }
+            return dict(FAILED_EVALUATION)
 
-    def validate_answer(self, task, response, context):
+    async def agent_as_a_judge_async(self, task, response, context):
         """
-        Uses the Agent-as-a-Judge framework to validate an answer.
-        Returns a structured assessment with scores and improvement feedback.
+        Same as agent_as_a_judge, but awaits the async client instead of blocking a thread.
         """
-        evaluation = self.agent_as_a_judge(task, response, context)
+        messages = self.build_judge_messages(task, response, context)
 
+        print(f"[{self.name}] Evaluating response...")
+
+        try:
+            api_response = await request_pool.create_async(
+                call_site="agent_as_a_judge",
+                model=DEFAULT_MODEL,
+                messages=messages,
+                temperature=0,
+                max_tokens=1500,
+            )
+
+            evaluation = parse_json(api_response.choices[0].message.content.strip(), "agent_as_a_judge")
+
+            return evaluation
+
+        except Exception as e:
+            print(f"    [{self.name}] Error during validation: {e}")
+            return dict(FAILED_EVALUATION)
+
+    @staticmethod
+    def average_score(evaluation):
         # Compute an aggregated score based on all evaluation metrics
-        avg_score = (
+        return (
             evaluation["logical_coherence"] +
             evaluation["completeness"] +
             evaluation["correctness"] +
@@ -84,4 +112,14 @@ class ValidationNode:
             evaluation["instruction_following"]
         ) / 5
 
-        return (self.name, evaluation, avg_score)
\ No newline at end of file
+    def validate_answer(self, task, response, context):
+        """
+        Uses the Agent-as-a-Judge framework to validate an answer.
+        Returns a structured assessment with scores and improvement feedback.
+        """
+        evaluation = self.agent_as_a_judge(task, response, context)
+        return (self.name, evaluation, self.average_score(evaluation))
+
+    async def validate_answer_async(self, task, response, context):
+        evaluation = await self.agent_as_a_judge_async(task, response, context)
+        return (self.name, evaluation, self.average_score(evaluation))
\ No newline at end of file
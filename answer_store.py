@@ -0,0 +1,199 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from config import (
+    ANSWER_STORE_PATH, ANSWER_STORE_THRESHOLD, ANSWER_STORE_MIN_SCORE, ANSWER_STORE_TTL, ANSWER_STORE_MAX_ENTRIES
+)
+from embedding import get_embeddings
+
+# Near-identical matching keeps the embedding matrices of this many upstream contexts in memory.
+MAX_INDEXED_CONTEXTS = 256
+
+def normalize_text(text):
+    return " ".join(str(text).lower().split())
+
+def context_fingerprint(dependency_results, complex_task=None):
+    """
+    Fingerprint of a subtask's upstream results. Dependency IDs are left out (they differ between
+    decompositions of the same work), and so is their order. A subtask without dependencies is
+    fingerprinted by its complex task instead, so that a generic one ("Summarize the findings") is
+    never served the answer it got in an unrelated task.
+    """
+    if not dependency_results:
+        material = {"complex_task": normalize_text(complex_task or "")}
+    else:
+        material = sorted(normalize_text(answer) for _, answer in dependency_results)
+    return hashlib.sha256(json.dumps(material, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def answer_key(subtask, fingerprint):
+    return hashlib.sha256(f"{normalize_text(subtask)}\n{fingerprint}".encode("utf-8")).hexdigest()
+
+class AnswerStore:
+    """
+    Validated subtask results in a local SQLite file, keyed by subtask text and the fingerprint of
+    the upstream results it was computed from (or of its complex task, if it has no dependencies). A subtask with the same fingerprint and the same text
+    (ignoring case and whitespace), or a text whose embedding is within `threshold` cosine similarity
+    of a stored one, is served from the store instead of being executed and validated again.
+    Only results scoring at least min_score are stored. Entries expire after ttl seconds; beyond
+    max_entries the lowest-scoring, least recently used entries are evicted first.
+    With force_recompute, lookups always miss while fresh results still replace the stored ones.
+    """
+    def __init__(self, path=ANSWER_STORE_PATH, threshold=ANSWER_STORE_THRESHOLD, min_score=ANSWER_STORE_MIN_SCORE,
+                 ttl=ANSWER_STORE_TTL, max_entries=ANSWER_STORE_MAX_ENTRIES):
+        self.path = path
+        self.threshold = threshold
+        self.min_score = min_score
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.force_recompute = False
+        self.lock = threading.Lock()
+        self.connection = None
+        self.indexes = {}  # { fingerprint: (keys, normalized embedding matrix) }, oldest first
+        self.counters = {"exact": 0, "near": 0, "misses": 0, "stored": 0}
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY, fingerprint TEXT, subtask TEXT, agent TEXT, result TEXT,"
+                " score REAL, created REAL, last_access REAL, expires REAL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS answers_fingerprint ON answers (fingerprint)")
+            self.connection.commit()
+        return self.connection
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def _count(self, outcome):
+        self.counters[outcome] += 1
+
+    def _candidates(self, connection, fingerprint, now):
+        return connection.execute(
+            "SELECT key, subtask FROM answers WHERE fingerprint = ? AND (expires IS NULL OR expires >= ?)",
+            (fingerprint, now)
+        ).fetchall()
+
+    def _nearest(self, subtask, fingerprint, candidates):
+        """
+        Key of the stored subtask most similar to `subtask` among the candidates, if within the threshold.
+        """
+        keys = [key for key, _ in candidates]
+        with self.lock:
+            index = self.indexes.get(fingerprint)
+        if index is None or index[0] != keys:
+            matrix = get_embeddings([text for _, text in candidates])
+            norms = np.linalg.norm(matrix, axis=1)
+            norms[norms == 0] = 1.0
+            index = (keys, matrix / norms[:, None])
+            with self.lock:
+                self.indexes.pop(fingerprint, None)
+                self.indexes[fingerprint] = index
+                while len(self.indexes) > MAX_INDEXED_CONTEXTS:
+                    del self.indexes[next(iter(self.indexes))]
+        query = get_embeddings([subtask])[0]
+        similarities = index[1] @ (query / (np.linalg.norm(query) or 1.0))
+        best = int(np.argmax(similarities))
+        return (keys[best], float(similarities[best])) if similarities[best] >= self.threshold else (None, None)
+
+    def lookup(self, subtask, dependency_results, complex_task=None):
+        """
+        The stored (agent name, result, validation score) for a subtask, or None on a miss.
+        """
+        if not self.enabled or self.force_recompute:
+            return None
+        fingerprint = context_fingerprint(dependency_results, complex_task)
+        key = answer_key(subtask, fingerprint)
+        outcome = "exact"
+        now = time.time()
+        with self.lock:
+            try:
+                connection = self._connect()
+                exists = connection.execute(
+                    "SELECT 1 FROM answers WHERE key = ? AND (expires IS NULL OR expires >= ?)", (key, now)
+                ).fetchone()
+                candidates = [] if exists or self.threshold is None else self._candidates(connection, fingerprint, now)
+            except sqlite3.Error as e:
+                print(f"[AnswerStore] Lookup failed: {e}")
+                return None
+        if not exists:
+            key = None
+            if candidates:
+                # Embedding the candidates is blocking network/disk work, so it runs outside the lock.
+                try:
+                    key, similarity = self._nearest(subtask, fingerprint, candidates)
+                except Exception as e:
+                    print(f"[AnswerStore] Similarity lookup failed: {e}")
+            if key is not None:
+                outcome = "near"
+                print(f"[AnswerStore] Reusing the result of a near-identical subtask (similarity {similarity:.3f})")
+        with self.lock:
+            if key is None:
+                self._count("misses")
+                return None
+            try:
+                connection = self._connect()
+                row = connection.execute("SELECT agent, result, score FROM answers WHERE key = ?", (key,)).fetchone()
+                connection.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+                connection.commit()
+            except sqlite3.Error as e:
+                print(f"[AnswerStore] Lookup failed: {e}")
+                return None
+            if row is None:
+                self._count("misses")
+                return None
+            self._count(outcome)
+        return row[0], json.loads(row[1]), row[2]
+
+    def store(self, subtask, dependency_results, agent_name, result, score, complex_task=None):
+        """
+        Stores a validated result if it met min_score.
+        """
+        if not self.enabled or score is None or score < self.min_score:
+            return
+        fingerprint = context_fingerprint(dependency_results, complex_task)
+        now = time.time()
+        with self.lock:
+            try:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO answers (key, fingerprint, subtask, agent, result, score, created, last_access, expires)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (answer_key(subtask, fingerprint), fingerprint, subtask, agent_name,
+                     json.dumps(result, ensure_ascii=False), score, now, now,
+                     now + self.ttl if self.ttl is not None else None)
+                )
+                self._evict(connection, now)
+                connection.commit()
+            except sqlite3.Error as e:
+                print(f"[AnswerStore] Store failed: {e}")
+                return
+            self._count("stored")
+
+    def _evict(self, connection, now):
+        connection.execute("DELETE FROM answers WHERE expires IS NOT NULL AND expires < ?", (now,))
+        total = connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if total > self.max_entries:
+            connection.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY score, last_access LIMIT ?)",
+                (total - self.max_entries,)
+            )
+
+    def report(self):
+        with self.lock:
+            counters = dict(self.counters)
+        lookups = counters["exact"] + counters["near"] + counters["misses"]
+        if not lookups:
+            return "[AnswerStore] no lookups"
+        return (
+            f"[AnswerStore] {counters['exact']} exact and {counters['near']} near-identical hits, {counters['misses']} misses "
+            f"({(counters['exact'] + counters['near']) / lookups * 100:.0f}% of subtasks served), {counters['stored']} results stored"
+        )
+
+answer_store = AnswerStore()
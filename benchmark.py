@@ -0,0 +1,182 @@
+import os
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+import io
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import tracemalloc
+import contextlib
+import config
+import embedding
+import request_pool as request_pool_module
+from request_pool import request_pool, TokenBucket
+from response_cache import response_cache
+from decomposition_cache import decomposition_cache
+from answer_store import answer_store
+from ManagingNode import ManagingNode
+from tracing import tracer
+from main import load_execution_nodes
+
+# ---------------------------
+# Scheduler benchmark on the stub backend
+# ---------------------------
+# Runs complex tasks end to end against the deterministic stub backend for DAGs of several widths
+# and depths, and reports throughput, latency percentiles, LLM calls per task and the thread/memory
+# footprint. Usage: python benchmark.py --shapes 1x1,4x2,8x3 --tasks 10 --time-scale 0.02
+
+def percentile(values, q):
+    """
+    q-th percentile (0-100) with linear interpolation between the closest ranks.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+class ThreadSampler:
+    """
+    Samples threading.active_count() in the background and keeps the peak (excluding itself).
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, threading.active_count() - 1)
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+def configure(args):
+    """
+    Points the pipeline at the stub backend for benchmarking: no response, embedding, decomposition or
+    answer caches (every run pays for its calls), and provider quota and retry backoff scaled by the
+    same time factor as the stub latencies (as is the minimum hedge delay), so a compressed run keeps
+    the same proportions as a real one.
+    """
+    if config.LLM_BACKEND != "stub":
+        sys.exit(f"benchmark.py needs LLM_BACKEND=stub (got {config.LLM_BACKEND!r}).")
+    backend = config.stub_backend
+    backend.seed = args.seed
+    backend.time_scale = args.time_scale
+    backend.failure_rate = args.failure_rate
+    response_cache.path = None
+    decomposition_cache.threshold = None
+    answer_store.path = None
+    embedding.EMBEDDING_CACHE_DIR = None
+    request_pool.request_bucket = TokenBucket(config.RATE_LIMIT_RPM / args.time_scale)
+    request_pool.token_bucket = TokenBucket(config.RATE_LIMIT_TPM / args.time_scale)
+    request_pool_module.RETRY_BASE_DELAY = config.RETRY_BASE_DELAY * args.time_scale
+    request_pool_module.RETRY_MAX_DELAY = config.RETRY_MAX_DELAY * args.time_scale
+    request_pool.hedging.min_delay = config.HEDGE_MIN_DELAY * args.time_scale
+    return backend
+
+def run_task(manager, engine, task):
+    if engine == "async":
+        return asyncio.run(manager.process_complex_task_async(task))
+    return manager.process_complex_task(task)
+
+def run_shape(manager, backend, engine, width, depth, tasks, verbose=False, measure_memory=True):
+    backend.dag_width = width
+    backend.dag_depth = depth
+    backend.reset_counters()
+    latencies = []
+    output = None if verbose else io.StringIO()
+    if measure_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadSampler() as sampler:
+        for index in range(tasks):
+            tracer.reset()
+            task_started = time.perf_counter()
+            with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+                run_task(manager, engine, f"Benchmark task {index} ({width}x{depth})")
+            latencies.append(time.perf_counter() - task_started)
+            if output:
+                output.seek(0)
+                output.truncate()
+    elapsed = time.perf_counter() - started
+    peak_memory = None
+    if measure_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    calls = backend.call_counts()
+    return {
+        "engine": engine,
+        "width": width,
+        "depth": depth,
+        "tasks": tasks,
+        "tasks_per_second": tasks / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "llm_calls_per_task": sum(calls.values()) / tasks,
+        "llm_calls_by_call_site": {call_site: count / tasks for call_site, count in sorted(calls.items())},
+        "peak_threads": sampler.peak,
+        "peak_memory_bytes": peak_memory,
+    }
+
+def format_row(result):
+    memory = f"{result['peak_memory_bytes'] / 1e6:8.1f}" if result["peak_memory_bytes"] is not None else "       -"
+    return (
+        f"{result['engine']:>6} {result['width']:>5} {result['depth']:>5} {result['tasks_per_second']:>9.3f} "
+        f"{result['p50']:>8.3f} {result['p95']:>8.3f} {result['p99']:>8.3f} {result['llm_calls_per_task']:>10.1f} "
+        f"{result['peak_threads']:>7} {memory}"
+    )
+
+def parse_shapes(text):
+    shapes = []
+    for item in text.split(","):
+        width, depth = item.lower().split("x")
+        shapes.append((int(width), int(depth)))
+    return shapes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the subtask scheduler against the stub LLM backend.")
+    parser.add_argument("--shapes", default="1x1,4x1,2x3,8x2", help="Comma-separated WIDTHxDEPTH decompositions.")
+    parser.add_argument("--tasks", type=int, default=5, help="Complex tasks per shape.")
+    parser.add_argument("--engine", choices=["sync", "async", "both"], default="sync")
+    parser.add_argument("--time-scale", type=float, default=0.02, help="Multiplier on stub latencies, quota and backoff.")
+    parser.add_argument("--failure-rate", type=float, default=config.STUB_FAILURE_RATE)
+    parser.add_argument("--seed", type=int, default=config.STUB_SEED)
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (it slows the run down).")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's own output.")
+    args = parser.parse_args()
+
+    backend = configure(args)
+    manager = ManagingNode(load_execution_nodes(os.path.join(os.path.dirname(os.path.abspath(__file__)), "execution_nodes.json")))
+    engines = ["sync", "async"] if args.engine == "both" else [args.engine]
+
+    print(f"{'engine':>6} {'width':>5} {'depth':>5} {'tasks/s':>9} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} "
+          f"{'calls/task':>10} {'threads':>7} {'peak MB':>8}")
+    results = []
+    for engine in engines:
+        for width, depth in parse_shapes(args.shapes):
+            result = run_shape(manager, backend, engine, width, depth, args.tasks, args.verbose, not args.no_memory)
+            results.append(result)
+            print(format_row(result))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"time_scale": args.time_scale, "failure_rate": args.failure_rate, "results": results}, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+import os
+import json
+import time
+import socket
+import struct
+import asyncio
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from config import (
+    WORKER_HEARTBEAT_INTERVAL, WORKER_HEARTBEAT_TIMEOUT, WORKER_MAX_ATTEMPTS, WORKER_UNPLACED_TIMEOUT,
+    WORKER_MAX_FRAME_BYTES
+)
+from ExecutionNode import ExecutionNode
+
+# ---------------------------
+# Framed protocol
+# ---------------------------
+# Every message is a JSON object preceded by its length as a 4-byte big-endian integer.
+# Worker -> broker: register, heartbeat, pull (free slots), result, error.
+# Broker -> worker: registered, job.
+
+HEADER = struct.Struct("!I")
+
+class ProtocolError(Exception):
+    pass
+
+class WorkerLostError(Exception):
+    """
+    Raised for a job that no worker could complete (its workers were lost, or none hosts its node).
+    """
+    pass
+
+class RemoteError(Exception):
+    """
+    Raised for a job whose worker reported an exception.
+    """
+    pass
+
+def parse_address(address):
+    """
+    (socket family, bind/connect target) for "unix:/path/to.sock", "tcp://host:port" or "host:port".
+    """
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        return socket.AF_UNIX, path[2:] if path.startswith("//") else path
+    host, _, port = address[len("tcp://"):].rpartition(":") if address.startswith("tcp://") else address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+def connect(address):
+    family, target = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(target)
+    return Connection(sock)
+
+class Connection:
+    """
+    A socket carrying framed JSON messages. Sends are serialized, so any thread may send.
+    """
+    def __init__(self, sock, max_frame_bytes=WORKER_MAX_FRAME_BYTES):
+        self.sock = sock
+        self.max_frame_bytes = max_frame_bytes
+        self.send_lock = threading.Lock()
+
+    def send(self, message):
+        payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+        if len(payload) > self.max_frame_bytes:
+            raise ProtocolError(f"message of {len(payload)} bytes exceeds the {self.max_frame_bytes} byte frame limit")
+        with self.send_lock:
+            self.sock.sendall(HEADER.pack(len(payload)) + payload)
+
+    def _receive_exactly(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return bytes(data)
+
+    def receive(self):
+        """
+        The next message, or None once the peer has closed the connection.
+        """
+        header = self._receive_exactly(HEADER.size)
+        if header is None:
+            return None
+        (size,) = HEADER.unpack(header)
+        if size > self.max_frame_bytes:
+            raise ProtocolError(f"frame of {size} bytes exceeds the {self.max_frame_bytes} byte limit")
+        payload = self._receive_exactly(size)
+        if payload is None:
+            raise ProtocolError("connection closed in the middle of a frame")
+        return json.loads(payload)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+# ---------------------------
+# Broker
+# ---------------------------
+
+class WorkerState:
+    def __init__(self, worker_id, connection, nodes, capacity):
+        self.worker_id = worker_id
+        self.connection = connection
+        self.nodes = set(nodes)
+        self.capacity = capacity
+        self.credits = 0  # free slots the worker has asked to be filled
+        self.queue = deque()  # job IDs placed on this worker, oldest first
+        self.in_flight = set()
+        self.last_seen = time.monotonic()
+
+    @property
+    def load(self):
+        return len(self.queue) + len(self.in_flight)
+
+class Job:
+    def __init__(self, job_id, node_name, args):
+        self.job_id = job_id
+        self.node_name = node_name
+        self.args = args
+        self.future = Future()
+        self.started = False
+        self.attempts = 0
+        self.worker_id = None
+        self.placed_at = time.monotonic()
+
+class Broker:
+    """
+    Dispatches execution-node work to worker processes over Unix or TCP sockets.
+    Workers register the nodes they host (name, description, reputation score) and pull jobs by
+    announcing free slots. A submitted job is placed on the least loaded worker hosting its node; an
+    idle worker whose own queue is empty steals the newest matching job from the most loaded worker.
+    Workers send heartbeats; a worker that disconnects or misses them for heartbeat_timeout seconds is
+    dropped and its queued and in-flight jobs are placed on other workers (up to max_attempts
+    dispatches per job). Jobs for a node no connected worker hosts wait up to unplaced_timeout seconds.
+    """
+    def __init__(self, address, heartbeat_timeout=WORKER_HEARTBEAT_TIMEOUT, max_attempts=WORKER_MAX_ATTEMPTS,
+                 unplaced_timeout=WORKER_UNPLACED_TIMEOUT):
+        self.address = address
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.unplaced_timeout = unplaced_timeout
+        self.lock = threading.Condition()
+        self.workers = {}  # { worker_id: WorkerState }
+        self.jobs = {}  # { job_id: Job } for every job not yet resolved
+        self.unplaced = deque()  # job IDs whose node no connected worker hosts
+        self.nodes = {}  # { node name: {"description", "reputation_score"} }, as first registered
+        self.job_ids = itertools.count(1)
+        self.worker_ids = itertools.count(1)
+        self.counters = {"submitted": 0, "completed": 0, "stolen": 0, "reassigned": 0, "failed": 0}
+        self.listener = None
+        self.stopped = threading.Event()
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+
+    def start(self):
+        family, target = parse_address(self.address)
+        listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_UNIX:
+            if os.path.exists(target):
+                os.unlink(target)
+        else:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(target)
+        listener.listen()
+        self.listener = listener
+        threading.Thread(target=self._accept_loop, name="broker-accept", daemon=True).start()
+        threading.Thread(target=self._monitor_loop, name="broker-monitor", daemon=True).start()
+        print(f"[Broker] Listening on {self.address}")
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.listener:
+            self.listener.close()
+        family, target = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(target):
+            os.unlink(target)
+        with self.lock:
+            workers = list(self.workers.values())
+            jobs = list(self.jobs.values())
+            self.workers.clear()
+            self.jobs.clear()
+            self.unplaced.clear()
+        for worker in workers:
+            worker.connection.close()
+        for job in jobs:
+            self._resolve(job, error=WorkerLostError("the broker was stopped"))
+
+    def wait_for_nodes(self, min_nodes, timeout):
+        """
+        Waits until workers have registered at least min_nodes distinct nodes (or the timeout passes)
+        and returns a RemoteExecutionNode for every registered node.
+        """
+        with self.lock:
+            self.lock.wait_for(lambda: len(self.nodes) >= min_nodes, timeout)
+            return [
+                RemoteExecutionNode(name, info["description"], info["reputation_score"], self)
+                for name, info in self.nodes.items()
+            ]
+
+    # ---------------------------
+    # Jobs
+    # ---------------------------
+
+    def submit(self, node_name, args):
+        """
+        Queues a process_task call (keyword arguments `args`) for a node; returns a Future of its result.
+        """
+        with self.lock:
+            job = Job(next(self.job_ids), node_name, args)
+            self.jobs[job.job_id] = job
+            self.counters["submitted"] += 1
+            self._place(job)
+            sends = self._dispatch()
+        self._send_all(sends)
+        return job.future
+
+    def _place(self, job):
+        hosts = [worker for worker in self.workers.values() if job.node_name in worker.nodes]
+        job.placed_at = time.monotonic()
+        if not hosts:
+            self.unplaced.append(job.job_id)
+            return
+        min(hosts, key=lambda worker: worker.load).queue.append(job.job_id)
+
+    def _claim(self, job):
+        """
+        Marks a job as running; False (and the job dropped) if its caller has cancelled it.
+        """
+        if job.started:
+            return True
+        if job.future.set_running_or_notify_cancel():
+            job.started = True
+            return True
+        self.jobs.pop(job.job_id, None)
+        return False
+
+    def _steal(self, worker):
+        """
+        The newest job for a node the worker hosts, taken from the most loaded other worker's queue.
+        """
+        for victim in sorted(self.workers.values(), key=lambda other: -len(other.queue)):
+            if victim is worker or not victim.queue:
+                continue
+            for job_id in reversed(victim.queue):
+                job = self.jobs.get(job_id)
+                if job is not None and job.node_name in worker.nodes:
+                    victim.queue.remove(job_id)
+                    return job
+        return None
+
+    def _next_job(self, worker):
+        while worker.queue:
+            job = self.jobs.get(worker.queue.popleft())
+            if job is not None and self._claim(job):
+                return job
+        while True:
+            job = self._steal(worker)
+            if job is None:
+                return None
+            if self._claim(job):
+                self.counters["stolen"] += 1
+                return job
+
+    def _dispatch(self):
+        """
+        Fills the free slots of every worker. Returns the (worker, message) pairs to send once the
+        lock is released.
+        """
+        sends = []
+        for worker in list(self.workers.values()):
+            while worker.credits > 0:
+                job = self._next_job(worker)
+                if job is None:
+                    break
+                worker.credits -= 1
+                worker.in_flight.add(job.job_id)
+                job.attempts += 1
+                job.worker_id = worker.worker_id
+                sends.append((worker, {"type": "job", "job": job.job_id, "node": job.node_name, "args": job.args}))
+        return sends
+
+    def _send_all(self, sends):
+        for worker, message in sends:
+            try:
+                worker.connection.send(message)
+            except (OSError, ProtocolError) as e:
+                print(f"[Broker] Could not send job {message['job']} to worker {worker.worker_id}: {e}")
+                self._lose(worker, "send failed")
+
+    def _resolve(self, job, result=None, error=None):
+        try:
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(result)
+        except InvalidStateError:
+            pass  # cancelled by the caller
+
+    # ---------------------------
+    # Workers
+    # ---------------------------
+
+    def _accept_loop(self):
+        while not self.stopped.is_set():
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(Connection(sock),), name="broker-connection", daemon=True).start()
+
+    def _serve(self, connection):
+        worker = None
+        try:
+            message = connection.receive()
+            if not message or message.get("type") != "register":
+                raise ProtocolError("expected a register message")
+            worker = self._register(connection, message)
+            while not self.stopped.is_set():
+                message = connection.receive()
+                if message is None:
+                    break
+                self._handle(worker, message)
+        except (OSError, ValueError, KeyError, ProtocolError) as e:
+            if not self.stopped.is_set():
+                print(f"[Broker] Connection error{f' with worker {worker.worker_id}' if worker else ''}: {e}")
+        finally:
+            if worker:
+                self._lose(worker, "disconnected")
+            connection.close()
+
+    def _register(self, connection, message):
+        with self.lock:
+            worker_id = message.get("worker") or f"worker-{next(self.worker_ids)}"
+            if worker_id in self.workers:
+                worker_id = f"{worker_id}-{next(self.worker_ids)}"
+            names = []
+            for node in message["nodes"]:
+                known = self.nodes.setdefault(node["name"], {
+                    "description": node["description"], "reputation_score": node["reputation_score"]
+                })
+                if known["description"] != node["description"]:
+                    print(f"[Broker] Worker {worker_id} registered {node['name']} with a different description; keeping the first one.")
+                names.append(node["name"])
+            worker = WorkerState(worker_id, connection, names, int(message.get("capacity", 1)))
+            self.workers[worker_id] = worker
+            # Jobs that were waiting for one of these nodes can be placed now.
+            waiting, self.unplaced = self.unplaced, deque()
+            for job_id in waiting:
+                job = self.jobs.get(job_id)
+                if job is not None:
+                    self._place(job)
+            self.lock.notify_all()
+        print(f"[Broker] Worker {worker_id} registered {names} (capacity {worker.capacity})")
+        connection.send({"type": "registered", "worker": worker_id, "heartbeat_interval": WORKER_HEARTBEAT_INTERVAL})
+        return worker
+
+    def _handle(self, worker, message):
+        kind = message.get("type")
+        with self.lock:
+            worker.last_seen = time.monotonic()
+            if kind == "heartbeat":
+                return
+            if kind == "pull":
+                worker.credits = min(worker.capacity, worker.credits + int(message.get("slots", 1)))
+                sends = self._dispatch()
+                job = None
+            elif kind in ("result", "error"):
+                sends = []
+                worker.in_flight.discard(message["job"])
+                job = self.jobs.get(message["job"])
+                # Results of jobs that were already reassigned elsewhere (or cancelled) are dropped.
+                if job is not None and job.worker_id == worker.worker_id:
+                    del self.jobs[message["job"]]
+                    self.counters["completed" if kind == "result" else "failed"] += 1
+                else:
+                    job = None
+            else:
+                raise ProtocolError(f"unexpected message type {kind!r}")
+        if job is not None:
+            if kind == "result":
+                self._resolve(job, result=message["result"])
+            else:
+                self._resolve(job, error=RemoteError(message.get("error", "worker error")))
+        self._send_all(sends)
+
+    def _lose(self, worker, reason):
+        """
+        Drops a worker and places its queued and in-flight jobs on the remaining workers.
+        """
+        failed = []
+        with self.lock:
+            if self.workers.get(worker.worker_id) is not worker:
+                return
+            del self.workers[worker.worker_id]
+            reassigned = 0
+            for job_id in list(worker.in_flight) + list(worker.queue):
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+                if job.attempts >= self.max_attempts:
+                    del self.jobs[job_id]
+                    self.counters["failed"] += 1
+                    failed.append(job)
+                    continue
+                if job_id in worker.in_flight:
+                    reassigned += 1
+                    self.counters["reassigned"] += 1
+                self._place(job)
+            worker.in_flight.clear()
+            worker.queue.clear()
+            sends = self._dispatch()
+        print(f"[Broker] Lost worker {worker.worker_id} ({reason}); reassigning {reassigned} running job(s)")
+        worker.connection.close()
+        for job in failed:
+            self._resolve(job, error=WorkerLostError(f"job for {job.node_name} lost on {job.attempts} worker(s)"))
+        self._send_all(sends)
+
+    def _monitor_loop(self):
+        while not self.stopped.wait(min(1.0, self.heartbeat_timeout / 4)):
+            now = time.monotonic()
+            expired = []
+            with self.lock:
+                silent = [worker for worker in self.workers.values() if now - worker.last_seen > self.heartbeat_timeout]
+                while self.unplaced:
+                    job = self.jobs.get(self.unplaced[0])
+                    if job is not None and now - job.placed_at <= self.unplaced_timeout:
+                        break
+                    self.unplaced.popleft()
+                    if job is not None:
+                        del self.jobs[job.job_id]
+                        self.counters["failed"] += 1
+                        expired.append(job)
+            for worker in silent:
+                self._lose(worker, "missed heartbeats")
+            for job in expired:
+                self._resolve(job, error=WorkerLostError(f"no worker hosting {job.node_name} connected within {self.unplaced_timeout:.0f}s"))
+
+    def report(self):
+        with self.lock:
+            counters = dict(self.counters)
+            workers = len(self.workers)
+        return (
+            f"[Broker] {workers} worker(s) connected; {counters['submitted']} jobs submitted, {counters['completed']} completed, "
+            f"{counters['failed']} failed, {counters['stolen']} stolen, {counters['reassigned']} reassigned after worker loss"
+        )
+
+class RemoteExecutionNode(ExecutionNode):
+    """
+    Manager-side stand-in for an execution node hosted by worker processes: process_task sends the
+    call to the broker and waits for a worker's result. Streaming progress stays on the worker.
+    """
+    def __init__(self, name, description, reputation_score, broker):
+        super().__init__(name, description, reputation_score)
+        self.broker = broker
+
+    @staticmethod
+    def job_args(task, expected_format, context, call_site, stop_after_final_answer):
+        return {
+            "task": task,
+            "expected_format": expected_format,
+            "context": context,
+            "call_site": call_site,
+            "stop_after_final_answer": stop_after_final_answer,
+        }
+
+    def process_task(self, task, expected_format, context=None, call_site="process_task", on_event=None, stop_after_final_answer=True):
+        print(f"[{self.name}] Sending task to a worker...")
+        try:
+            return self.broker.submit(self.name, self.job_args(task, expected_format, context, call_site, stop_after_final_answer)).result()
+        except Exception as e:
+            error_msg = f"Error processing task: {e}"
+            print(f"[{self.name}] {error_msg}")
+            return {"chain_of_thought": "", "final_answer": error_msg}
+
+    async def process_task_async(self, task, expected_format, context=None, call_site="process_task", on_event=None, stop_after_final_answer=True):
+        print(f"[{self.name}] Sending task to a worker...")
+        try:
+            future = self.broker.submit(self.name, self.job_args(task, expected_format, context, call_site, stop_after_final_answer))
+            return await asyncio.wrap_future(future)
+        except Exception as e:
+            error_msg = f"Error processing task: {e}"
+            print(f"[{self.name}] {error_msg}")
+            return {"chain_of_thought": "", "final_answer": error_msg}
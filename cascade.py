@@ -0,0 +1,121 @@
+import json
+import threading
+from config import (
+    MODEL_TIERS, CASCADE_MIN_MEAN_LOGPROB, CASCADE_JUDGE_THRESHOLD, CASCADE_JUDGE_MARGIN
+)
+from structured_output import SCHEMAS, repair_json
+
+SCORE_KEYS = ["logical_coherence", "completeness", "correctness", "clarity", "instruction_following"]
+JUDGE_CALL_SITES = {"agent_as_a_judge", "validate_with_node", "validate_candidates"}
+
+def _load(text):
+    # Parse quietly: the caller parses the reply again (and counts it) once a tier is accepted.
+    try:
+        return json.loads(text)
+    except ValueError:
+        return json.loads(repair_json(text))
+
+def _evaluations(value):
+    """
+    Evaluation dicts in a judge reply, whether at the top level, under "evaluations", or inside an
+    executor-style "final_answer".
+    """
+    if isinstance(value, dict) and isinstance(value.get("final_answer"), (str, dict, list)) and not any(key in value for key in SCORE_KEYS):
+        final_answer = value["final_answer"]
+        value = _load(final_answer) if isinstance(final_answer, str) else final_answer
+    if isinstance(value, dict) and "evaluations" in value:
+        value = value["evaluations"]
+    return value if isinstance(value, list) else [value]
+
+class ModelCascade:
+    """
+    Per-call-site model tiers. A call site listed in `tiers` is first sent to its smallest model and
+    only escalated to the next tier when the reply looks unreliable: it fails to parse, its mean token
+    log-probability is below min_mean_logprob, or (for judges) a score lands within judge_margin of
+    the acceptance threshold, where a wrong call would flip the verdict. The last tier is always final.
+    """
+    def __init__(self, tiers=MODEL_TIERS, min_mean_logprob=CASCADE_MIN_MEAN_LOGPROB,
+                 judge_threshold=CASCADE_JUDGE_THRESHOLD, judge_margin=CASCADE_JUDGE_MARGIN):
+        self.tiers = {call_site: list(models) for call_site, models in tiers.items()}
+        self.min_mean_logprob = min_mean_logprob
+        self.judge_threshold = judge_threshold
+        self.judge_margin = judge_margin
+        self.lock = threading.Lock()
+        self.counters = {}  # { call_site: {"served": {model: count}, "escalations": {reason: count}} }
+
+    def models_for(self, call_site):
+        return self.tiers.get(call_site)
+
+    def tier_kwargs(self, kwargs, model, final):
+        tier_kwargs = dict(kwargs, model=model)
+        if not final and self.min_mean_logprob is not None:
+            tier_kwargs["logprobs"] = True
+        return tier_kwargs
+
+    def stream_kwargs(self, call_site, kwargs):
+        """
+        A streamed reply is yielded as it arrives and cannot be escalated, so it goes to the last tier.
+        """
+        models = self.models_for(call_site)
+        return dict(kwargs, model=models[-1]) if models else kwargs
+
+    def mean_logprob(self, response):
+        logprobs = getattr(response.choices[0], "logprobs", None)
+        content = getattr(logprobs, "content", None)
+        if not content:
+            return None
+        return sum(token.logprob for token in content) / len(content)
+
+    def escalation_reason(self, call_site, response):
+        """
+        Why a lower tier's reply should be escalated, or None to accept it.
+        """
+        text = (response.choices[0].message.content or "").strip()
+        if self.min_mean_logprob is not None:
+            mean_logprob = self.mean_logprob(response)
+            if mean_logprob is not None and mean_logprob < self.min_mean_logprob:
+                return "low confidence"
+        if call_site == "compute_match_score":
+            digits = "".join(filter(str.isdigit, text))
+            return None if digits and 1 <= int(digits) <= 10 else "unparseable score"
+        if call_site not in SCHEMAS and call_site not in JUDGE_CALL_SITES:
+            return None
+        try:
+            value = _load(text)
+        except ValueError:
+            return "unparseable reply"
+        if call_site == "assign_execution_nodes":
+            agents = value.get("agents") if isinstance(value, dict) else value
+            return None if isinstance(agents, list) and agents else "no agents"
+        if call_site in JUDGE_CALL_SITES:
+            try:
+                for evaluation in _evaluations(value):
+                    score = sum(float(evaluation[key]) for key in SCORE_KEYS) / len(SCORE_KEYS)
+                    if abs(score - self.judge_threshold) < self.judge_margin:
+                        return "score near threshold"
+            except (ValueError, TypeError, KeyError):
+                return "incomplete evaluation"
+        return None
+
+    def record(self, call_site, model=None, reason=None):
+        with self.lock:
+            counter = self.counters.setdefault(call_site, {"served": {}, "escalations": {}})
+            if model is not None:
+                counter["served"][model] = counter["served"].get(model, 0) + 1
+            if reason is not None:
+                counter["escalations"][reason] = counter["escalations"].get(reason, 0) + 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                call_site: {"served": dict(counter["served"]), "escalations": dict(counter["escalations"])}
+                for call_site, counter in self.counters.items()
+            }
+
+    def report(self):
+        lines = []
+        for call_site, counter in sorted(self.stats().items()):
+            served = ", ".join(f"{count} by {model}" for model, count in counter["served"].items())
+            escalations = ", ".join(f"{count} {reason}" for reason, count in counter["escalations"].items())
+            lines.append(f"[Cascade] {call_site}: served {served}" + (f"; escalated {escalations}" if escalations else ""))
+        return "\n".join(lines) if lines else "[Cascade] no tiered call sites were used"
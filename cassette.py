@@ -0,0 +1,448 @@
+import gzip
+import json
+import time
+import types
+import atexit
+import asyncio
+import hashlib
+import threading
+from stub_backend import StubChat, StubCompletion, StubUsage, StubChunk, StubEmbedding, StubEmbeddingResponse
+
+# ---------------------------
+# Record/replay of LLM traffic
+# ---------------------------
+# A cassette is a gzipped JSON-lines file: a header naming the backend it was recorded from, optional
+# state snapshots, and one entry per request with the response (or error, or streamed chunks) and the
+# latency it took. Requests are keyed by their arguments plus how many identical requests came before,
+# so retries, repeated prompts and the whole task DAG replay in the recorded order.
+
+CASSETTE_VERSION = 1
+
+def cassette_key(kind, kwargs):
+    """
+    Content address of a request: every argument except stream_options (which only asks for the usage chunk).
+    """
+    material = {name: value for name, value in kwargs.items() if name != "stream_options"}
+    digest = hashlib.sha256(json.dumps([kind, material], sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+class CassetteMissError(Exception):
+    """
+    A replayed run made a request that the recorded run never made (e.g. after a prompt change).
+    """
+
+class ReplayedAPIError(Exception):
+    """
+    A recorded provider failure, raised again on replay with its status code and Retry-After hint.
+    Subclasses named after the original exception keep request_pool's retry decision unchanged.
+    """
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = types.SimpleNamespace(headers={"retry-after": retry_after} if retry_after else {})
+
+_error_classes = {}
+
+def replayed_error(error, time_scale=1.0):
+    cls = _error_classes.get(error["type"])
+    if cls is None:
+        cls = _error_classes.setdefault(error["type"], type(error["type"], (ReplayedAPIError,), {}))
+    retry_after = error.get("retry_after")
+    try:
+        retry_after = str(float(retry_after) * time_scale) if retry_after is not None else None
+    except ValueError:
+        pass
+    return cls(error["message"], error.get("status"), retry_after)
+
+def dump_error(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    return {
+        "type": type(error).__name__,
+        "status": getattr(error, "status_code", None),
+        "message": str(error),
+        "retry_after": headers.get("retry-after"),
+    }
+
+class ReplayedToken:
+    def __init__(self, token, logprob):
+        self.token = token
+        self.logprob = logprob
+
+class ReplayedLogprobs:
+    def __init__(self, tokens):
+        self.content = [ReplayedToken(token, logprob) for token, logprob in tokens]
+
+def dump_usage(usage):
+    if usage is None:
+        return None
+    return [getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0]
+
+def dump_completion(response):
+    choice = response.choices[0]
+    logprobs = getattr(getattr(choice, "logprobs", None), "content", None)
+    return {
+        "model": getattr(response, "model", None),
+        "content": choice.message.content,
+        "finish_reason": getattr(choice, "finish_reason", None),
+        "usage": dump_usage(getattr(response, "usage", None)),
+        "logprobs": [[token.token, token.logprob] for token in logprobs] if logprobs else None,
+    }
+
+def load_completion(payload):
+    usage = StubUsage(*payload["usage"]) if payload.get("usage") else None
+    response = StubCompletion(payload["model"], payload["content"], usage)
+    choice = response.choices[0]
+    choice.finish_reason = payload.get("finish_reason")
+    if payload.get("logprobs"):
+        choice.logprobs = ReplayedLogprobs(payload["logprobs"])
+    return response
+
+def load_chunk(text, usage):
+    return StubChunk(text, StubUsage(*usage) if usage else None)
+
+# ---------------------------
+# Recording
+# ---------------------------
+
+class CassetteRecorder:
+    """
+    Appends every request of the run to a cassette. Entries are flushed as they are written, so the
+    cassette of a run that dies midway can still be replayed up to that point.
+    """
+    def __init__(self, path, backend):
+        self.path = path
+        self.lock = threading.Lock()
+        self.occurrences = {}
+        self.entries = 0
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self._write({"cassette": CASSETTE_VERSION, "backend": backend, "created": time.time()})
+        atexit.register(self.close)
+
+    def next_occurrence(self, key):
+        """
+        How many identical requests were made before this one; taken when the request is sent.
+        """
+        with self.lock:
+            occurrence = self.occurrences.get(key, 0)
+            self.occurrences[key] = occurrence + 1
+            return occurrence
+
+    def record(self, key, occurrence, latency, **outcome):
+        self._write(dict(key=key, n=occurrence, latency=round(latency, 4), **outcome))
+
+    def save_state(self, name, value):
+        """
+        Snapshot of run state that a replay should start from (e.g. learned node reputations).
+        """
+        self._write({"state": name, "value": value})
+
+    def _write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(line + "\n")
+            self.file.flush()
+            if "key" in entry:
+                self.entries += 1
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def report(self):
+        return f"[Cassette] Recorded {self.entries} requests to {self.path}"
+
+class RecordingStream:
+    """
+    Passes a response stream through while recording each chunk with the time since the previous one.
+    The entry is written once the stream is exhausted or closed.
+    """
+    def __init__(self, stream, recorder, key, occurrence, latency):
+        self.stream = stream
+        self.recorder = recorder
+        self.key = key
+        self.occurrence = occurrence
+        self.latency = latency
+        self.chunks = []  # [ [seconds since the previous chunk, text, usage] ]
+        self.last = time.monotonic()
+        self.saved = False
+
+    def _capture(self, chunk):
+        now = time.monotonic()
+        choices = getattr(chunk, "choices", None)
+        text = getattr(choices[0].delta, "content", None) if choices else None
+        usage = dump_usage(getattr(chunk, "usage", None))
+        if text is not None or usage is not None:
+            self.chunks.append([round(now - self.last, 4), text, usage])
+            self.last = now
+
+    def _save(self):
+        if not self.saved:
+            self.saved = True
+            self.recorder.record(self.key, self.occurrence, self.latency, chunks=self.chunks)
+
+    def __iter__(self):
+        try:
+            for chunk in self.stream:
+                self._capture(chunk)
+                yield chunk
+        finally:
+            self._save()
+
+    def close(self):
+        close = getattr(self.stream, "close", None)
+        if close:
+            close()
+        self._save()
+
+class AsyncRecordingStream(RecordingStream):
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        try:
+            async for chunk in self.stream:
+                self._capture(chunk)
+                yield chunk
+        finally:
+            self._save()
+
+    async def close(self):
+        close = getattr(self.stream, "close", None)
+        if close:
+            await close()
+        self._save()
+
+class RecordingCompletions:
+    def __init__(self, completions, recorder):
+        self.completions = completions
+        self.recorder = recorder
+
+    def create(self, **kwargs):
+        key = cassette_key("chat", kwargs)
+        occurrence = self.recorder.next_occurrence(key)
+        started = time.monotonic()
+        try:
+            response = self.completions.create(**kwargs)
+        except Exception as e:
+            self.recorder.record(key, occurrence, time.monotonic() - started, error=dump_error(e))
+            raise
+        if kwargs.get("stream"):
+            return RecordingStream(response, self.recorder, key, occurrence, time.monotonic() - started)
+        self.recorder.record(key, occurrence, time.monotonic() - started, response=dump_completion(response))
+        return response
+
+class AsyncRecordingCompletions(RecordingCompletions):
+    async def create(self, **kwargs):
+        key = cassette_key("chat", kwargs)
+        occurrence = self.recorder.next_occurrence(key)
+        started = time.monotonic()
+        try:
+            response = await self.completions.create(**kwargs)
+        except asyncio.CancelledError:
+            # Early-stopped validators and losing hedges: a replay keeps them pending until cancelled again.
+            self.recorder.record(key, occurrence, time.monotonic() - started, cancelled=True)
+            raise
+        except Exception as e:
+            self.recorder.record(key, occurrence, time.monotonic() - started, error=dump_error(e))
+            raise
+        if kwargs.get("stream"):
+            return AsyncRecordingStream(response, self.recorder, key, occurrence, time.monotonic() - started)
+        self.recorder.record(key, occurrence, time.monotonic() - started, response=dump_completion(response))
+        return response
+
+class RecordingEmbeddings:
+    def __init__(self, embeddings, recorder):
+        self.embeddings = embeddings
+        self.recorder = recorder
+
+    def create(self, input, model=None):
+        key = cassette_key("embeddings", {"input": input, "model": model})
+        occurrence = self.recorder.next_occurrence(key)
+        started = time.monotonic()
+        response = self.embeddings.create(input=input, model=model)
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        self.recorder.record(key, occurrence, time.monotonic() - started, vectors=vectors)
+        return response
+
+class AsyncRecordingEmbeddings(RecordingEmbeddings):
+    async def create(self, input, model=None):
+        key = cassette_key("embeddings", {"input": input, "model": model})
+        occurrence = self.recorder.next_occurrence(key)
+        started = time.monotonic()
+        response = await self.embeddings.create(input=input, model=model)
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        self.recorder.record(key, occurrence, time.monotonic() - started, vectors=vectors)
+        return response
+
+class RecordingClient:
+    """
+    Wraps a client (the openai module, an OpenAI client or StubClient) and records its chat completion
+    and embedding requests.
+    """
+    def __init__(self, client, recorder):
+        self.chat = StubChat(RecordingCompletions(client.chat.completions, recorder))
+        self.embeddings = RecordingEmbeddings(client.embeddings, recorder) if hasattr(client, "embeddings") else None
+
+class AsyncRecordingClient:
+    """
+    Async version of RecordingClient.
+    """
+    def __init__(self, client, recorder):
+        self.chat = StubChat(AsyncRecordingCompletions(client.chat.completions, recorder))
+        self.embeddings = AsyncRecordingEmbeddings(client.embeddings, recorder) if hasattr(client, "embeddings") else None
+
+# ---------------------------
+# Replay
+# ---------------------------
+
+class Cassette:
+    """
+    A recorded run loaded for replay. Each request gets the recorded outcome of the same request with
+    the same number of identical requests before it; requests beyond what was recorded get the last
+    recorded outcome of that request, and requests never recorded raise CassetteMissError.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.backend = None
+        self.state = {}
+        self.recorded = {}  # { key: { occurrence: entry } }
+        self.lock = threading.Lock()
+        self.occurrences = {}
+        self.counters = {"replayed": 0, "repeated": 0, "misses": 0}
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    self._load(line)
+        except (EOFError, ValueError):
+            # A recording cut off by a crash ends in a partial line or gzip block; keep what came before.
+            print(f"[Cassette] {path} ends early; replaying the requests recorded before that point.")
+
+    def _load(self, line):
+        if not line.strip():
+            return
+        entry = json.loads(line)
+        if "cassette" in entry:
+            self.backend = entry.get("backend")
+        elif "state" in entry:
+            self.state[entry["state"]] = entry["value"]
+        else:
+            self.recorded.setdefault(entry["key"], {})[entry["n"]] = entry
+
+    def take(self, key):
+        with self.lock:
+            occurrence = self.occurrences.get(key, 0)
+            self.occurrences[key] = occurrence + 1
+            recorded = self.recorded.get(key)
+            if not recorded:
+                self.counters["misses"] += 1
+                raise CassetteMissError(f"request {key} is not in {self.path}")
+            if occurrence in recorded:
+                self.counters["replayed"] += 1
+                return recorded[occurrence]
+            self.counters["repeated"] += 1
+            return recorded[max(recorded)]
+
+    def report(self):
+        with self.lock:
+            counters = dict(self.counters)
+        return (
+            f"[Cassette] Replayed {counters['replayed']} requests from {self.path}, "
+            f"{counters['repeated']} beyond the recorded count, {counters['misses']} not recorded"
+        )
+
+class ReplayStream:
+    def __init__(self, chunks, time_scale):
+        self.chunks = chunks
+        self.time_scale = time_scale
+        self.closed = False
+
+    def __iter__(self):
+        for delay, text, usage in self.chunks:
+            if self.closed:
+                return
+            time.sleep(delay * self.time_scale)
+            yield load_chunk(text, usage)
+
+    def close(self):
+        self.closed = True
+
+class AsyncReplayStream(ReplayStream):
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        for delay, text, usage in self.chunks:
+            if self.closed:
+                return
+            await asyncio.sleep(delay * self.time_scale)
+            yield load_chunk(text, usage)
+
+    async def close(self):
+        self.closed = True
+
+class ReplayCompletions:
+    def __init__(self, cassette, time_scale):
+        self.cassette = cassette
+        self.time_scale = time_scale
+
+    def create(self, **kwargs):
+        entry = self.cassette.take(cassette_key("chat", kwargs))
+        time.sleep(entry["latency"] * self.time_scale)
+        return self._outcome(entry, ReplayStream)
+
+    def _outcome(self, entry, stream_class):
+        if entry.get("cancelled"):
+            raise CassetteMissError("the recorded request was cancelled before it completed")
+        if "error" in entry:
+            raise replayed_error(entry["error"], self.time_scale)
+        if "chunks" in entry:
+            return stream_class(entry["chunks"], self.time_scale)
+        return load_completion(entry["response"])
+
+class AsyncReplayCompletions(ReplayCompletions):
+    async def create(self, **kwargs):
+        entry = self.cassette.take(cassette_key("chat", kwargs))
+        await asyncio.sleep(entry["latency"] * self.time_scale)
+        if entry.get("cancelled"):
+            # The recorded run cancelled this request at this point; wait for the replay to do the same.
+            await asyncio.get_running_loop().create_future()
+        return self._outcome(entry, AsyncReplayStream)
+
+class ReplayEmbeddings:
+    def __init__(self, cassette, time_scale):
+        self.cassette = cassette
+        self.time_scale = time_scale
+
+    def create(self, input, model=None):
+        entry = self.cassette.take(cassette_key("embeddings", {"input": input, "model": model}))
+        time.sleep(entry["latency"] * self.time_scale)
+        return self._outcome(entry)
+
+    @staticmethod
+    def _outcome(entry):
+        return StubEmbeddingResponse([StubEmbedding(index, vector) for index, vector in enumerate(entry["vectors"])])
+
+class AsyncReplayEmbeddings(ReplayEmbeddings):
+    async def create(self, input, model=None):
+        entry = self.cassette.take(cassette_key("embeddings", {"input": input, "model": model}))
+        await asyncio.sleep(entry["latency"] * self.time_scale)
+        return self._outcome(entry)
+
+class ReplayClient:
+    """
+    Drop-in client serving a cassette's responses after the recorded latency times time_scale.
+    """
+    def __init__(self, cassette, time_scale=1.0):
+        self.cassette = cassette
+        self.chat = StubChat(ReplayCompletions(cassette, time_scale))
+        self.embeddings = ReplayEmbeddings(cassette, time_scale)
+
+class AsyncReplayClient:
+    def __init__(self, cassette, time_scale=1.0):
+        self.cassette = cassette
+        self.chat = StubChat(AsyncReplayCompletions(cassette, time_scale))
+        self.embeddings = AsyncReplayEmbeddings(cassette, time_scale)
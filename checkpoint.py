@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+import threading
+from config import CHECKPOINT_DIR, CHECKPOINT_FSYNC
+
+class CheckpointJournal:
+    """
+    Append-only JSONL journal of one complex task's progress: the decomposition, then every completed
+    subtask (result, agents, validation score) together with the additional steps it inserted.
+    Each event is flushed (and fsynced) as soon as it happens, so after a crash a rerun of the same
+    complex task skips the decomposition and every subtask that had already been validated.
+    A line cut short by the crash is ignored when the journal is read back.
+    """
+    def __init__(self, path, fsync=CHECKPOINT_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.subtasks = None
+        self.completions = []  # [ (task_id, info, inserted additional steps) ] in completion order
+        self._load()
+
+    @classmethod
+    def for_task(cls, complex_task, task_id=None, directory=CHECKPOINT_DIR):
+        """
+        The journal of a complex task, or None if checkpointing is disabled. It is keyed by a hash of the
+        task's text and, for a batch or service task, its ID: concurrent tasks with the same text but
+        different IDs must not resume from, write to or discard each other's journal.
+        """
+        if not directory:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        material = complex_task if task_id is None else json.dumps([str(task_id), complex_task], ensure_ascii=False)
+        key = hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+        return cls(os.path.join(directory, f"{key}.jsonl"))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    print(f"[Checkpoint] Ignoring a truncated entry in {self.path}")
+                    continue
+                if event["event"] == "decomposition":
+                    self.subtasks = event["subtasks"]
+                elif event["event"] == "completed":
+                    self.completions.append((event["id"], event["info"], event["additional_steps"]))
+
+    def _append(self, event):
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line)
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+
+    @property
+    def resumable(self):
+        return self.subtasks is not None
+
+    def record_decomposition(self, subtasks):
+        self.subtasks = subtasks
+        self._append({"event": "decomposition", "subtasks": subtasks})
+
+    def record_completion(self, tid, info, inserted_steps):
+        self._append({"event": "completed", "id": tid, "info": info, "additional_steps": inserted_steps})
+
+    def restore(self, graph):
+        """
+        Replays the recorded completions (and the steps they inserted) into a freshly built TaskGraph.
+        Returns the number of subtasks restored.
+        """
+        for tid, info, steps in self.completions:
+            graph.restore(tid, info, steps)
+        if self.completions:
+            print(f"[Checkpoint] Restored {len(self.completions)} completed subtasks from {self.path}: "
+                  f"{[tid for tid, _, _ in self.completions]}")
+        return len(self.completions)
+
+    def discard(self):
+        """
+        Removes the journal once the complex task has been answered.
+        """
+        with self.lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
@@ -5,17 +5,295 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Ensure your API key is set
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise ValueError("Please set your OPENAI_API_KEY environment variable.")
-
-openai.api_key = openai_api_key
-
 # Use the newest available model.
 DEFAULT_MODEL = "gpt-4o"
 
-# In our code, we refer to the openai module as our client.
-client = openai
+# LLM backend: "openai" calls the API; "stub" uses the deterministic offline backend in stub_backend.py
+# (no API key or network needed), e.g. for benchmark.py; "replay" serves a recorded cassette (see below).
+# Overridable with the LLM_BACKEND variable.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+# Record/replay (cassette.py): with LLM_RECORD set to a path, every chat completion and embedding request
+# of the backend is written to that cassette with its response and latency. LLM_BACKEND=replay then serves
+# the requests of a run from the cassette at LLM_REPLAY, after the recorded latency times
+# REPLAY_TIME_SCALE (0 replays without waiting). Both modes bypass the response, decomposition, answer and
+# embedding caches, so the replayed run makes the same requests as the recorded one.
+LLM_RECORD = os.getenv("LLM_RECORD")
+LLM_REPLAY = os.getenv("LLM_REPLAY", "llm_cassette.jsonl.gz")
+REPLAY_TIME_SCALE = float(os.getenv("REPLAY_TIME_SCALE", "1.0"))
+
+# Stub backend settings: the shape of synthetic decompositions (DAG_DEPTH levels of DAG_WIDTH subtasks),
+# the range judge scores are drawn from, the share of subtasks that get an additional step, the share of
+# calls failing with a 429/5xx, and per-call-site latencies as (median seconds, lognormal sigma), all
+# multiplied by STUB_TIME_SCALE. Replies are reproducible for a given STUB_SEED.
+STUB_SEED = 0
+STUB_DAG_WIDTH = 3
+STUB_DAG_DEPTH = 2
+STUB_SUBTASK_WORDS = 12
+STUB_SCORE_RANGE = (6, 10)
+STUB_ADDITIONAL_STEP_RATE = 0.0
+STUB_FAILURE_RATE = 0.0
+STUB_LATENCY = {
+    "default": (0.6, 0.4),
+    "process_task": (2.0, 0.5),
+    "compile_final_answer": (3.0, 0.4),
+}
+STUB_TIME_SCALE = 1.0
+
+# The CassetteRecorder of a recording run, or the Cassette being replayed.
+cassette = None
+
+if LLM_BACKEND == "openai":
+    # Ensure your API key is set
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise ValueError("Please set your OPENAI_API_KEY environment variable.")
+
+    openai.api_key = openai_api_key
+    # Retries are handled by request_pool (jittered backoff shared across all call sites).
+    openai.max_retries = 0
+
+    # In our code, we refer to the openai module as our client.
+    client = openai
+
+    # Client used by the async engine (the *_async methods); all of its calls share one event loop.
+    async_client = openai.AsyncOpenAI(api_key=openai_api_key, max_retries=0)
+elif LLM_BACKEND == "stub":
+    from stub_backend import StubBackend, StubClient, AsyncStubClient
+
+    openai_api_key = None
+    stub_backend = StubBackend(
+        seed=STUB_SEED,
+        dag_width=STUB_DAG_WIDTH,
+        dag_depth=STUB_DAG_DEPTH,
+        subtask_words=STUB_SUBTASK_WORDS,
+        score_range=STUB_SCORE_RANGE,
+        additional_step_rate=STUB_ADDITIONAL_STEP_RATE,
+        failure_rate=STUB_FAILURE_RATE,
+        latency=STUB_LATENCY,
+        time_scale=STUB_TIME_SCALE,
+    )
+    client = StubClient(stub_backend)
+    async_client = AsyncStubClient(stub_backend)
+elif LLM_BACKEND == "replay":
+    from cassette import Cassette, ReplayClient, AsyncReplayClient
+
+    openai_api_key = None
+    cassette = Cassette(LLM_REPLAY)
+    client = ReplayClient(cassette, REPLAY_TIME_SCALE)
+    async_client = AsyncReplayClient(cassette, REPLAY_TIME_SCALE)
+else:
+    raise ValueError(f"Unknown LLM_BACKEND {LLM_BACKEND!r} (expected 'openai', 'stub' or 'replay').")
+
+if LLM_RECORD:
+    from cassette import CassetteRecorder, RecordingClient, AsyncRecordingClient
+
+    cassette = CassetteRecorder(LLM_RECORD, LLM_BACKEND)
+    client = RecordingClient(client, cassette)
+    async_client = AsyncRecordingClient(async_client, cassette)
+
+# Backend whose embeddings (and embedding cache) are used: a replay reads the recorded backend's.
+EMBEDDING_BACKEND = cassette.backend if LLM_BACKEND == "replay" else LLM_BACKEND
+
+# Run main.py through ManagingNode.process_complex_task_async instead of the thread-based engine.
+USE_ASYNC_ENGINE = False
+
+# Batch mode (python main.py --batch tasks.jsonl): number of complex tasks processed at the same time.
+# Their LLM calls still share the request pool's rate limits.
+BATCH_CONCURRENCY = 4
+
+# Service mode (python server.py): a warm manager accepting complex tasks over HTTP on SERVER_HOST:SERVER_PORT,
+# always with the async engine. SERVER_MAX_RUNNING_TASKS tasks run at once and up to SERVER_MAX_QUEUED_TASKS
+# more wait for a slot; further submissions are rejected with 429 so callers back off. The last
+# SERVER_MAX_FINISHED_TASKS finished tasks stay queryable. Event streams send a keepalive comment after
+# SERVER_KEEPALIVE_INTERVAL idle seconds.
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8080
+SERVER_MAX_RUNNING_TASKS = 4
+SERVER_MAX_QUEUED_TASKS = 32
+SERVER_MAX_FINISHED_TASKS = 1000
+SERVER_MAX_BODY_BYTES = 1024 * 1024
+SERVER_KEEPALIVE_INTERVAL = 15.0
+
+# Worker mode (broker.py, worker.py): with WORKER_BROKER set (or main.py --broker), the manager listens
+# on that address ("tcp://host:port" or "unix:/path/to.sock") and runs every execution and validation
+# call on worker processes started with python worker.py --broker <address>, each running WORKER_CAPACITY
+# jobs at a time. The manager waits up to WORKER_REGISTER_TIMEOUT seconds for workers to register
+# WORKER_MIN_NODES nodes. Workers send a heartbeat every WORKER_HEARTBEAT_INTERVAL seconds and are dropped
+# after WORKER_HEARTBEAT_TIMEOUT seconds of silence; their jobs move to other workers, up to
+# WORKER_MAX_ATTEMPTS dispatches per job. Jobs for a node no worker hosts fail after WORKER_UNPLACED_TIMEOUT.
+# Each worker has its own request pool, so split RATE_LIMIT_RPM/TPM between them.
+WORKER_BROKER = None
+WORKER_MIN_NODES = 1
+WORKER_REGISTER_TIMEOUT = 60.0
+WORKER_CAPACITY = 4
+WORKER_HEARTBEAT_INTERVAL = 2.0
+WORKER_HEARTBEAT_TIMEOUT = 10.0
+WORKER_MAX_ATTEMPTS = 3
+WORKER_UNPLACED_TIMEOUT = 120.0
+WORKER_MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+# Structured output (structured_output.py): "json_schema" enforces each call site's schema through the
+# provider, "json_object" only requests JSON mode, None sends free-text prompts as before. Replies are
+# always parsed with a tolerant repair fallback.
+STRUCTURED_OUTPUT = "json_schema"
+
+# Stream execution-node completions, parsing the JSON reply incrementally and returning as soon as
+# "final_answer" is complete (progress and time-to-first-token are reported along the way).
+STREAM_EXECUTION = False
+
+VALIDATORS_COUNT = 5
+
+# Early-stopping validator quorum: stop collecting votes once the remaining validators can no longer
+# change whether a response meets the acceptance threshold. With VALIDATION_CONFIDENCE_Z set, also
+# stop once the z-interval around the mean of at least VALIDATION_MIN_VOTES votes clears the threshold
+# (e.g. 2.0; None keeps only the exact rule).
+VALIDATION_EARLY_STOP = True
+VALIDATION_CONFIDENCE_Z = None
+VALIDATION_MIN_VOTES = 3
+
+# Comparative validation: when a subtask has several candidate responses, each validator scores all
+# of them in a single call instead of one call per candidate.
+COMPARATIVE_VALIDATION = True
+
+# Maximum number of subtasks the dataflow scheduler runs at the same time.
+MAX_CONCURRENT_SUBTASKS = 8
+
+# Dependency context (context_builder.py): the upstream results passed to a subtask are kept within
+# CONTEXT_TOKEN_BUDGET tokens. When they do not fit, answers longer than CONTEXT_SUMMARY_THRESHOLD
+# tokens are replaced by summaries of about CONTEXT_SUMMARY_TOKENS tokens (least relevant to the
+# subtask first), then the least relevant answers are truncated.
+CONTEXT_TOKEN_BUDGET = 4000
+CONTEXT_SUMMARY_THRESHOLD = 800
+CONTEXT_SUMMARY_TOKENS = 300
+
+# Checkpointing (checkpoint.py): the decomposition and every validated subtask are appended to a
+# journal in CHECKPOINT_DIR (one file per complex task, and per task ID in batch and service mode) as they complete, so rerunning a task after a
+# crash resumes from the last completed subtask. The journal is removed once the final answer is
+# synthesized. CHECKPOINT_FSYNC forces each entry to disk; set CHECKPOINT_DIR to None to disable.
+CHECKPOINT_DIR = ".checkpoints"
+CHECKPOINT_FSYNC = True
+
+# Decomposition memoization (decomposition_cache.py): successful decompositions are kept in
+# DECOMPOSITION_CACHE_PATH (None keeps them in memory only; other backends use their own file), at most
+# DECOMPOSITION_CACHE_MAX_ENTRIES of them, least recently used first out. A complex task that is identical
+# to a stored one, or whose embedding has at least DECOMPOSITION_CACHE_THRESHOLD cosine similarity with
+# it, reuses that subtask DAG with the differing words of the task substituted into the subtasks.
+# Set DECOMPOSITION_CACHE_THRESHOLD to None to always decompose from scratch. New decompositions are written
+# at most every DECOMPOSITION_CACHE_FLUSH_INTERVAL seconds, when the service stops, and at exit.
+DECOMPOSITION_CACHE_PATH = ".decompositions.json" if LLM_BACKEND == "openai" else f".decompositions.{LLM_BACKEND}.json"
+DECOMPOSITION_CACHE_THRESHOLD = 0.96
+DECOMPOSITION_CACHE_MAX_ENTRIES = 500
+DECOMPOSITION_CACHE_FLUSH_INTERVAL = 60.0
+
+# Answer store (answer_store.py): validated subtask results scoring at least ANSWER_STORE_MIN_SCORE (the
+# acceptance threshold) are kept in ANSWER_STORE_PATH (None disables the store; other backends use their
+# own file), keyed by subtask text and a fingerprint of the upstream results they were computed from.
+# A later subtask with the same upstream results and the same text, or an embedding with at least
+# ANSWER_STORE_THRESHOLD cosine similarity (None = exact matches only), reuses the result without running
+# any agent. Entries expire after ANSWER_STORE_TTL seconds (None = never); beyond ANSWER_STORE_MAX_ENTRIES
+# the lowest-scoring, least recently used go first. main.py --recompute ignores stored results.
+ANSWER_STORE_PATH = ".answers.sqlite3" if LLM_BACKEND == "openai" else f".answers.{LLM_BACKEND}.sqlite3"
+ANSWER_STORE_THRESHOLD = 0.98
+ANSWER_STORE_MIN_SCORE = 7
+ANSWER_STORE_TTL = 14 * 24 * 3600
+ANSWER_STORE_MAX_ENTRIES = 20000
+
+# Agent routing: subtasks are matched against node descriptions through an embedding index.
+# When the last chosen agent and the runner-up are within ROUTING_TIEBREAK_MARGIN of each other,
+# the LLM delegation prompt is used to break the tie (set LLM_TIEBREAK = False to never call it).
+LLM_TIEBREAK = True
+ROUTING_TIEBREAK_MARGIN = 0.02
+
+# Reputation learning (reputation.py): validation scores, acceptance rates and execution latencies are
+# tracked per node and domain in REPUTATION_PATH (None keeps them in memory only; other backends use
+# their own file) and feed routing.
+# A subtask's domain is the entry below whose description is closest to it. The static reputation_score
+# counts as REPUTATION_PRIOR_WEIGHT observations; REPUTATION_DECAY is the weight of each new observation
+# in the running averages, and responses slower than REPUTATION_LATENCY_TARGET seconds lose a little.
+# Changes are written at most every REPUTATION_FLUSH_INTERVAL seconds while a run or server is going,
+# and at exit.
+REPUTATION_PATH = ".reputation.json" if LLM_BACKEND == "openai" else f".reputation.{LLM_BACKEND}.json"
+REPUTATION_PRIOR_WEIGHT = 5
+REPUTATION_DECAY = 0.2
+REPUTATION_LATENCY_TARGET = 30.0
+REPUTATION_FLUSH_INTERVAL = 60.0
+REPUTATION_DOMAINS = {
+    "math": "Arithmetic, numerical calculations, equations and mathematical proofs.",
+    "reasoning": "Logical analysis, puzzles, planning and step-by-step problem solving.",
+    "data": "Data analysis, statistics, trends, tables and quantitative research.",
+    "writing": "Writing, summarizing, explaining and editing natural-language text.",
+    "code": "Programming, software design, debugging and algorithms.",
+    "knowledge": "Factual questions about history, science, geography and general knowledge.",
+}
+
+# Shared request pool (request_pool.py): provider quota for the account/model, and retry policy
+# for rate-limited (429) and transient (5xx) responses.
+RATE_LIMIT_RPM = 500
+RATE_LIMIT_TPM = 450000
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# Request hedging (hedging.py): completion latencies are tracked per model, and a request from a call
+# site listed in HEDGE_CALL_SITES that is still outstanding past the given latency percentile gets a
+# duplicate (sent to HEDGE_MODEL if set); the first success wins. Hedging starts once a model has
+# HEDGE_MIN_SAMPLES latencies, never fires before HEDGE_MIN_DELAY seconds, only uses quota that is
+# free right now, and is capped at HEDGE_BUDGET hedges per hedgeable request. Streamed calls are not hedged.
+HEDGE_CALL_SITES = {
+    "process_task": 95,
+    "validate_with_node": 95,
+    "validate_candidates": 95,
+    "agent_as_a_judge": 95,
+}
+HEDGE_BUDGET = 0.05
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 2.0
+HEDGE_MODEL = None
+
+# Model cascade (cascade.py): call sites listed in MODEL_TIERS are sent to their first (cheapest) model
+# and escalated to the next one only when the reply looks unreliable: it does not parse, its mean token
+# log-probability is below CASCADE_MIN_MEAN_LOGPROB (None disables the check), or a judge's average score
+# is within CASCADE_JUDGE_MARGIN of CASCADE_JUDGE_THRESHOLD, where a wrong call would flip the verdict.
+# The last tier is always accepted. Streamed calls go straight to the last tier.
+MODEL_TIERS = {
+    "compute_match_score": ["gpt-4o-mini", "gpt-4o"],
+    "assign_execution_nodes": ["gpt-4o-mini", "gpt-4o"],
+    "agent_as_a_judge": ["gpt-4o-mini", "gpt-4o"],
+    "validate_with_node": ["gpt-4o-mini", "gpt-4o"],
+    "validate_candidates": ["gpt-4o-mini", "gpt-4o"],
+}
+CASCADE_MIN_MEAN_LOGPROB = -0.5
+CASCADE_JUDGE_THRESHOLD = 7
+CASCADE_JUDGE_MARGIN = 1.0
+
+# Response cache (response_cache.py): SQLite file of completed requests, keyed on every argument that
+# can change the reply (model, messages, sampling parameters, response_format, ...). Only the call sites listed here are cached, each with a TTL in
+# seconds (None = never expires); least recently used entries go first once the size cap is hit.
+# Set RESPONSE_CACHE_PATH to None to disable caching entirely. Non-OpenAI backends use their own file.
+RESPONSE_CACHE_PATH = ".llm_cache.sqlite3" if LLM_BACKEND == "openai" else f".llm_cache.{LLM_BACKEND}.sqlite3"
+RESPONSE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+RESPONSE_CACHE_POLICIES = {
+    "compute_match_score": 30 * 24 * 3600,
+    "agent_as_a_judge": 7 * 24 * 3600,
+    "assign_execution_nodes": 24 * 3600,
+    "summarize_context": 30 * 24 * 3600,
+}
+
+# Single-flight (single_flight.py): a request identical to one already in flight (same call site, model,
+# messages and parameters), e.g. from duplicate subtasks or concurrent complex tasks, waits for that request
+# and shares its reply instead of being sent. Only the call sites listed here are coalesced; like the cached
+# ones, their replies are safe to share. Streamed requests are never coalesced.
+SINGLE_FLIGHT_CALL_SITES = {"compute_match_score", "assign_execution_nodes", "agent_as_a_judge", "summarize_context"}
 
-VALIDATORS_COUNT = 5
\ No newline at end of file
+# Tracing (tracing.py): every LLM call and scheduler phase is recorded as a span. At the end of a run
+# the trace is written to <TRACE_OUTPUT>.json and <TRACE_OUTPUT>.chrome.json (open the latter in
+# chrome://tracing or Perfetto); set TRACE_OUTPUT to None to skip the export. Batch mode and the service
+# (server.py) instead take each task's spans out of the tracer once it finishes and append them to
+# <TRACE_OUTPUT>.tasks.jsonl, one line per task, so a long-running process does not accumulate spans.
+# MODEL_PRICES gives USD per million (prompt, completion) tokens, used to attach a cost to LLM spans.
+TRACE_OUTPUT = "trace"
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
@@ -0,0 +1,206 @@
+import string
+import hashlib
+import asyncio
+import threading
+import numpy as np
+from config import DEFAULT_MODEL, CONTEXT_TOKEN_BUDGET, CONTEXT_SUMMARY_THRESHOLD, CONTEXT_SUMMARY_TOKENS
+from request_pool import request_pool
+from embedding import get_embeddings
+
+# Only the beginning of very long answers is embedded for ranking (the embedding model's input is limited).
+RELEVANCE_TEXT_CHARS = 8000
+
+def count_tokens(text):
+    """
+    Rough token count (~4 characters per token), the same estimate the request pool admits requests with.
+    """
+    return len(text) // 4
+
+class ContextBuilder:
+    """
+    Builds the dependency context of a subtask within a token budget.
+    Upstream results are ranked by relevance to the subtask (embedding similarity, or word overlap if
+    embeddings are unavailable). When they do not fit, oversized answers are replaced with summaries,
+    least relevant first, and if that is still not enough the least relevant answers are truncated.
+    Summaries are cached in memory and (through the response cache) on disk, so an upstream answer is
+    summarized once however many dependents, executors and validators reuse it.
+    """
+    def __init__(self, budget=CONTEXT_TOKEN_BUDGET, summary_threshold=CONTEXT_SUMMARY_THRESHOLD,
+                 summary_tokens=CONTEXT_SUMMARY_TOKENS, max_cached_summaries=1024):
+        self.budget = budget
+        self.summary_threshold = summary_threshold
+        self.summary_tokens = summary_tokens
+        self.max_cached_summaries = max_cached_summaries
+        self.summaries = {}  # { sha256 of answer: summary }, oldest first
+        self.lock = threading.Lock()
+
+    # ---------------------------
+    # Relevance
+    # ---------------------------
+
+    @staticmethod
+    def word_overlap(subtask, answers):
+        translator = str.maketrans('', '', string.punctuation)
+        subtask_words = set(subtask.translate(translator).lower().split())
+        scores = []
+        for answer in answers:
+            answer_words = set(answer.translate(translator).lower().split())
+            union = subtask_words | answer_words
+            scores.append(len(subtask_words & answer_words) / len(union) if union else 0.0)
+        return scores
+
+    def relevance(self, subtask, answers):
+        """
+        Relevance of each answer to the subtask, higher is more relevant.
+        """
+        try:
+            vectors = get_embeddings([subtask[:RELEVANCE_TEXT_CHARS]] + [answer[:RELEVANCE_TEXT_CHARS] for answer in answers])
+            norms = np.linalg.norm(vectors, axis=1)
+            norms[norms == 0] = 1.0
+            vectors = vectors / norms[:, None]
+            return [float(score) for score in vectors[1:] @ vectors[0]]
+        except Exception as e:
+            print(f"[Context] Embedding-based ranking failed: {e}. Falling back to word overlap.")
+            return self.word_overlap(subtask, answers)
+
+    # ---------------------------
+    # Summaries
+    # ---------------------------
+
+    def build_summary_messages(self, answer):
+        prompt = (
+            f"Summarize the following result of a subtask in at most {self.summary_tokens * 3 // 4} words. "
+            "It will be used as context by later subtasks, so keep every number, name, decision and conclusion, "
+            "and drop the reasoning that led to them. Return only the summary.\n\n"
+            f"Result:\n{answer}"
+        )
+        return [
+            {"role": "system", "content": "You are an expert summarizer."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def cached_summary(self, answer):
+        key = hashlib.sha256(answer.encode("utf-8")).hexdigest()
+        with self.lock:
+            return key, self.summaries.get(key)
+
+    def store_summary(self, key, summary):
+        with self.lock:
+            self.summaries[key] = summary
+            while len(self.summaries) > self.max_cached_summaries:
+                del self.summaries[next(iter(self.summaries))]
+
+    def summarize(self, answer):
+        key, summary = self.cached_summary(answer)
+        if summary is not None:
+            return summary
+        response = request_pool.create(
+            call_site="summarize_context",
+            model=DEFAULT_MODEL,
+            messages=self.build_summary_messages(answer),
+            temperature=0,
+            max_tokens=self.summary_tokens * 2,
+        )
+        summary = response.choices[0].message.content.strip()
+        self.store_summary(key, summary)
+        return summary
+
+    async def summarize_async(self, answer):
+        key, summary = self.cached_summary(answer)
+        if summary is not None:
+            return summary
+        response = await request_pool.create_async(
+            call_site="summarize_context",
+            model=DEFAULT_MODEL,
+            messages=self.build_summary_messages(answer),
+            temperature=0,
+            max_tokens=self.summary_tokens * 2,
+        )
+        summary = response.choices[0].message.content.strip()
+        self.store_summary(key, summary)
+        return summary
+
+    # ---------------------------
+    # Building the context
+    # ---------------------------
+
+    def rank(self, subtask, dependency_results):
+        """
+        Returns [dep_id, answer, relevance] entries, most relevant first.
+        """
+        entries = [[dep, str(answer), 0.0] for dep, answer in dependency_results]
+        if len(entries) > 1:
+            for entry, score in zip(entries, self.relevance(subtask, [entry[1] for entry in entries])):
+                entry[2] = score
+            entries.sort(key=lambda entry: -entry[2])
+        return entries
+
+    @staticmethod
+    def line(dep, answer):
+        return f"{dep}: {answer}\n"
+
+    def total_tokens(self, entries):
+        return sum(count_tokens(self.line(dep, answer)) for dep, answer, *_ in entries)
+
+    def summary_candidates(self, entries):
+        """
+        Yields the entries to summarize while the context is over budget: oversized answers,
+        least relevant first. The caller replaces entry[1] with the summary before the next one.
+        """
+        for entry in reversed(entries):
+            if self.total_tokens(entries) <= self.budget:
+                return
+            if count_tokens(entry[1]) > self.summary_threshold:
+                yield entry
+
+    def truncate(self, entries):
+        """
+        Truncates the least relevant answers until the context fits the budget.
+        """
+        for entry in reversed(entries):
+            excess = self.total_tokens(entries) - self.budget
+            if excess <= 0:
+                break
+            keep = count_tokens(entry[1]) - excess - count_tokens(" [truncated]")
+            entry[1] = entry[1][:keep * 4] + " [truncated]" if keep > 0 else "[omitted to fit the context budget]"
+
+    def render(self, entries):
+        return "".join(self.line(dep, answer) for dep, answer, *_ in entries).rstrip("\n")
+
+    def fits(self, dependency_results):
+        return self.total_tokens([(dep, str(answer)) for dep, answer in dependency_results]) <= self.budget
+
+    def build(self, subtask, dependency_results):
+        """
+        Context for a subtask from [(dependency ID, final answer)] pairs, within the token budget.
+        """
+        if self.fits(dependency_results):
+            return self.render(dependency_results)
+        entries = self.rank(subtask, dependency_results)
+        for entry in self.summary_candidates(entries):
+            try:
+                entry[1] = self.summarize(entry[1])
+            except Exception as e:
+                print(f"[Context] Failed to summarize the result of {entry[0]}: {e}")
+        self.truncate(entries)
+        context = self.render(entries)
+        print(f"[Context] Compacted dependency context to ~{count_tokens(context)} tokens (budget {self.budget})")
+        return context
+
+    async def build_async(self, subtask, dependency_results):
+        """
+        Async version of build.
+        """
+        if self.fits(dependency_results):
+            return self.render(dependency_results)
+        # Ranking embeds locally cached texts and is blocking, so it runs off the loop.
+        entries = await asyncio.to_thread(self.rank, subtask, dependency_results)
+        for entry in self.summary_candidates(entries):
+            try:
+                entry[1] = await self.summarize_async(entry[1])
+            except Exception as e:
+                print(f"[Context] Failed to summarize the result of {entry[0]}: {e}")
+        self.truncate(entries)
+        context = self.render(entries)
+        print(f"[Context] Compacted dependency context to ~{count_tokens(context)} tokens (budget {self.budget})")
+        return context
@@ -0,0 +1,218 @@
+import os
+import re
+import copy
+import json
+import time
+import atexit
+import difflib
+import threading
+import numpy as np
+from config import (
+    DECOMPOSITION_CACHE_PATH, DECOMPOSITION_CACHE_THRESHOLD, DECOMPOSITION_CACHE_MAX_ENTRIES,
+    DECOMPOSITION_CACHE_FLUSH_INTERVAL
+)
+from embedding import get_embeddings
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def normalize_subtasks(subtasks):
+    """
+    Subtasks renumbered T1..Tn in order, with dependencies remapped (unknown ones dropped),
+    or None if the list is not a usable decomposition.
+    """
+    if not isinstance(subtasks, list) or not subtasks:
+        return None
+    if not all(isinstance(subtask, dict) and "id" in subtask and "task" in subtask for subtask in subtasks):
+        return None
+    ids = {}
+    for index, subtask in enumerate(subtasks, 1):
+        ids.setdefault(str(subtask["id"]), f"T{index}")
+    normalized = []
+    for index, subtask in enumerate(subtasks, 1):
+        dependencies = subtask.get("dependencies") or []
+        normalized.append({
+            "id": f"T{index}",
+            "task": str(subtask["task"]),
+            "dependencies": [ids[str(dep)] for dep in dependencies if str(dep) in ids and ids[str(dep)] != f"T{index}"],
+        })
+    return normalized
+
+def substitutions(source_task, target_task):
+    """
+    (source text, target text) pairs for the spans that differ between two versions of a task,
+    e.g. [("Q1 2023", "Q2 2024")] for two instances of the same template.
+    """
+    source_tokens = list(TOKEN_PATTERN.finditer(source_task))
+    target_tokens = list(TOKEN_PATTERN.finditer(target_task))
+    matcher = difflib.SequenceMatcher(
+        None, [token.group() for token in source_tokens], [token.group() for token in target_tokens], autojunk=False
+    )
+    pairs = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "replace":
+            continue
+        source = source_task[source_tokens[i1].start():source_tokens[i2 - 1].end()]
+        target = target_task[target_tokens[j1].start():target_tokens[j2 - 1].end()]
+        pairs.append((source, target))
+    return pairs
+
+def rebind(subtasks, source_task, target_task):
+    """
+    Copies a stored decomposition for a new task, replacing the spans of the stored task's text that
+    differ from the new task wherever they appear in the subtasks.
+    """
+    subtasks = copy.deepcopy(subtasks)
+    replacements = dict(substitutions(source_task, target_task))
+    if not replacements:
+        return subtasks
+    # One pass over each text, longest spans first, so a replaced span is never replaced again.
+    pattern = re.compile(
+        "|".join(rf"(?<!\w){re.escape(source)}(?!\w)" for source in sorted(replacements, key=len, reverse=True))
+    )
+    for subtask in subtasks:
+        subtask["task"] = pattern.sub(lambda match: replacements[match.group()], subtask["task"])
+    return subtasks
+
+class DecompositionCache:
+    """
+    Bounded, persisted store of subtask DAGs keyed by complex task. A new task that is identical to,
+    or whose embedding is within `threshold` cosine similarity of, a stored task reuses that task's
+    decomposition (rebound to the new task's wording) instead of calling the LLM. The nearest-neighbour
+    index is a normalized embedding matrix built from the embedding cache, so it is rebuilt cheaply
+    after a store. Entries are kept in least recently used order and written to disk when dirty, at most
+    every flush_interval seconds after a store, and at exit.
+    """
+    def __init__(self, path=DECOMPOSITION_CACHE_PATH, threshold=DECOMPOSITION_CACHE_THRESHOLD,
+                 max_entries=DECOMPOSITION_CACHE_MAX_ENTRIES, flush_interval=DECOMPOSITION_CACHE_FLUSH_INTERVAL):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # Serializes writers of the file
+        self.entries = {}  # { complex task: subtasks }, least recently used first
+        self.dirty = False
+        self.last_flush = time.monotonic()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._index_tasks = None
+        self._index_matrix = None
+        self._load()
+        if self.path:
+            atexit.register(self.flush)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Decomposition] Could not load {self.path}: {e}. Starting with an empty cache.")
+
+    def flush(self):
+        """
+        Writes the cache to disk if it changed (atomically, through a temporary file).
+        """
+        with self.flush_lock:
+            with self.lock:
+                self.last_flush = time.monotonic()
+                if not self.path or not self.dirty:
+                    return
+                payload = json.dumps(self.entries, indent=2)
+                self.dirty = False
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(temp_path, self.path)
+
+    def _flush_if_due(self):
+        if self.path and self.flush_interval is not None and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def _touch(self, complex_task):
+        self.entries[complex_task] = self.entries.pop(complex_task)
+        self.dirty = True
+
+    def _index(self):
+        """
+        Stored tasks and their normalized embedding matrix, rebuilt after the entries change.
+        """
+        with self.lock:
+            tasks = list(self.entries)
+            if self._index_tasks is not None and set(self._index_tasks) == set(tasks):
+                return self._index_tasks, self._index_matrix
+        matrix = get_embeddings(tasks)
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms[:, None]
+        with self.lock:
+            self._index_tasks, self._index_matrix = tasks, matrix
+        return tasks, matrix
+
+    def lookup(self, complex_task):
+        """
+        A decomposition for the task from the cache as (subtasks, similarity), or None on a miss.
+        """
+        if self.threshold is None:
+            return None
+        with self.lock:
+            subtasks = self.entries.get(complex_task)
+            if subtasks is not None:
+                self._touch(complex_task)
+                self.hits += 1
+                return copy.deepcopy(subtasks), 1.0
+            empty = not self.entries
+        if empty:
+            with self.lock:
+                self.misses += 1
+            return None
+        try:
+            tasks, matrix = self._index()
+            query = get_embeddings([complex_task])[0]
+            query = query / (np.linalg.norm(query) or 1.0)
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+        except Exception as e:
+            print(f"[Decomposition] Similarity lookup failed: {e}")
+            similarity = None
+        with self.lock:
+            if similarity is None or similarity < self.threshold or tasks[best] not in self.entries:
+                self.misses += 1
+                return None
+            source_task = tasks[best]
+            subtasks = self.entries[source_task]
+            self._touch(source_task)
+            self.near_hits += 1
+        return rebind(subtasks, source_task, complex_task), similarity
+
+    def store(self, complex_task, subtasks):
+        """
+        Remembers a successful decomposition, evicting the least recently used entries beyond max_entries.
+        """
+        if self.threshold is None or self.max_entries <= 0:
+            return
+        normalized = normalize_subtasks(subtasks)
+        if normalized is None:
+            return
+        with self.lock:
+            self.entries.pop(complex_task, None)
+            self.entries[complex_task] = normalized
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+            self.dirty = True
+        self._flush_if_due()
+
+    def report(self):
+        with self.lock:
+            lookups = self.hits + self.near_hits + self.misses
+            if not lookups:
+                return "[Decomposition] no lookups"
+            return (
+                f"[Decomposition] {self.hits} exact and {self.near_hits} near-duplicate hits, {self.misses} misses "
+                f"({(self.hits + self.near_hits) / lookups * 100:.0f}% of decompositions reused), {len(self.entries)} stored"
+            )
+
+decomposition_cache = DecompositionCache()
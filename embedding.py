@@ -1,22 +1,300 @@
 import openai
 import os
+import json
+import time
+import atexit
+import asyncio
+import hashlib
+import threading
+import numpy as np
+from config import (
+    LLM_BACKEND, EMBEDDING_BACKEND, openai_api_key, client as llm_client, async_client as llm_async_client,
+    cassette as llm_cassette
+)
+from cassette import RecordingClient, AsyncRecordingClient
 
-openai_api_key = os.getenv("OPENAI_API_KEY")
-if not openai_api_key:
-    raise ValueError("Please set your OPENAI_API_KEY environment variable.")
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
 
-def get_embedding(text, model="text-embedding-ada-002"):
-    client = openai.OpenAI()
-    response = client.embeddings.create(
-        input=text,
-        model=model
-    )
-    return response.data[0].embedding
+# Maximum number of inputs sent in a single embeddings request (the API accepts up to 2048).
+EMBEDDING_BATCH_SIZE = 512
+
+# On-disk embedding store. Set EMBEDDING_CACHE_DIR to None to disable persistence.
+EMBEDDING_CACHE_DIR = ".embedding_cache"
+EMBEDDING_CACHE_MAX_ENTRIES = 50000
+# New vectors are indexed on disk at most every EMBEDDING_FLUSH_INTERVAL seconds, and at exit.
+EMBEDDING_FLUSH_INTERVAL = 30.0
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Returns the shared OpenAI client, creating it on first use (the configured client for other backends).
+    """
+    global _client
+    if LLM_BACKEND != "openai":
+        return llm_client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = openai.OpenAI(api_key=openai_api_key)
+                if llm_cassette is not None:
+                    # Recording: the API client is only wrapped here, as embeddings bypass config.client.
+                    _client = RecordingClient(_client, llm_cassette)
+    return _client
+
+def get_async_client():
+    """
+    Async version of get_client, used by the async engine.
+    """
+    global _async_client
+    if LLM_BACKEND != "openai":
+        return llm_async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = openai.AsyncOpenAI(api_key=openai_api_key)
+                if llm_cassette is not None:
+                    _async_client = AsyncRecordingClient(_async_client, llm_cassette)
+    return _async_client
+
+class EmbeddingStore:
+    """
+    Persistent, content-hash keyed embedding store for a single model.
+    Vectors live in a memory-mapped float32 matrix ("vectors.f32"); "index.json" maps the
+    SHA-256 of each text to its row and a last-used tick. Once max_entries rows are in use,
+    the least recently used rows are evicted and their slots reused. The index is rewritten at most
+    every flush_interval seconds (and at exit), except that an eviction is saved before the evicted
+    rows are overwritten, so the index on disk never points at another text's vector.
+    """
+    def __init__(self, directory, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, flush_interval=EMBEDDING_FLUSH_INTERVAL):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.matrix_path = os.path.join(directory, "vectors.f32")
+        self.index_path = os.path.join(directory, "index.json")
+        self.lock = threading.Lock()
+        self.dim = None
+        self.capacity = 0
+        self.tick = 0
+        self.rows = {}  # { key: [row, last_used_tick] }
+        self.free_rows = []
+        self.matrix = None
+        self.dirty = False
+        self.last_save = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.dim = data["dim"]
+            self.capacity = data["capacity"]
+            self.tick = data["tick"]
+            self.rows = data["rows"]
+            self.free_rows = data["free_rows"]
+            if self.dim and self.capacity:
+                self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(self.index_path):
+                print(f"[Embedding] Discarding unreadable embedding store at {self.directory}: {e}")
+            self.dim, self.capacity, self.tick, self.rows, self.free_rows, self.matrix = None, 0, 0, {}, [], None
+
+    def _save(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+        data = {
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "tick": self.tick,
+            "rows": self.rows,
+            "free_rows": self.free_rows,
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+        self.last_save = time.monotonic()
+
+    def flush(self):
+        """
+        Persists vectors and last-used ticks recorded since the last save.
+        """
+        with self.lock:
+            if self.dirty:
+                self._save()
+
+    def _grow(self, needed):
+        new_capacity = min(self.max_entries, max(needed, self.capacity * 2, 1024))
+        if new_capacity <= self.capacity:
+            return
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+        with open(self.matrix_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self.free_rows.extend(range(self.capacity, new_capacity))
+        self.capacity = new_capacity
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    def _evict(self, count):
+        victims = sorted(self.rows.items(), key=lambda item: item[1][1])[:count]
+        for key, (row, _) in victims:
+            del self.rows[key]
+            self.free_rows.append(row)
+
+    def get_many(self, keys):
+        """
+        Returns a dict mapping every cached key among `keys` to a copy of its vector.
+        """
+        found = {}
+        with self.lock:
+            for key in keys:
+                entry = self.rows.get(key)
+                if entry is not None:
+                    self.tick += 1
+                    entry[1] = self.tick
+                    found[key] = np.array(self.matrix[entry[0]])
+                    self.dirty = True
+        return found
+
+    def put_many(self, items):
+        """
+        Stores a dict mapping keys to vectors, evicting the least recently used entries if needed.
+        """
+        if not items:
+            return
+        with self.lock:
+            if self.dim is None:
+                self.dim = len(next(iter(items.values())))
+            new_keys = [key for key in items if key not in self.rows]
+            needed = len(self.rows) + len(new_keys)
+            if needed > self.capacity:
+                self._grow(needed)
+            shortfall = len(new_keys) - len(self.free_rows)
+            if shortfall > 0:
+                self._evict(shortfall)
+                self._save()
+            for key, vector in items.items():
+                if len(vector) != self.dim:
+                    continue
+                entry = self.rows.get(key)
+                if entry is None:
+                    if not self.free_rows:
+                        continue
+                    entry = [self.free_rows.pop(), 0]
+                    self.rows[key] = entry
+                self.tick += 1
+                entry[1] = self.tick
+                self.matrix[entry[0]] = np.asarray(vector, dtype=np.float32)
+            self.dirty = True
+            if time.monotonic() - self.last_save >= self.flush_interval:
+                self._save()
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(model):
+    """
+    Returns the persistent store for the given model, or None if caching is disabled.
+    """
+    if not EMBEDDING_CACHE_DIR:
+        return None
+    with _stores_lock:
+        if model not in _stores:
+            safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in model)
+            # Other backends get their own directory so synthetic vectors never mix with real ones.
+            directory = EMBEDDING_CACHE_DIR if EMBEDDING_BACKEND == "openai" else os.path.join(EMBEDDING_CACHE_DIR, EMBEDDING_BACKEND)
+            _stores[model] = EmbeddingStore(os.path.join(directory, safe_name), EMBEDDING_CACHE_MAX_ENTRIES)
+            atexit.register(_stores[model].flush)
+        return _stores[model]
+
+def _cached_embeddings(texts, model):
+    """
+    Looks texts up in the on-disk store. Returns (store, keys, vectors found, {key: text} left to embed).
+    """
+    store = get_store(model)
+    keys = [EmbeddingStore.key(text) for text in texts]
+    vectors = store.get_many(set(keys)) if store else {}
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors and key not in missing:
+            missing[key] = text
+    return store, keys, vectors, missing
+
+def get_embeddings(texts, model=DEFAULT_EMBEDDING_MODEL, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    Embeds a list of texts and returns a float32 matrix with one row per text.
+    Texts already in the on-disk store are served locally; the rest are deduplicated and
+    sent in as few requests as possible, `batch_size` inputs per request.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    store, keys, vectors, missing = _cached_embeddings(texts, model)
+    if missing:
+        missing_keys = list(missing)
+        fetched = {}
+        for start in range(0, len(missing_keys), batch_size):
+            chunk_keys = missing_keys[start:start + batch_size]
+            response = get_client().embeddings.create(
+                input=[missing[key] for key in chunk_keys],
+                model=model
+            )
+            for item in response.data:
+                fetched[chunk_keys[item.index]] = np.asarray(item.embedding, dtype=np.float32)
+        if store:
+            store.put_many(fetched)
+        vectors.update(fetched)
+
+    return np.stack([vectors[key] for key in keys])
+
+async def get_embeddings_async(texts, model=DEFAULT_EMBEDDING_MODEL, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    Async version of get_embeddings: requests are awaited on the async client, and writes to the
+    on-disk store run off the event loop.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    store, keys, vectors, missing = _cached_embeddings(texts, model)
+    if missing:
+        missing_keys = list(missing)
+        fetched = {}
+        for start in range(0, len(missing_keys), batch_size):
+            chunk_keys = missing_keys[start:start + batch_size]
+            response = await get_async_client().embeddings.create(
+                input=[missing[key] for key in chunk_keys],
+                model=model
+            )
+            for item in response.data:
+                fetched[chunk_keys[item.index]] = np.asarray(item.embedding, dtype=np.float32)
+        if store:
+            await asyncio.to_thread(store.put_many, fetched)
+        vectors.update(fetched)
+
+    return np.stack([vectors[key] for key in keys])
+
+def get_embedding(text, model=DEFAULT_EMBEDDING_MODEL):
+    return get_embeddings([text], model=model)[0].tolist()
+
+async def get_embedding_async(text, model=DEFAULT_EMBEDDING_MODEL):
+    return (await get_embeddings_async([text], model=model))[0].tolist()
 
 def main():
     openai.api_key = openai_api_key
     user_input = input("Enter text to generate embedding: ")
-    
+
     embedding = get_embedding(user_input)
     print("\nGenerated Embedding:")
     print(embedding)
@@ -0,0 +1,99 @@
+import math
+import threading
+from config import HEDGE_CALL_SITES, HEDGE_BUDGET, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY, HEDGE_MODEL
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram: bucket i holds latencies up to min_latency * growth**i seconds,
+    so percentiles are accurate to within one growth step (10%) across milliseconds to minutes
+    in a fixed amount of memory.
+    """
+    def __init__(self, min_latency=0.01, max_latency=600.0, growth=1.1):
+        self.min_latency = min_latency
+        self.growth = growth
+        self.counts = [0] * (int(math.log(max_latency / min_latency, growth)) + 2)
+        self.total = 0
+
+    def bucket(self, seconds):
+        if seconds <= self.min_latency:
+            return 0
+        return min(len(self.counts) - 1, int(math.ceil(math.log(seconds / self.min_latency, self.growth))))
+
+    def add(self, seconds):
+        self.counts[self.bucket(seconds)] += 1
+        self.total += 1
+
+    def percentile(self, q):
+        """
+        Upper bound of the bucket holding the q-th percentile (0-100), or None if empty.
+        """
+        if not self.total:
+            return None
+        rank = self.total * q / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.min_latency * self.growth ** index
+        return self.min_latency * self.growth ** (len(self.counts) - 1)
+
+class HedgePolicy:
+    """
+    Decides when a slow request gets a duplicate. Completion latencies are tracked per model; a call
+    site listed in `call_sites` is hedged once its request has been outstanding longer than the
+    configured percentile of its model's latency (and at least min_delay). Hedges are capped at
+    `budget` times the number of hedgeable requests so the extra spend stays bounded.
+    """
+    def __init__(self, call_sites=HEDGE_CALL_SITES, budget=HEDGE_BUDGET, min_samples=HEDGE_MIN_SAMPLES,
+                 min_delay=HEDGE_MIN_DELAY, hedge_model=HEDGE_MODEL):
+        self.call_sites = dict(call_sites)
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.hedge_model = hedge_model
+        self.lock = threading.Lock()
+        self.histograms = {}  # { model: LatencyHistogram }
+        self.eligible = 0
+        self.hedges = 0
+
+    def record(self, model, seconds):
+        with self.lock:
+            self.histograms.setdefault(model, LatencyHistogram()).add(seconds)
+
+    def delay_for(self, call_site, model):
+        """
+        Seconds to wait before hedging a request, or None if it should not be hedged.
+        Counts the request towards the hedge budget.
+        """
+        percentile = self.call_sites.get(call_site)
+        if percentile is None:
+            return None
+        with self.lock:
+            self.eligible += 1
+            histogram = self.histograms.get(model)
+            if histogram is None or histogram.total < self.min_samples:
+                return None
+            return max(self.min_delay, histogram.percentile(percentile))
+
+    def acquire(self):
+        """
+        Takes one hedge from the budget; False once hedges would exceed budget * eligible requests.
+        """
+        with self.lock:
+            if self.hedges + 1 > self.budget * self.eligible:
+                return False
+            self.hedges += 1
+            return True
+
+    def hedge_kwargs(self, request_kwargs):
+        if self.hedge_model:
+            return dict(request_kwargs, model=self.hedge_model)
+        return request_kwargs
+
+    def stats(self):
+        with self.lock:
+            return {
+                "eligible": self.eligible,
+                "hedges": self.hedges,
+                "p95": {model: histogram.percentile(95) for model, histogram in self.histograms.items()},
+            }
@@ -0,0 +1,99 @@
+import json
+
+class StreamingJSONObjectParser:
+    """
+    Incremental parser for a JSON object that arrives in chunks (e.g. a streamed completion).
+    feed() returns the top-level fields whose values completed within the new text, so a caller can
+    act on a field such as "final_answer" as soon as its closing quote arrives, without waiting for the
+    rest of the object. Text before the opening brace (a stray code fence, for instance) is ignored.
+    """
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.finished = False
+        self.key = None
+        self.expect = "key"      # "key", "colon", "value" or "comma" at the top level
+        self.token_start = None  # Start of the key or value being read at the top level
+        self.fields = {}
+        self.repaired = False    # Whether a field value was not strict JSON (decoded leniently or kept raw)
+
+    def _complete_value(self, end):
+        raw = self.text[self.token_start:end].strip()
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            # Models often put raw newlines inside strings; accept them, and keep anything else as raw text.
+            self.repaired = True
+            try:
+                value = json.loads(raw, strict=False)
+            except ValueError:
+                value = raw
+        self.fields[self.key] = value
+        self.expect = "comma"
+        self.token_start = None
+        return (self.key, value)
+
+    def feed(self, chunk):
+        """
+        Consumes the next chunk of text and returns a list of (key, value) pairs completed by it.
+        """
+        completed = []
+        self.text += chunk
+        while self.position < len(self.text) and not self.finished:
+            index = self.position
+            char = self.text[index]
+            self.position += 1
+
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self.depth = 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        if self.expect == "key":
+                            self.key = json.loads(self.text[self.token_start:index + 1])
+                            self.expect = "colon"
+                            self.token_start = None
+                        elif self.expect == "value":
+                            completed.append(self._complete_value(index + 1))
+                continue
+
+            if char == '"':
+                self.in_string = True
+                if self.depth == 1 and self.token_start is None and self.expect in ("key", "value"):
+                    self.token_start = index
+            elif char in "{[":
+                if self.depth == 1 and self.expect == "value" and self.token_start is None:
+                    self.token_start = index
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.expect == "value" and self.token_start is not None:
+                    completed.append(self._complete_value(index + 1))
+                elif self.depth == 0:
+                    # End of the object: flush a trailing scalar (number, true, false, null).
+                    if self.expect == "value" and self.token_start is not None:
+                        completed.append(self._complete_value(index))
+                    self.finished = True
+            elif self.depth == 1:
+                if char == ":" and self.expect == "colon":
+                    self.expect = "value"
+                elif char == ",":
+                    if self.expect == "value" and self.token_start is not None:
+                        completed.append(self._complete_value(index))
+                    self.expect = "key"
+                elif not char.isspace() and self.expect == "value" and self.token_start is None:
+                    self.token_start = index
+        return completed
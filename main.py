@@ -1,8 +1,27 @@
 import os
+import time
 import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import (
+    USE_ASYNC_ENGINE, TRACE_OUTPUT, BATCH_CONCURRENCY, WORKER_BROKER, WORKER_MIN_NODES, WORKER_REGISTER_TIMEOUT,
+    LLM_BACKEND, REPLAY_TIME_SCALE, RATE_LIMIT_RPM, RATE_LIMIT_TPM, RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+    HEDGE_MIN_DELAY, cassette
+)
 from ExecutionNode import ExecutionNode
 from ValidationNode import ValidationNode
 from ManagingNode import ManagingNode
+import embedding
+import request_pool as request_pool_module
+from request_pool import request_pool, TokenBucket
+from response_cache import response_cache
+from structured_output import parse_stats
+from tracing import tracer
+from reputation import reputation_store
+from decomposition_cache import decomposition_cache
+from answer_store import answer_store
+from broker import Broker
 
 def load_execution_nodes(filename="execution_nodes.json"):
     """Load execution nodes from a JSON file."""
@@ -10,13 +29,241 @@ def load_execution_nodes(filename="execution_nodes.json"):
         data = json.load(file)
         return [ExecutionNode(node["name"], node["description"], node["reputation_score"]) for node in data]
 
+def start_broker(address):
+    """
+    Starts the worker broker and returns it with the nodes its workers registered (None if none did).
+    """
+    broker = Broker(address).start()
+    print(f"[Broker] Waiting up to {WORKER_REGISTER_TIMEOUT:.0f}s for workers (python worker.py --broker {address})...")
+    nodes = broker.wait_for_nodes(WORKER_MIN_NODES, WORKER_REGISTER_TIMEOUT)
+    if len(nodes) < WORKER_MIN_NODES:
+        print(f"[Broker] Only {len(nodes)} of {WORKER_MIN_NODES} required nodes registered.")
+        broker.stop()
+        return broker, None
+    print(f"[Broker] Using remote nodes: {[node.name for node in nodes]}")
+    return broker, nodes
+
+# ---------------------------
+# Batch mode
+# ---------------------------
+
+def read_batch(path):
+    """
+    Streams (task ID, task text) pairs from a JSONL file. Each line holds an "id" (or "request_id")
+    and either a "task" or a "title"/"body" pair; lines without an ID are named after their line number.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            task_id = str(record.get("id") or record.get("request_id") or f"line-{line_number}")
+            task = record.get("task") or "\n\n".join(part for part in (record.get("title"), record.get("body")) if part)
+            yield task_id, task
+
+def load_completed_ids(path):
+    """
+    IDs already answered successfully in an existing output file; failed tasks are run again.
+    """
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short by a crash.
+            if record.get("status") == "ok":
+                completed.add(record["id"])
+    return completed
+
+def pending_tasks(input_path, output_path):
+    """
+    Tasks from the input file that are not yet in the output file, each ID once.
+    """
+    seen = load_completed_ids(output_path)
+    if seen:
+        print(f"[Batch] Resuming: {len(seen)} tasks already completed in {output_path}")
+    for task_id, task in read_batch(input_path):
+        if task_id in seen:
+            continue
+        seen.add(task_id)
+        yield task_id, task
+
+def batch_record(task_id, started, final_answer=None, error=None):
+    record = {"id": task_id, "status": "ok" if error is None else "error", "elapsed": round(time.monotonic() - started, 3)}
+    if error is None:
+        record["final_answer"] = final_answer
+    else:
+        record["error"] = f"{error.__class__.__name__}: {error}"
+    return record
+
+def run_task(manager, task_id, task):
+    started = time.monotonic()
+    with tracer.span("task", task_id=task_id) as root:
+        try:
+            record = batch_record(task_id, started, manager.process_complex_task(task, task_id))
+        except Exception as e:
+            record = batch_record(task_id, started, error=e)
+    print(f"[Batch] Trace of {task_id}:\n{retire_trace(task_id, root)}")
+    return record
+
+async def run_task_async(manager, task_id, task):
+    started = time.monotonic()
+    with tracer.span("task", task_id=task_id) as root:
+        try:
+            record = batch_record(task_id, started, await manager.process_complex_task_async(task, task_id))
+        except Exception as e:
+            record = batch_record(task_id, started, error=e)
+    print(f"[Batch] Trace of {task_id}:\n{await asyncio.to_thread(retire_trace, task_id, root)}")
+    return record
+
+def write_record(output, record, counts):
+    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+    output.flush()
+    counts[record["status"]] += 1
+    print(f"[Batch] {record['id']}: {record['status']} in {record['elapsed']}s ({counts['ok']} ok, {counts['error']} failed)")
+
+def run_batch(manager, input_path, output_path, concurrency=BATCH_CONCURRENCY):
+    """
+    Runs every pending task of the input file with at most `concurrency` complex tasks in flight,
+    appending each result to the output JSONL as soon as it finishes. Tasks are read lazily, so
+    the input can be arbitrarily long; rerunning with the same output file resumes the batch.
+    """
+    counts = {"ok": 0, "error": 0}
+    tasks = pending_tasks(input_path, output_path)
+    with open(output_path, "a", encoding="utf-8") as output, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        running = set()
+        for task_id, task in tasks:
+            running.add(executor.submit(run_task, manager, task_id, task))
+            if len(running) >= concurrency:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write_record(output, future.result(), counts)
+        for future in wait(running).done:
+            write_record(output, future.result(), counts)
+    return counts
+
+async def run_batch_async(manager, input_path, output_path, concurrency=BATCH_CONCURRENCY):
+    """
+    Async version of run_batch: the pipelines of all in-flight tasks share one event loop.
+    """
+    counts = {"ok": 0, "error": 0}
+    tasks = pending_tasks(input_path, output_path)
+    with open(output_path, "a", encoding="utf-8") as output:
+        running = set()
+        for task_id, task in tasks:
+            running.add(asyncio.create_task(run_task_async(manager, task_id, task)))
+            if len(running) >= concurrency:
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    write_record(output, finished.result(), counts)
+        for finished in asyncio.as_completed(running):
+            write_record(output, await finished, counts)
+    return counts
+
+def configure_cassette():
+    """
+    Recording and replaying runs bypass the response, decomposition, answer and embedding caches, so every
+    request of the recorded run is in the cassette and the replay makes the same ones. The replay also starts from the
+    node reputations the recorded run started from, and leaves the reputation file alone; quota and retry
+    backoff are scaled like the replayed latencies, so a compressed replay keeps the recorded proportions.
+    """
+    if cassette is None:
+        return
+    response_cache.path = None
+    decomposition_cache.threshold = None
+    answer_store.path = None
+    embedding.EMBEDDING_CACHE_DIR = None
+    if LLM_BACKEND == "replay":
+        reputation_store.path = None
+        reputation_store.stats = cassette.state.get("reputation", {})
+        scale = REPLAY_TIME_SCALE
+        request_pool.request_bucket = TokenBucket(RATE_LIMIT_RPM / scale if scale else float("inf"))
+        request_pool.token_bucket = TokenBucket(RATE_LIMIT_TPM / scale if scale else float("inf"))
+        request_pool_module.RETRY_BASE_DELAY = RETRY_BASE_DELAY * scale
+        request_pool_module.RETRY_MAX_DELAY = RETRY_MAX_DELAY * scale
+        request_pool.hedging.min_delay = HEDGE_MIN_DELAY * scale
+    else:
+        cassette.save_state("reputation", reputation_store.stats)
+
+def retire_trace(task_id, root):
+    """
+    Takes a finished task's spans out of the tracer, so a long-running process does not keep every task's
+    trace in memory. They are appended to <TRACE_OUTPUT>.tasks.jsonl; returns the task's trace summary.
+    """
+    spans = tracer.take_run(root)
+    if TRACE_OUTPUT:
+        tracer.append_run(f"{TRACE_OUTPUT}.tasks.jsonl", task_id, spans)
+    return tracer.summary(spans=spans)
+
+def print_run_report():
+    print("\n=== Request Statistics ===\n")
+    print(request_pool.report())
+    print(request_pool.cascade.report())
+    print(request_pool.single_flight.report())
+    print(response_cache.report())
+    print(parse_stats.report())
+    print(reputation_store.report())
+    print(decomposition_cache.report())
+    print(answer_store.report())
+    if cassette is not None:
+        print(cassette.report())
+    reputation_store.flush()
+
+    print("\n=== Trace Summary ===\n")
+    print(tracer.summary())
+    if TRACE_OUTPUT and tracer.finished_spans():
+        spans_path, chrome_path = tracer.export(TRACE_OUTPUT)
+        print(f"[Trace] Wrote {spans_path} and {chrome_path}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Hive-Mind AI agent network.")
+    parser.add_argument("--batch", metavar="INPUT.jsonl", help="Process every task in a JSONL file instead of reading one from stdin.")
+    parser.add_argument("--output", metavar="OUTPUT.jsonl", help="Results file for --batch (default: <input>.results.jsonl); existing results are resumed.")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Complex tasks processed at once in batch mode.")
+    parser.add_argument("--broker", default=WORKER_BROKER, metavar="ADDRESS", help='Run execution nodes on workers connecting to this address ("tcp://host:port" or "unix:/path/to.sock").')
+    parser.add_argument("--recompute", action="store_true", help="Ignore stored subtask results and run every subtask again.")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    answer_store.force_recompute = args.recompute
+    configure_cassette()
     print("=== AI Agent Network Simulation Using OpenAI API with Enhanced Reasoning ===\n")
     
-    # Load execution nodes from JSON
-    execution_nodes = load_execution_nodes()
+    # Load execution nodes from JSON, or take them from the workers registered with the broker
+    broker = None
+    if args.broker:
+        broker, execution_nodes = start_broker(args.broker)
+        if execution_nodes is None:
+            return
+    else:
+        execution_nodes = load_execution_nodes()
 
     manager = ManagingNode(execution_nodes)
+    try:
+        run_tasks(manager, args)
+    finally:
+        if broker:
+            print(broker.report())
+            broker.stop()
+
+def run_tasks(manager, args):
+    """
+    Processes the batch file, or a single complex task read from stdin.
+    """
+    if args.batch:
+        output_path = args.output or os.path.splitext(args.batch)[0] + ".results.jsonl"
+        print(f"[Batch] Processing {args.batch} -> {output_path} ({args.concurrency} tasks at a time)")
+        if USE_ASYNC_ENGINE:
+            counts = asyncio.run(run_batch_async(manager, args.batch, output_path, args.concurrency))
+        else:
+            counts = run_batch(manager, args.batch, output_path, args.concurrency)
+        print(f"\n=== Batch Complete: {counts['ok']} succeeded, {counts['error']} failed ===")
+        print_run_report()
+        return
     
     print("Enter a complex computational task: ")
     complex_task = input().strip()
@@ -24,10 +271,15 @@ def main():
         print("No task provided. Exiting simulation.")
         return
     
-    final_answer = manager.process_complex_task(complex_task)
+    if USE_ASYNC_ENGINE:
+        final_answer = asyncio.run(manager.process_complex_task_async(complex_task))
+    else:
+        final_answer = manager.process_complex_task(complex_task)
     
     print("\n=== Final Synthesized Answer ===\n")
     print(final_answer)
 
+    print_run_report()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
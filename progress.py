@@ -0,0 +1,28 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Progress events of the complex task being processed in the current context. Like tracing spans, the
+# handler follows the task into asyncio tasks and (with contextvars.copy_context) scheduler threads.
+_progress_handler = ContextVar("progress_handler", default=None)
+
+def report_progress(event, **details):
+    """
+    Sends a progress event (e.g. "decomposition", "assignment", "validation") to the current handler, if any.
+    """
+    handler = _progress_handler.get()
+    if handler is not None:
+        try:
+            handler(event, details)
+        except Exception as e:
+            print(f"[Progress] Handler failed for {event}: {e}")
+
+@contextmanager
+def progress_handler(handler):
+    """
+    Routes the progress events reported inside the block to handler(event, details).
+    """
+    token = _progress_handler.set(handler)
+    try:
+        yield
+    finally:
+        _progress_handler.reset(token)
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import atexit
+import threading
+import numpy as np
+from config import (
+    REPUTATION_PATH, REPUTATION_DOMAINS, REPUTATION_PRIOR_WEIGHT, REPUTATION_DECAY, REPUTATION_LATENCY_TARGET,
+    REPUTATION_FLUSH_INTERVAL
+)
+from embedding import get_embedding, get_embeddings, get_embedding_async, get_embeddings_async
+
+# Subtask texts whose domain is remembered; beyond this, the least recently used are forgotten.
+MAX_CACHED_DOMAINS = 4096
+
+class ReputationStore:
+    """
+    Learned, persisted reputation of every execution node per task domain.
+    Each validated response updates exponentially weighted averages of the node's validation score,
+    acceptance rate and execution latency in the subtask's domain (the REPUTATION_DOMAINS entry whose
+    description is closest to the subtask). The reputation used for routing blends the static
+    reputation_score from execution_nodes.json with the learned one, the learned part taking over as
+    observations accumulate. State lives in a JSON file, written at most every flush_interval seconds
+    while it changes, and at exit.
+    """
+    def __init__(self, path=REPUTATION_PATH, domains=REPUTATION_DOMAINS, prior_weight=REPUTATION_PRIOR_WEIGHT,
+                 decay=REPUTATION_DECAY, latency_target=REPUTATION_LATENCY_TARGET, flush_interval=REPUTATION_FLUSH_INTERVAL):
+        self.path = path
+        self.domains = dict(domains)
+        self.prior_weight = prior_weight
+        self.decay = decay
+        self.latency_target = latency_target
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()  # Serializes writers of the file
+        self.stats = {}  # { node_name: { domain: {"count", "score", "acceptance", "latency"} } }
+        self.dirty = False
+        self.last_flush = time.monotonic()
+        self._domain_matrix = None
+        self._domain_cache = {}  # { subtask: domain }, least recently used first
+        self._load()
+        if self.path:
+            atexit.register(self.flush)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.stats = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Reputation] Could not load {self.path}: {e}. Starting from the static scores.")
+
+    def flush(self):
+        """
+        Writes the store to disk if it changed (atomically, through a temporary file).
+        """
+        with self.flush_lock:
+            with self.lock:
+                self.last_flush = time.monotonic()
+                if not self.path or not self.dirty:
+                    return
+                payload = json.dumps(self.stats, indent=2, sort_keys=True)
+                self.dirty = False
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(temp_path, self.path)
+
+    def _flush_if_due(self):
+        if self.path and self.flush_interval is not None and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    # ---------------------------
+    # Domains
+    # ---------------------------
+
+    def domain_of(self, subtask):
+        """
+        The domain whose description is most similar to the subtask ("general" if embeddings fail).
+        """
+        domain = self._cached_domain(subtask)
+        if domain is not None:
+            return domain
+        names = list(self.domains)
+        try:
+            if self._domain_matrix is None:
+                self._domain_matrix = self._normalize(get_embeddings([self.domains[name] for name in names]))
+            domain = self._closest(names, get_embedding(subtask))
+        except Exception as e:
+            print(f"[Reputation] Domain classification failed: {e}")
+            domain = "general"
+        self._cache_domain(subtask, domain)
+        return domain
+
+    async def domain_of_async(self, subtask):
+        """
+        Async version of domain_of, embedding with the async client.
+        """
+        domain = self._cached_domain(subtask)
+        if domain is not None:
+            return domain
+        names = list(self.domains)
+        try:
+            if self._domain_matrix is None:
+                self._domain_matrix = self._normalize(await get_embeddings_async([self.domains[name] for name in names]))
+            domain = self._closest(names, await get_embedding_async(subtask))
+        except Exception as e:
+            print(f"[Reputation] Domain classification failed: {e}")
+            domain = "general"
+        self._cache_domain(subtask, domain)
+        return domain
+
+    def _cached_domain(self, subtask):
+        with self.lock:
+            domain = self._domain_cache.pop(subtask, None)
+            if domain is not None:
+                self._domain_cache[subtask] = domain
+            return domain
+
+    def _cache_domain(self, subtask, domain):
+        with self.lock:
+            self._domain_cache.pop(subtask, None)
+            self._domain_cache[subtask] = domain
+            while len(self._domain_cache) > MAX_CACHED_DOMAINS:
+                del self._domain_cache[next(iter(self._domain_cache))]
+
+    @staticmethod
+    def _normalize(matrix):
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def _closest(self, names, embedding):
+        query = np.asarray(embedding, dtype=np.float32)
+        return names[int(np.argmax(self._domain_matrix @ query))]
+
+    # ---------------------------
+    # Updates
+    # ---------------------------
+
+    def _entry(self, node_name, domain):
+        return self.stats.setdefault(node_name, {}).setdefault(domain, {
+            "count": 0, "score": None, "acceptance": None, "latency": None
+        })
+
+    def _average(self, previous, value):
+        return value if previous is None else previous + self.decay * (value - previous)
+
+    def record_validation(self, node_name, domain, score, accepted):
+        """
+        Records the trimmed-mean validation score (0-10) of a response and whether it met the threshold.
+        """
+        with self.lock:
+            entry = self._entry(node_name, domain)
+            entry["count"] += 1
+            entry["score"] = self._average(entry["score"], score)
+            entry["acceptance"] = self._average(entry["acceptance"], 1.0 if accepted else 0.0)
+            self.dirty = True
+        self._flush_if_due()
+
+    def record_latency(self, node_name, domain, seconds):
+        with self.lock:
+            entry = self._entry(node_name, domain)
+            entry["latency"] = self._average(entry["latency"], seconds)
+            self.dirty = True
+        self._flush_if_due()
+
+    # ---------------------------
+    # Reputation
+    # ---------------------------
+
+    def learned(self, entry):
+        """
+        Learned reputation on the 0-100 scale of reputation_score: mostly validation score and
+        acceptance rate, with a small bonus for staying under the latency target.
+        """
+        speed = 1.0 if not entry["latency"] else min(1.0, self.latency_target / entry["latency"])
+        return 100 * (0.6 * entry["score"] / 10 + 0.3 * entry["acceptance"] + 0.1 * speed)
+
+    def reputation(self, node, domain):
+        """
+        Reputation of a node for a domain, starting from the node's static reputation_score.
+        """
+        with self.lock:
+            entry = self.stats.get(node.name, {}).get(domain)
+            if not entry or not entry["count"] or entry["score"] is None:
+                return node.reputation_score
+            weight = entry["count"] / (entry["count"] + self.prior_weight)
+            return (1 - weight) * node.reputation_score + weight * self.learned(entry)
+
+    def report(self):
+        with self.lock:
+            lines = []
+            for node_name, domains in sorted(self.stats.items()):
+                for domain, entry in sorted(domains.items()):
+                    if not entry["count"] or entry["score"] is None:
+                        continue
+                    latency = f", {entry['latency']:.1f}s latency" if entry["latency"] else ""
+                    lines.append(
+                        f"[Reputation] {node_name} / {domain}: {entry['count']} validations, "
+                        f"score {entry['score']:.2f}, acceptance {entry['acceptance'] * 100:.0f}%{latency}"
+                    )
+        return "\n".join(lines) if lines else "[Reputation] no validations recorded"
+
+reputation_store = ReputationStore()
@@ -0,0 +1,639 @@
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from config import (
+    client, async_client, RATE_LIMIT_RPM, RATE_LIMIT_TPM,
+    MAX_RETRIES, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+)
+from response_cache import response_cache
+from structured_output import response_format
+from tracing import tracer, estimate_cost
+from hedging import HedgePolicy
+from cascade import ModelCascade
+from single_flight import SingleFlight
+
+# HTTP statuses worth retrying: rate limiting and transient server errors.
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `capacity` units per minute.
+    Callers reserve units up front; the bucket may go into debt, in which case the caller is told
+    how long to wait. Reservations are therefore served in arrival order, without polling.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """
+        Takes `amount` units and returns the number of seconds to wait before using them.
+        """
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def try_reserve(self, amount):
+        """
+        Takes `amount` units only if they are available right now. Returns whether it did.
+        """
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill()
+            if self.tokens < amount:
+                return False
+            self.tokens -= amount
+            return True
+
+    def adjust(self, delta):
+        """
+        Gives back (positive delta) or takes (negative delta) units once the real cost is known.
+        """
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + delta)
+
+def estimate_tokens(messages, max_tokens):
+    """
+    Rough token cost of a chat request: ~4 characters per prompt token plus the completion budget,
+    which is also how the provider counts a request against the tokens-per-minute limit.
+    """
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // 4 + len(messages) * 4 + (max_tokens or 0)
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # Connection errors and timeouts carry no status code.
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "TimeoutError", "ConnectionError")
+
+def retry_delay(error, attempt):
+    """
+    Full-jitter exponential backoff, never shorter than a Retry-After hint from the provider.
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        delay = max(delay, float(headers.get("retry-after", 0)))
+    except (TypeError, ValueError):
+        pass
+    return delay
+
+class RequestPool:
+    """
+    Process-wide dispatcher for chat completion requests.
+    Every call is admitted through two token buckets (requests per minute and tokens per minute),
+    and 429/5xx responses are retried with jittered backoff, so throughput stays at the quota
+    ceiling instead of alternating between overload and retry storms. Works for both engines:
+    create() blocks the calling thread, create_async() only suspends the calling coroutine.
+    """
+    def __init__(self, client, async_client, rpm=RATE_LIMIT_RPM, tpm=RATE_LIMIT_TPM, max_retries=MAX_RETRIES, cache=response_cache, hedging=None, cascade=None, single_flight=None):
+        self.client = client
+        self.async_client = async_client
+        self.cache = cache
+        self.hedging = hedging or HedgePolicy()
+        self.cascade = cascade or ModelCascade()
+        self.single_flight = single_flight or SingleFlight()
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.call_sites = {}  # { call_site: {"requests", "retries", "errors", "wait_time", "tokens"} }
+
+    def _site(self, call_site):
+        return self.call_sites.setdefault(call_site, {
+            "requests": 0, "retries": 0, "errors": 0, "wait_time": 0.0, "tokens": 0,
+            "streams": 0, "first_token_time": 0.0, "hedges": 0, "hedge_wins": 0
+        })
+
+    def _admit(self, call_site, estimated):
+        """
+        Reserves capacity for one request and returns how long it must be held back.
+        """
+        delay = max(self.request_bucket.reserve(1), self.token_bucket.reserve(estimated))
+        with self.lock:
+            self._site(call_site)["wait_time"] += delay
+            if delay > 0:
+                self.queue_depth += 1
+                self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        return delay
+
+    def _admitted(self, delay):
+        if delay > 0:
+            with self.lock:
+                self.queue_depth -= 1
+
+    def _settle(self, call_site, estimated, usage, fallback=None):
+        """
+        Reconciles the token bucket with the real cost of a request. Without usage data (e.g. a stream
+        closed early), `fallback` is used as the actual cost when given.
+        """
+        actual = getattr(usage, "total_tokens", None)
+        if actual is None:
+            actual = fallback
+        if actual is not None:
+            self.token_bucket.adjust(estimated - actual)
+        with self.lock:
+            site = self._site(call_site)
+            site["requests"] += 1
+            site["tokens"] += actual if actual is not None else estimated
+
+    def _should_retry(self, call_site, error, attempt):
+        with self.lock:
+            site = self._site(call_site)
+            if attempt < self.max_retries and is_retryable(error):
+                site["retries"] += 1
+                return True
+            site["errors"] += 1
+            return False
+
+    def create(self, call_site="default", **kwargs):
+        """
+        Drop-in replacement for client.chat.completions.create(**kwargs).
+        Call sites with model tiers go through the cascade (smallest model first, escalating replies
+        that look unreliable); the caller's model is replaced by the tier's. For single-flight call
+        sites, a request identical to one already in flight waits for that one and shares its reply.
+        """
+        if self.single_flight.enabled_for(call_site):
+            return self.single_flight.run(call_site, kwargs, lambda: self._create_tiers(call_site, kwargs))
+        return self._create_tiers(call_site, kwargs)
+
+    async def create_async(self, call_site="default", **kwargs):
+        """
+        Drop-in replacement for await async_client.chat.completions.create(**kwargs).
+        """
+        if self.single_flight.enabled_for(call_site):
+            return await self.single_flight.run_async(call_site, kwargs, lambda: self._create_tiers_async(call_site, kwargs))
+        return await self._create_tiers_async(call_site, kwargs)
+
+    def _cached(self, call_site, cached):
+        """
+        Traces a reply served from the response cache (None on a miss) and returns it.
+        """
+        if cached is not None:
+            with tracer.span("llm", category="llm", call_site=call_site, model=cached.model) as span:
+                self._trace(span, cached, retries=0, cached=True)
+        return cached
+
+    def _create_tiers(self, call_site, kwargs):
+        """
+        The cascade over the call site's model tiers, or a single request for call sites without tiers.
+        Only the reply the cascade accepts is cached, under the caller's request: a lower tier's reply
+        served from the cache would skip the checks (e.g. its log-probabilities) that escalate it.
+        The cache key includes the structured-output response_format the call site is sent with.
+        """
+        cache_kwargs = self._request_kwargs(call_site, kwargs)
+        cached = self._cached(call_site, self.cache.get(call_site, cache_kwargs))
+        if cached is not None:
+            return cached
+        started = time.monotonic()
+        response = self._cascade(call_site, kwargs)
+        self.cache.put(call_site, cache_kwargs, response, time.monotonic() - started)
+        return response
+
+    def _cascade(self, call_site, kwargs):
+        models = self.cascade.models_for(call_site)
+        if not models:
+            return self._create(call_site, **kwargs)
+        for position, model in enumerate(models):
+            final = position == len(models) - 1
+            try:
+                response = self._create(call_site, **self.cascade.tier_kwargs(kwargs, model, final))
+            except Exception as e:
+                if final:
+                    raise
+                self._escalate(call_site, model, f"{e.__class__.__name__}")
+                continue
+            reason = None if final else self.cascade.escalation_reason(call_site, response)
+            if reason is None:
+                self.cascade.record(call_site, model=model)
+                return response
+            self._escalate(call_site, model, reason)
+
+    async def _create_tiers_async(self, call_site, kwargs):
+        """
+        Async version of _create_tiers. The cache is a SQLite file, so it is read and written off the event loop.
+        """
+        if not self.cache.enabled_for(call_site):
+            return await self._cascade_async(call_site, kwargs)
+        cache_kwargs = self._request_kwargs(call_site, kwargs)
+        cached = self._cached(call_site, await asyncio.to_thread(self.cache.get, call_site, cache_kwargs))
+        if cached is not None:
+            return cached
+        started = time.monotonic()
+        response = await self._cascade_async(call_site, kwargs)
+        await asyncio.to_thread(self.cache.put, call_site, cache_kwargs, response, time.monotonic() - started)
+        return response
+
+    async def _cascade_async(self, call_site, kwargs):
+        models = self.cascade.models_for(call_site)
+        if not models:
+            return await self._create_async(call_site, **kwargs)
+        for position, model in enumerate(models):
+            final = position == len(models) - 1
+            try:
+                response = await self._create_async(call_site, **self.cascade.tier_kwargs(kwargs, model, final))
+            except Exception as e:
+                if final:
+                    raise
+                self._escalate(call_site, model, f"{e.__class__.__name__}")
+                continue
+            reason = None if final else self.cascade.escalation_reason(call_site, response)
+            if reason is None:
+                self.cascade.record(call_site, model=model)
+                return response
+            self._escalate(call_site, model, reason)
+
+    def _escalate(self, call_site, model, reason):
+        self.cascade.record(call_site, reason=reason)
+        print(f"[RequestPool] {call_site}: escalating from {model} ({reason})")
+
+    def _create(self, call_site="default", **kwargs):
+        """
+        One model's request, admitted through the rate limits and retried on transient errors.
+        """
+        with tracer.span("llm", category="llm", call_site=call_site, model=kwargs.get("model")) as span:
+            estimated = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+            attempt = 0
+            while True:
+                delay = self._admit(call_site, estimated)
+                if delay > 0:
+                    time.sleep(delay)
+                self._admitted(delay)
+                try:
+                    response = self._send(call_site, self._request_kwargs(call_site, kwargs), estimated, span)
+                except Exception as e:
+                    if not self._should_retry(call_site, e, attempt):
+                        raise
+                    backoff = retry_delay(e, attempt)
+                    print(f"[RequestPool] {call_site}: {e.__class__.__name__}, retrying in {backoff:.1f}s (attempt {attempt + 1})")
+                    time.sleep(backoff)
+                    attempt += 1
+                    continue
+                self._settle(call_site, estimated, getattr(response, "usage", None))
+                self._trace(span, response, retries=attempt)
+                return response
+
+    async def _create_async(self, call_site="default", **kwargs):
+        """
+        Async version of _create.
+        """
+        with tracer.span("llm", category="llm", call_site=call_site, model=kwargs.get("model")) as span:
+            estimated = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+            attempt = 0
+            while True:
+                delay = self._admit(call_site, estimated)
+                try:
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                finally:
+                    self._admitted(delay)
+                try:
+                    response = await self._send_async(call_site, self._request_kwargs(call_site, kwargs), estimated, span)
+                except Exception as e:
+                    if not self._should_retry(call_site, e, attempt):
+                        raise
+                    backoff = retry_delay(e, attempt)
+                    print(f"[RequestPool] {call_site}: {e.__class__.__name__}, retrying in {backoff:.1f}s (attempt {attempt + 1})")
+                    await asyncio.sleep(backoff)
+                    attempt += 1
+                    continue
+                self._settle(call_site, estimated, getattr(response, "usage", None))
+                self._trace(span, response, retries=attempt)
+                return response
+
+    # ---------------------------
+    # Hedging
+    # ---------------------------
+
+    def _timed(self, request_kwargs):
+        started = time.monotonic()
+        response = self.client.chat.completions.create(**request_kwargs)
+        self.hedging.record(request_kwargs.get("model"), time.monotonic() - started)
+        return response
+
+    async def _timed_async(self, request_kwargs):
+        started = time.monotonic()
+        response = await self.async_client.chat.completions.create(**request_kwargs)
+        self.hedging.record(request_kwargs.get("model"), time.monotonic() - started)
+        return response
+
+    @staticmethod
+    def _spawn(function, *args):
+        """
+        Runs function(*args) on a new daemon thread and returns a Future for its result.
+        A thread per request (rather than a shared pool) means a hedge never queues behind other work.
+        """
+        future = Future()
+        context = contextvars.copy_context()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(context.run(function, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def _admit_hedge(self, call_site, estimated):
+        """
+        Admits a hedge only if quota is available right now (a hedge never waits for quota or
+        pushes the buckets into debt) and the hedge budget allows it.
+        """
+        if not self.request_bucket.try_reserve(1):
+            return False
+        if not self.token_bucket.try_reserve(estimated):
+            self.request_bucket.adjust(1)
+            return False
+        if not self.hedging.acquire():
+            self.request_bucket.adjust(1)
+            self.token_bucket.adjust(estimated)
+            return False
+        with self.lock:
+            self._site(call_site)["hedges"] += 1
+        print(f"[RequestPool] {call_site}: request is slow, sending a hedge")
+        return True
+
+    def _hedge_won(self, call_site, span, won):
+        span.set(hedged=True, hedge_won=won)
+        if won:
+            with self.lock:
+                self._site(call_site)["hedge_wins"] += 1
+
+    def _settle_loser(self, call_site, estimated, future):
+        # The losing request of a hedged pair is still paid for once it completes.
+        if not future.cancelled() and future.exception() is None:
+            self._settle(call_site, estimated, getattr(future.result(), "usage", None))
+
+    def _settle_loser_async(self, call_site, estimated, task):
+        # As in the sync engine, the losing request of a hedged pair is paid for. Cancelled here, its real
+        # usage is unknown, so its estimate is kept (the provider may already have billed part of it).
+        if not task.done():
+            task.cancel()
+            self._settle(call_site, estimated, None, fallback=estimated)
+        else:
+            self._settle_loser(call_site, estimated, task)
+
+    def _send(self, call_site, request_kwargs, estimated, span):
+        """
+        Sends one request. For hedged call sites, a duplicate (optionally to HEDGE_MODEL) is sent once
+        the request has been outstanding past its latency percentile, and whichever succeeds first is
+        returned. The sync client cannot abort a request, so the loser is left to finish in the
+        background; its tokens are settled when it does.
+        """
+        delay = self.hedging.delay_for(call_site, request_kwargs.get("model"))
+        if delay is None:
+            return self._timed(request_kwargs)
+        primary = self._spawn(self._timed, request_kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._admit_hedge(call_site, estimated):
+            return primary.result()
+        hedge = self._spawn(self._timed, self.hedging.hedge_kwargs(request_kwargs))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._hedge_won(call_site, span, future is hedge)
+                    for loser in pending:
+                        loser.add_done_callback(lambda f: self._settle_loser(call_site, estimated, f))
+                    return future.result()
+        raise primary.exception()
+
+    async def _send_async(self, call_site, request_kwargs, estimated, span):
+        """
+        Async version of _send; here the losing request is cancelled outright (and settled at its estimate).
+        """
+        delay = self.hedging.delay_for(call_site, request_kwargs.get("model"))
+        if delay is None:
+            return await self._timed_async(request_kwargs)
+        primary = asyncio.ensure_future(self._timed_async(request_kwargs))
+        requests = [primary]
+        try:
+            done, _ = await asyncio.wait(requests, timeout=delay)
+            if done or not self._admit_hedge(call_site, estimated):
+                return await primary
+            hedge = asyncio.ensure_future(self._timed_async(self.hedging.hedge_kwargs(request_kwargs)))
+            requests.append(hedge)
+            pending = set(requests)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._hedge_won(call_site, span, task is hedge)
+                        self._settle_loser_async(call_site, estimated, primary if task is hedge else hedge)
+                        return task.result()
+            raise primary.exception()
+        finally:
+            for task in requests:
+                if not task.done():
+                    task.cancel()
+
+    @staticmethod
+    def _trace(span, response, retries, cached=False, usage=None):
+        usage = usage or getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        span.set(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            retries=retries,
+            cached=cached,
+            # Cache hits cost nothing.
+            cost=0.0 if cached else estimate_cost(span.attributes.get("model"), prompt_tokens, completion_tokens),
+        )
+
+    def _first_token(self, call_site, started):
+        with self.lock:
+            site = self._site(call_site)
+            site["streams"] += 1
+            site["first_token_time"] += time.monotonic() - started
+
+    @staticmethod
+    def _request_kwargs(call_site, kwargs):
+        """
+        Adds the call site's structured-output response_format unless the caller set one.
+        """
+        schema_format = response_format(call_site)
+        if schema_format is not None and "response_format" not in kwargs:
+            return dict(kwargs, response_format=schema_format)
+        return kwargs
+
+    def _stream_kwargs(self, call_site, kwargs):
+        return dict(self._request_kwargs(call_site, kwargs), stream=True, stream_options={"include_usage": True})
+
+    @staticmethod
+    def _chunk_text(chunk):
+        choices = getattr(chunk, "choices", None)
+        if not choices:
+            return None
+        return getattr(choices[0].delta, "content", None)
+
+    def stream(self, call_site="default", **kwargs):
+        """
+        Streaming variant of create(): a generator yielding content deltas as they arrive.
+        A streamed reply cannot be escalated, so tiered call sites use their last (largest) tier.
+        Rate limiting applies as for create(), and failures are retried as long as nothing has been
+        yielded yet. Closing the generator early (e.g. once the needed JSON field is complete) closes
+        the underlying HTTP stream.
+        """
+        kwargs = self.cascade.stream_kwargs(call_site, kwargs)
+        span = tracer.start_span("llm", category="llm", call_site=call_site, model=kwargs.get("model"), stream=True)
+        estimated = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+        attempt = 0
+        while True:
+            delay = self._admit(call_site, estimated)
+            if delay > 0:
+                time.sleep(delay)
+            self._admitted(delay)
+            started = time.monotonic()
+            try:
+                response_stream = self.client.chat.completions.create(**self._stream_kwargs(call_site, kwargs))
+                chunks = iter(response_stream)
+                first_chunk = next(chunks, None)
+            except Exception as e:
+                if not self._should_retry(call_site, e, attempt):
+                    span.set(error=f"{e.__class__.__name__}: {e}", retries=attempt)
+                    tracer.finish_span(span)
+                    raise
+                backoff = retry_delay(e, attempt)
+                print(f"[RequestPool] {call_site}: {e.__class__.__name__}, retrying in {backoff:.1f}s (attempt {attempt + 1})")
+                time.sleep(backoff)
+                attempt += 1
+                continue
+            break
+
+        self._first_token(call_site, started)
+        span.set(first_token_latency=round(time.monotonic() - started, 6))
+        usage = None
+        streamed_chars = 0
+        try:
+            chunk = first_chunk
+            while chunk is not None:
+                usage = getattr(chunk, "usage", None) or usage
+                text = self._chunk_text(chunk)
+                if text:
+                    streamed_chars += len(text)
+                    yield text
+                chunk = next(chunks, None)
+        finally:
+            close = getattr(response_stream, "close", None)
+            if close:
+                close()
+            prompt_tokens = estimate_tokens(kwargs.get("messages", []), 0)
+            self._settle(call_site, estimated, usage, fallback=prompt_tokens + streamed_chars // 4)
+            self._trace(span, None, retries=attempt, usage=usage)
+            if usage is None:
+                completion_tokens = streamed_chars // 4
+                span.set(
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    cost=estimate_cost(kwargs.get("model"), prompt_tokens, completion_tokens),
+                )
+            tracer.finish_span(span)
+
+    async def stream_async(self, call_site="default", **kwargs):
+        """
+        Async generator version of stream().
+        """
+        kwargs = self.cascade.stream_kwargs(call_site, kwargs)
+        span = tracer.start_span("llm", category="llm", call_site=call_site, model=kwargs.get("model"), stream=True)
+        estimated = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+        attempt = 0
+        while True:
+            delay = self._admit(call_site, estimated)
+            try:
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            finally:
+                self._admitted(delay)
+            started = time.monotonic()
+            try:
+                response_stream = await self.async_client.chat.completions.create(**self._stream_kwargs(call_site, kwargs))
+                chunks = response_stream.__aiter__()
+                first_chunk = await anext(chunks, None)
+            except Exception as e:
+                if not self._should_retry(call_site, e, attempt):
+                    span.set(error=f"{e.__class__.__name__}: {e}", retries=attempt)
+                    tracer.finish_span(span)
+                    raise
+                backoff = retry_delay(e, attempt)
+                print(f"[RequestPool] {call_site}: {e.__class__.__name__}, retrying in {backoff:.1f}s (attempt {attempt + 1})")
+                await asyncio.sleep(backoff)
+                attempt += 1
+                continue
+            break
+
+        self._first_token(call_site, started)
+        span.set(first_token_latency=round(time.monotonic() - started, 6))
+        usage = None
+        streamed_chars = 0
+        try:
+            chunk = first_chunk
+            while chunk is not None:
+                usage = getattr(chunk, "usage", None) or usage
+                text = self._chunk_text(chunk)
+                if text:
+                    streamed_chars += len(text)
+                    yield text
+                chunk = await anext(chunks, None)
+        finally:
+            close = getattr(response_stream, "close", None)
+            if close:
+                await close()
+            prompt_tokens = estimate_tokens(kwargs.get("messages", []), 0)
+            self._settle(call_site, estimated, usage, fallback=prompt_tokens + streamed_chars // 4)
+            self._trace(span, None, retries=attempt, usage=usage)
+            if usage is None:
+                completion_tokens = streamed_chars // 4
+                span.set(
+                    prompt_tokens=prompt_tokens,
+                    completion_tokens=completion_tokens,
+                    cost=estimate_cost(kwargs.get("model"), prompt_tokens, completion_tokens),
+                )
+            tracer.finish_span(span)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "call_sites": {name: dict(site) for name, site in self.call_sites.items()},
+            }
+
+    def report(self):
+        """
+        Human-readable summary of requests, retries and time spent waiting for quota.
+        """
+        stats = self.stats()
+        lines = [f"[RequestPool] max queue depth: {stats['max_queue_depth']}"]
+        for name, site in sorted(stats["call_sites"].items()):
+            lines.append(
+                f"[RequestPool] {name}: {site['requests']} requests, {site['retries']} retries, "
+                f"{site['errors']} errors, {site['tokens']} tokens, {site['wait_time']:.1f}s waiting for quota"
+                + (f", {site['first_token_time'] / site['streams']:.2f}s mean time to first token" if site["streams"] else "")
+                + (f", {site['hedges']} hedges ({site['hedge_wins']} won)" if site["hedges"] else "")
+            )
+        return "\n".join(lines)
+
+request_pool = RequestPool(client, async_client)
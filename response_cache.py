@@ -0,0 +1,176 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from config import RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_POLICIES
+
+class CachedMessage:
+    def __init__(self, content):
+        self.role = "assistant"
+        self.content = content
+
+class CachedChoice:
+    def __init__(self, content, finish_reason):
+        self.index = 0
+        self.message = CachedMessage(content)
+        self.finish_reason = finish_reason
+
+class CachedUsage:
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+
+class CachedResponse:
+    """
+    Minimal stand-in for a chat completion object, exposing the fields the nodes read.
+    """
+    def __init__(self, model, content, finish_reason, prompt_tokens, completion_tokens):
+        self.model = model
+        self.choices = [CachedChoice(content, finish_reason)]
+        self.usage = CachedUsage(prompt_tokens, completion_tokens)
+        self.cached = True
+
+# Arguments that only change how a reply is delivered, not what it says.
+TRANSPORT_ARGUMENTS = {"stream", "stream_options", "timeout", "extra_headers", "extra_query"}
+
+def request_key(kwargs):
+    """
+    Content address of a request: every argument that can change the reply (model, messages, sampling
+    parameters such as temperature and top_p, max_tokens, response_format, logprobs, seed, tools, ...).
+    """
+    material = {name: value for name, value in kwargs.items() if name not in TRANSPORT_ARGUMENTS}
+    return hashlib.sha256(json.dumps(material, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Content-addressed cache of chat completions in a local SQLite file.
+    Only call sites listed in `policies` are cached; each maps to a TTL in seconds (None = no expiry).
+    When the stored payload exceeds max_bytes, the least recently used entries are evicted.
+    """
+    def __init__(self, path=RESPONSE_CACHE_PATH, max_bytes=RESPONSE_CACHE_MAX_BYTES, policies=RESPONSE_CACHE_POLICIES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.policies = dict(policies)
+        self.lock = threading.Lock()
+        self.connection = None
+        self.counters = {}  # { call_site: {"hits", "misses", "saved_latency", "saved_tokens"} }
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, call_site TEXT, payload TEXT, size INTEGER,"
+                " latency REAL, created REAL, last_access REAL, expires REAL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            self.connection.commit()
+        return self.connection
+
+    def enabled_for(self, call_site):
+        return bool(self.path) and call_site in self.policies
+
+    def _counter(self, call_site):
+        return self.counters.setdefault(call_site, {"hits": 0, "misses": 0, "saved_latency": 0.0, "saved_tokens": 0})
+
+    def get(self, call_site, kwargs):
+        """
+        Returns a CachedResponse for the request, or None on a miss (or if the call site is not cached).
+        """
+        if not self.enabled_for(call_site):
+            return None
+        key = request_key(kwargs)
+        now = time.time()
+        with self.lock:
+            try:
+                connection = self._connect()
+                row = connection.execute(
+                    "SELECT payload, latency, expires FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[2] is not None and row[2] < now:
+                    connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    connection.commit()
+                    row = None
+                if row is None:
+                    self._counter(call_site)["misses"] += 1
+                    return None
+                connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                connection.commit()
+            except sqlite3.Error as e:
+                print(f"[ResponseCache] Lookup failed: {e}")
+                return None
+            payload = json.loads(row[0])
+            counter = self._counter(call_site)
+            counter["hits"] += 1
+            counter["saved_latency"] += row[1] or 0.0
+            counter["saved_tokens"] += payload["prompt_tokens"] + payload["completion_tokens"]
+        return CachedResponse(
+            payload["model"], payload["content"], payload["finish_reason"],
+            payload["prompt_tokens"], payload["completion_tokens"]
+        )
+
+    def put(self, call_site, kwargs, response, latency):
+        """
+        Stores a successful response together with the latency it took to produce.
+        """
+        if not self.enabled_for(call_site) or getattr(response, "cached", False):
+            return
+        choice = response.choices[0]
+        usage = getattr(response, "usage", None)
+        payload = json.dumps({
+            "model": getattr(response, "model", kwargs.get("model")),
+            "content": choice.message.content,
+            "finish_reason": getattr(choice, "finish_reason", None),
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        })
+        ttl = self.policies[call_site]
+        now = time.time()
+        with self.lock:
+            try:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, call_site, payload, size, latency, created, last_access, expires)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (request_key(kwargs), call_site, payload, len(payload), latency, now, now,
+                     now + ttl if ttl is not None else None)
+                )
+                self._evict(connection, now)
+                connection.commit()
+            except sqlite3.Error as e:
+                print(f"[ResponseCache] Store failed: {e}")
+
+    def _evict(self, connection, now):
+        connection.execute("DELETE FROM responses WHERE expires IS NOT NULL AND expires < ?", (now,))
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk from the least recently used entry until enough bytes are freed.
+        excess = total - self.max_bytes
+        victims = []
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        connection.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def stats(self):
+        with self.lock:
+            return {call_site: dict(counter) for call_site, counter in self.counters.items()}
+
+    def report(self):
+        lines = []
+        for call_site, counter in sorted(self.stats().items()):
+            lookups = counter["hits"] + counter["misses"]
+            hit_rate = counter["hits"] / lookups * 100 if lookups else 0
+            lines.append(
+                f"[ResponseCache] {call_site}: {counter['hits']}/{lookups} hits ({hit_rate:.0f}%), "
+                f"saved {counter['saved_latency']:.1f}s and {counter['saved_tokens']} tokens"
+            )
+        return "\n".join(lines) if lines else "[ResponseCache] no cached call sites were used"
+
+response_cache = ResponseCache()
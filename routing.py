@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import numpy as np
+from concurrent.futures import Future
+from embedding import get_embedding, get_embeddings, get_embedding_async, get_embeddings_async
+
+class RoutingIndex:
+    """
+    Embedding-based index over the execution nodes' descriptions.
+    All descriptions are embedded once, in a single batched request; routing a subtask then costs
+    a single embedding plus one vectorized similarity + reputation ranking over the whole node matrix.
+    """
+    def __init__(self, execution_nodes, similarity_weight=0.7, reputation_weight=0.3, vectors=None):
+        self.execution_nodes = list(execution_nodes)
+        self.similarity_weight = similarity_weight
+        self.reputation_weight = reputation_weight
+        if vectors is None:
+            vectors = get_embeddings([node.description for node in self.execution_nodes])
+        self.matrix = self._normalize(vectors)
+
+    @classmethod
+    async def create_async(cls, execution_nodes, **kwargs):
+        """
+        Async version of the constructor: the descriptions are embedded with the async client.
+        """
+        execution_nodes = list(execution_nodes)
+        vectors = await get_embeddings_async([node.description for node in execution_nodes])
+        return cls(execution_nodes, vectors=vectors, **kwargs)
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def rank(self, subtask, reputations=None):
+        """
+        Returns a list of (score, node) tuples for every node, best match first.
+        Cosine similarities are min-max scaled per query so that they stay comparable with the
+        normalized reputation score (embedding similarities tend to cluster in a narrow band).
+        `reputations` (0-100, one per node in index order) overrides the nodes' reputation_score.
+        """
+        return self._rank(get_embedding(subtask), reputations)
+
+    async def rank_async(self, subtask, reputations=None):
+        return self._rank(await get_embedding_async(subtask), reputations)
+
+    def _rank(self, embedding, reputations):
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        similarities = self.matrix @ query
+        spread = similarities.max() - similarities.min()
+        relevance = (similarities - similarities.min()) / spread if spread > 0 else np.ones_like(similarities)
+        # Reputation is read on every call so that reputation changes are picked up without a rebuild.
+        if reputations is None:
+            reputations = [node.reputation_score for node in self.execution_nodes]
+        reputations = np.array(reputations, dtype=np.float32) / 100
+        scores = (relevance * self.similarity_weight) + (reputations * self.reputation_weight)
+        order = np.argsort(-scores, kind="stable")
+        return [(float(scores[i]), self.execution_nodes[i]) for i in order]
+
+    def top_k(self, subtask, k, reputations=None):
+        return self.rank(subtask, reputations)[:k]
+
+class LazyRoutingIndex:
+    """
+    Builds the RoutingIndex on first use, so that constructing a manager does not embed anything.
+    Safe to call from the worker threads that process subtasks concurrently.
+    """
+    def __init__(self, execution_nodes, **kwargs):
+        self.execution_nodes = execution_nodes
+        self.kwargs = kwargs
+        self._index = None
+        self._building = None  # Future completed when an async build finishes (or fails)
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = RoutingIndex(self.execution_nodes, **self.kwargs)
+        return self._index
+
+    async def get_async(self):
+        """
+        Async version of get. Coroutines that arrive while the index is being built wait for that build
+        instead of embedding the descriptions again; if it fails or is cancelled, the next one retries.
+        """
+        while self._index is None:
+            with self._lock:
+                building = self._building
+                leader = building is None
+                if leader:
+                    building = self._building = Future()
+            if not leader:
+                await asyncio.shield(asyncio.wrap_future(building))
+                continue
+            try:
+                index = await RoutingIndex.create_async(self.execution_nodes, **self.kwargs)
+                with self._lock:
+                    if self._index is None:
+                        self._index = index
+            finally:
+                with self._lock:
+                    self._building = None
+                building.set_result(None)
+        return self._index
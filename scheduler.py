@@ -0,0 +1,160 @@
+import heapq
+import itertools
+
+class TaskGraph:
+    """
+    Live dependency graph of subtasks used by the dataflow scheduler.
+    A task becomes ready the moment its last dependency completes; ready tasks are handed out
+    longest critical path first, so the longest chain of dependent subtasks starts as early as possible.
+    Additional steps discovered while the graph is running can be inserted at any time.
+    """
+    def __init__(self, subtasks):
+        self.tasks = {}       # { task_id: task_obj } for every task that has not completed yet
+        self.completed = {}   # { task_id: {"task": <subtask>, "result": <result>, "agents": [agent_name], "validation_score": score} }
+        self.running = set()
+        self.failed = set()
+        self._ready = []      # heap of (-critical_path_length, insertion_order, task_id)
+        self._queued = set()
+        self._order = itertools.count()
+        self._arrival = {}    # { task_id: order in which it first became ready } (FIFO among equal priorities)
+        self._critical_path = {}
+        for task_obj in subtasks:
+            self._add(task_obj)
+        self._refresh_ready()
+
+    def _add(self, task_obj):
+        tid = task_obj["id"]
+        if tid in self.tasks or tid in self.completed:
+            return False
+        task_obj.setdefault("dependencies", [])
+        self.tasks[tid] = task_obj
+        return True
+
+    def _is_ready(self, tid):
+        return (
+            tid not in self.running
+            and tid not in self.failed
+            and all(dep in self.completed for dep in self.tasks[tid]["dependencies"])
+        )
+
+    def _push_ready(self, tid):
+        self._queued.add(tid)
+        order = self._arrival.setdefault(tid, next(self._order))
+        heapq.heappush(self._ready, (-self.critical_path_length(tid), order, tid))
+
+    def critical_path_length(self, tid):
+        """
+        Number of tasks on the longest chain of unfinished tasks starting at tid (tid included).
+        """
+        if tid in self._critical_path:
+            return self._critical_path[tid]
+        dependents = {}
+        for task_id, task_obj in self.tasks.items():
+            for dep in task_obj["dependencies"]:
+                dependents.setdefault(dep, []).append(task_id)
+
+        visiting = set()
+
+        def walk(task_id):
+            if task_id in self._critical_path:
+                return self._critical_path[task_id]
+            if task_id in visiting:
+                return 0  # Cycle: the tasks involved will never become ready anyway.
+            visiting.add(task_id)
+            length = 1 + max((walk(child) for child in dependents.get(task_id, [])), default=0)
+            visiting.discard(task_id)
+            self._critical_path[task_id] = length
+            return length
+
+        return walk(tid)
+
+    def _refresh_ready(self):
+        # Priorities depend on the whole graph, so the heap is rebuilt whenever its shape changes.
+        self._critical_path = {}
+        self._ready = []
+        self._queued = set()
+        for tid in self.tasks:
+            if self._is_ready(tid):
+                self._push_ready(tid)
+
+    def has_ready(self):
+        return bool(self._ready)
+
+    def pop_ready(self):
+        """
+        Marks the ready task with the longest critical path as running and returns it.
+        """
+        _, _, tid = heapq.heappop(self._ready)
+        self._queued.discard(tid)
+        self.running.add(tid)
+        return self.tasks[tid]
+
+    def dependency_results(self, task_obj):
+        """
+        The final answers of a task's completed dependencies, as [(dependency ID, final answer)].
+        """
+        return [
+            (dep, self.completed[dep]['result']['final_answer'])
+            for dep in task_obj.get("dependencies", []) if dep in self.completed
+        ]
+
+    def complete(self, tid, info):
+        self.running.discard(tid)
+        self.tasks.pop(tid, None)
+        self.completed[tid] = info
+        # Only the tasks that depended on tid can have become ready.
+        for task_id, task_obj in self.tasks.items():
+            if tid in task_obj["dependencies"] and task_id not in self._queued and self._is_ready(task_id):
+                self._push_ready(task_id)
+
+    def restore(self, tid, info, steps):
+        """
+        Marks a task as completed from a checkpoint before scheduling starts, re-inserting the
+        additional steps it had produced.
+        """
+        self.tasks.pop(tid, None)
+        self.completed[tid] = info
+        self.insert_additional_steps(tid, steps)
+        self._refresh_ready()
+
+    def fail(self, tid):
+        """
+        Drops a task whose processing raised; tasks that depend on it stay blocked.
+        """
+        self.running.discard(tid)
+        self.failed.add(tid)
+
+    def insert_additional_steps(self, parent_id, steps):
+        """
+        Inserts additional steps suggested for a completed task into the live graph.
+        A blocking step depends on its parent, and every not-yet-started dependent of the parent
+        is made to wait for it as well, so downstream tasks see the step's result in their context.
+        Returns the list of inserted steps.
+        """
+        inserted = []
+        for step in steps:
+            if not isinstance(step, dict) or "id" not in step or "task" not in step:
+                continue
+            # Skip steps that are already part of the graph.
+            if step["id"] in self.tasks or step["id"] in self.completed:
+                continue
+            # Ensure additional step has a dependencies list.
+            step["dependencies"] = list(step.get("dependencies", []))
+            if step.get("blocking", False):
+                if parent_id not in step["dependencies"]:
+                    step["dependencies"].append(parent_id)
+                for task_id, task_obj in self.tasks.items():
+                    if parent_id in task_obj["dependencies"] and task_id not in self.running:
+                        task_obj["dependencies"].append(step["id"])
+            self._add(step)
+            inserted.append(step)
+        if inserted:
+            self._refresh_ready()
+        return inserted
+
+    def blocked(self):
+        """
+        IDs of tasks that can never run (unknown, failed or circular dependencies).
+        Only meaningful once nothing is running and nothing is ready.
+        """
+        return [tid for tid in self.tasks if tid not in self.running and tid not in self.failed]
@@ -0,0 +1,346 @@
+import time
+import json
+import uuid
+import signal
+import asyncio
+import argparse
+from collections import OrderedDict
+from config import (
+    SERVER_HOST, SERVER_PORT, SERVER_MAX_RUNNING_TASKS, SERVER_MAX_QUEUED_TASKS, SERVER_MAX_FINISHED_TASKS,
+    SERVER_MAX_BODY_BYTES, SERVER_KEEPALIVE_INTERVAL, WORKER_BROKER
+)
+from ManagingNode import ManagingNode
+from progress import progress_handler
+from main import load_execution_nodes, start_broker, configure_cassette, print_run_report, retire_trace
+from tracing import tracer
+
+# ---------------------------
+# Service mode
+# ---------------------------
+# Keeps one warm ManagingNode (nodes loaded, clients, caches and routing index built) and accepts
+# complex tasks over a local HTTP API, processed with the async engine:
+#   POST /tasks               {"task": "...", "id": optional}  -> 202 {"id", "status", "events"}
+#   GET  /tasks/<id>          status, and the final answer once completed
+#   GET  /tasks/<id>/events   server-sent events: queued, started, decomposition, assignment,
+#                             validation, subtask_completed, ..., completed or failed
+#   GET  /health              running/queued counts and limits
+# Usage: python server.py --host 127.0.0.1 --port 8080
+
+STATUS_TEXT = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 413: "Payload Too Large", 429: "Too Many Requests", 503: "Service Unavailable",
+}
+
+class TaskRecord:
+    """
+    A submitted complex task: its status, result and the progress events published so far.
+    """
+    def __init__(self, task_id, task):
+        self.task_id = task_id
+        self.task = task
+        self.status = "queued"
+        self.final_answer = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.trace = None  # Trace summary of the finished task; its spans leave the tracer when it finishes
+        self.events = []  # [ (event, data) ], replayed to every new subscriber
+        self.subscribers = set()  # asyncio.Queue per open event stream
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    def publish(self, event, data):
+        self.events.append((event, data))
+        for subscriber in self.subscribers:
+            subscriber.put_nowait((event, data))
+
+    def to_dict(self):
+        record = {
+            "id": self.task_id,
+            "task": self.task,
+            "status": self.status,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "events": f"/tasks/{self.task_id}/events",
+        }
+        if self.status == "completed":
+            record["final_answer"] = self.final_answer
+        if self.error:
+            record["error"] = self.error
+        if self.trace:
+            record["trace"] = self.trace
+        return record
+
+class TaskService:
+    """
+    Admission control in front of a shared manager: at most max_running complex tasks are processed
+    at once and at most max_queued wait for a slot; submissions beyond that are rejected so callers
+    back off instead of piling up. The last max_finished finished tasks stay queryable.
+    """
+    def __init__(self, manager, max_running=SERVER_MAX_RUNNING_TASKS, max_queued=SERVER_MAX_QUEUED_TASKS,
+                 max_finished=SERVER_MAX_FINISHED_TASKS):
+        self.manager = manager
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.tasks = OrderedDict()  # { task_id: TaskRecord }, in submission order
+        self.queue = None
+        self.runners = []
+        self.running = 0
+        self.accepting = True
+
+    def start(self):
+        self.queue = asyncio.Queue(self.max_queued)
+        self.runners = [asyncio.create_task(self._runner()) for _ in range(self.max_running)]
+
+    async def stop(self):
+        self.accepting = False
+        for runner in self.runners:
+            runner.cancel()
+        await asyncio.gather(*self.runners, return_exceptions=True)
+        # Persist what the tasks learned; atexit hooks do not run when the process is terminated.
+        await asyncio.to_thread(self.manager.decompositions.flush)
+
+    def submit(self, task, task_id=None):
+        """
+        Queues a complex task. Raises asyncio.QueueFull when the service is at capacity and
+        KeyError if the ID is already in use.
+        """
+        task_id = str(task_id) if task_id is not None else uuid.uuid4().hex
+        if task_id in self.tasks:
+            raise KeyError(task_id)
+        record = TaskRecord(task_id, task)
+        self.queue.put_nowait(record)
+        self.tasks[task_id] = record
+        record.publish("queued", {"id": task_id, "position": self.queue.qsize()})
+        return record
+
+    async def _runner(self):
+        while True:
+            record = await self.queue.get()
+            self.running += 1
+            try:
+                await self._run(record)
+            finally:
+                self.running -= 1
+                self._retire()
+
+    async def _run(self, record):
+        loop = asyncio.get_running_loop()
+        record.status = "running"
+        record.started = time.time()
+        record.publish("started", {"id": record.task_id})
+        # Progress may be reported from worker threads (routing, embeddings), so it is handed to the loop.
+        publish = lambda event, details: loop.call_soon_threadsafe(record.publish, event, details)
+        root = None
+        try:
+            with tracer.span("task", task_id=record.task_id) as root, progress_handler(publish):
+                record.final_answer = await self.manager.process_complex_task_async(record.task, record.task_id)
+            record.status = "completed"
+        except asyncio.CancelledError:
+            record.status = "failed"
+            record.error = "The service shut down before the task finished."
+            raise
+        except Exception as e:
+            record.status = "failed"
+            record.error = f"{e.__class__.__name__}: {e}"
+            print(f"[Server] Task {record.task_id} failed: {record.error}")
+        finally:
+            record.finished = time.time()
+            if root is not None:
+                record.trace = await asyncio.to_thread(retire_trace, record.task_id, root)
+            # Let progress handed over from other threads land before the final event.
+            await asyncio.sleep(0)
+            if record.status == "completed":
+                record.publish("completed", {"id": record.task_id, "final_answer": record.final_answer})
+            else:
+                record.publish("failed", {"id": record.task_id, "error": record.error})
+
+    def _retire(self):
+        finished = [task_id for task_id, record in self.tasks.items() if record.done]
+        for task_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.tasks[task_id]
+
+    def health(self):
+        return {
+            "status": "ok" if self.accepting else "shutting_down",
+            "running": self.running,
+            "queued": self.queue.qsize(),
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+        }
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+class TaskServer:
+    """
+    Minimal HTTP/1.1 front end of a TaskService (one request per connection), built on asyncio streams.
+    """
+    def __init__(self, service, host=SERVER_HOST, port=SERVER_PORT, max_body_bytes=SERVER_MAX_BODY_BYTES,
+                 keepalive_interval=SERVER_KEEPALIVE_INTERVAL):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.max_body_bytes = max_body_bytes
+        self.keepalive_interval = keepalive_interval
+
+    async def serve_forever(self):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(f"[Server] Listening on http://{self.host}:{self.port}")
+        async with server:
+            await server.serve_forever()
+
+    async def read_request(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            raise HTTPError(400, "empty request")
+        method, target, _ = request_line.split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0) or 0)
+        if length > self.max_body_bytes:
+            raise HTTPError(413, f"request body exceeds {self.max_body_bytes} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0].rstrip("/") or "/", body
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, path, body = await self.read_request(reader)
+                await self.route(method, path, body, writer)
+            except HTTPError as e:
+                await self.respond(writer, e.status, {"error": str(e)}, e.headers)
+            except (ValueError, asyncio.IncompleteReadError) as e:
+                await self.respond(writer, 400, {"error": f"malformed request: {e}"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def route(self, method, path, body, writer):
+        parts = path.strip("/").split("/")
+        if path == "/health":
+            return await self.respond(writer, 200, self.service.health())
+        if parts[0] != "tasks":
+            raise HTTPError(404, f"no route for {path}")
+        if len(parts) == 1:
+            if method != "POST":
+                raise HTTPError(405, "use POST /tasks")
+            return await self.submit(body, writer)
+        record = self.service.tasks.get(parts[1])
+        if record is None:
+            raise HTTPError(404, f"unknown task {parts[1]}")
+        if method != "GET":
+            raise HTTPError(405, "use GET")
+        if len(parts) == 2:
+            return await self.respond(writer, 200, record.to_dict())
+        if len(parts) == 3 and parts[2] == "events":
+            return await self.stream_events(record, writer)
+        raise HTTPError(404, f"no route for {path}")
+
+    async def submit(self, body, writer):
+        if not self.service.accepting:
+            raise HTTPError(503, "the service is shutting down")
+        payload = json.loads(body or b"{}")
+        task = payload.get("task") if isinstance(payload, dict) else None
+        if not isinstance(task, str) or not task.strip():
+            raise HTTPError(400, 'expected a JSON object with a non-empty "task"')
+        try:
+            record = self.service.submit(task.strip(), payload.get("id"))
+        except asyncio.QueueFull:
+            raise HTTPError(429, "too many tasks queued; retry later", {"Retry-After": "5"})
+        except KeyError:
+            raise HTTPError(409, f"task ID {payload.get('id')} is already in use")
+        await self.respond(writer, 202, {"id": record.task_id, "status": record.status, "events": f"/tasks/{record.task_id}/events"},
+                           {"Location": f"/tasks/{record.task_id}"})
+
+    async def stream_events(self, record, writer):
+        """
+        Replays the task's events so far, then streams new ones until it finishes (or the client leaves).
+        """
+        writer.write(("HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                      "Connection: close\r\n\r\n").encode("latin-1"))
+        subscriber = asyncio.Queue()
+        backlog = list(record.events)
+        record.subscribers.add(subscriber)
+        try:
+            for event, data in backlog:
+                await self.send_event(writer, event, data)
+            while not (backlog and backlog[-1][0] in ("completed", "failed")):
+                try:
+                    event, data = await asyncio.wait_for(subscriber.get(), self.keepalive_interval)
+                except asyncio.TimeoutError:
+                    # A comment line keeps proxies from timing out and detects clients that went away.
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
+                    continue
+                await self.send_event(writer, event, data)
+                backlog = [(event, data)]
+        finally:
+            record.subscribers.discard(subscriber)
+
+    async def send_event(self, writer, event, data):
+        writer.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n".encode("utf-8"))
+        await writer.drain()
+
+async def serve(args):
+    configure_cassette()
+    broker = None
+    if args.broker:
+        broker, execution_nodes = start_broker(args.broker)
+        if execution_nodes is None:
+            return
+    else:
+        execution_nodes = load_execution_nodes()
+    service = TaskService(ManagingNode(execution_nodes), args.max_running, args.max_queued)
+    service.start()
+    # SIGTERM shuts down like Ctrl+C, so the service stops (and flushes its caches) instead of dying mid-write.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        await TaskServer(service, args.host, args.port).serve_forever()
+    finally:
+        await service.stop()
+        if broker:
+            print(broker.report())
+            broker.stop()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve Hive-Mind complex tasks over a local HTTP API.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--max-running", type=int, default=SERVER_MAX_RUNNING_TASKS, help="Complex tasks processed at once.")
+    parser.add_argument("--max-queued", type=int, default=SERVER_MAX_QUEUED_TASKS, help="Tasks waiting for a slot before submissions get 429.")
+    parser.add_argument("--broker", default=WORKER_BROKER, metavar="ADDRESS", help="Run execution nodes on workers connecting to this address.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    try:
+        asyncio.run(serve(args))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("\n[Server] Shutting down.")
+    print_run_report()
+
+if __name__ == "__main__":
+    main()
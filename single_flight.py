@@ -0,0 +1,125 @@
+import json
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from config import SINGLE_FLIGHT_CALL_SITES
+
+class LeaderCancelled(Exception):
+    """
+    The request a caller was waiting on was cancelled by its own caller; waiters send it again.
+    """
+
+def flight_key(call_site, kwargs):
+    """
+    Normalized request: call site plus every argument in a canonical order, with message text stripped
+    of surrounding whitespace.
+    """
+    material = dict(kwargs)
+    material["messages"] = [
+        dict(message, content=message["content"].strip()) if isinstance(message.get("content"), str) else message
+        for message in kwargs.get("messages", [])
+    ]
+    payload = json.dumps([call_site, material], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight requests: while one request for a normalized request is outstanding,
+    identical requests from call sites listed in `call_sites` wait for it and share its reply (or error)
+    instead of sending their own. Flights are shared between the sync and async engines.
+    """
+    def __init__(self, call_sites=SINGLE_FLIGHT_CALL_SITES):
+        self.call_sites = set(call_sites)
+        self.lock = threading.Lock()
+        self.flights = {}  # { flight key: concurrent.futures.Future of the leader's reply }
+        self.counters = {}  # { call_site: {"sent", "coalesced"} }
+
+    def enabled_for(self, call_site):
+        return call_site in self.call_sites
+
+    def _join(self, call_site, key):
+        """
+        Returns (flight, leader): a new flight the caller must complete, or the one already in progress.
+        """
+        with self.lock:
+            counter = self.counters.setdefault(call_site, {"sent": 0, "coalesced": 0})
+            flight = self.flights.get(key)
+            if flight is not None:
+                counter["coalesced"] += 1
+                return flight, False
+            flight = Future()
+            self.flights[key] = flight
+            counter["sent"] += 1
+            return flight, True
+
+    def _land(self, key, flight, result=None, error=None):
+        with self.lock:
+            self.flights.pop(key, None)
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+    def run(self, call_site, kwargs, function):
+        """
+        Returns function() for the leader of this request; waiters get the leader's outcome.
+        """
+        key = flight_key(call_site, kwargs)
+        while True:
+            flight, leader = self._join(call_site, key)
+            if leader:
+                break
+            try:
+                return flight.result()
+            except LeaderCancelled:
+                continue
+        try:
+            result = function()
+        except Exception as e:
+            self._land(key, flight, error=e)
+            raise
+        except BaseException:
+            self._land(key, flight, error=LeaderCancelled())
+            raise
+        self._land(key, flight, result)
+        return result
+
+    async def run_async(self, call_site, kwargs, function):
+        """
+        Async version of run; function is a coroutine function. A cancelled waiter leaves the flight alone,
+        and if the leader is cancelled (e.g. an early-stopped validator) the waiters send the request again.
+        """
+        key = flight_key(call_site, kwargs)
+        while True:
+            flight, leader = self._join(call_site, key)
+            if leader:
+                break
+            try:
+                return await asyncio.shield(asyncio.wrap_future(flight))
+            except LeaderCancelled:
+                continue
+        try:
+            result = await function()
+        except Exception as e:
+            self._land(key, flight, error=e)
+            raise
+        except BaseException:
+            self._land(key, flight, error=LeaderCancelled())
+            raise
+        self._land(key, flight, result)
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {call_site: dict(counter) for call_site, counter in self.counters.items()}
+
+    def report(self):
+        lines = []
+        for call_site, counter in sorted(self.stats().items()):
+            calls = counter["sent"] + counter["coalesced"]
+            lines.append(
+                f"[SingleFlight] {call_site}: {counter['coalesced']} of {calls} calls "
+                f"({counter['coalesced'] / calls * 100:.0f}%) shared an identical in-flight request"
+            )
+        return "\n".join(lines) if lines else "[SingleFlight] no single-flight call sites were used"
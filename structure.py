@@ -1,7 +1,15 @@
 import os
+import json
+import codecs
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 OUTPUT_FILENAME = "directory_scan.txt"
 
+# mtime/size of every scanned file and the position of its block in OUTPUT_FILENAME, so a rerun only
+# re-reads files that changed and copies the other blocks from the previous scan.
+MANIFEST_FILENAME = ".directory_scan.manifest.json"
+
 # Directories to exclude (add more if needed)
 EXCLUDED_DIRS = {"node_modules", "venv", ".venv", "env", "__pycache__", ".git"}
 
@@ -11,15 +19,65 @@ EXCLUDED_FILES = {".env"}
 # Define which extensions we consider as text files
 TEXT_EXTENSIONS = {".txt", ".md", ".py", ".js", ".json", ".html", ".css", ".csv"}
 
-def build_directory_tree(root_dir):
+# Files larger than MAX_FILE_BYTES are truncated; once MAX_TOTAL_BYTES of content has been included,
+# the remaining files are listed without their contents.
+MAX_FILE_BYTES = 1024 * 1024
+MAX_TOTAL_BYTES = 64 * 1024 * 1024
+
+# Files read at once, and how many finished blocks may wait for the writer.
+READ_WORKERS = 8
+READ_AHEAD = 32
+
+BLOCK_SEPARATOR = "##############################"
+
+def is_text_file(filepath):
+    """
+    Checks if a file is considered a text file based on its extension.
+    """
+    _, extension = os.path.splitext(filepath)
+    return extension.lower() in TEXT_EXTENSIONS
+
+def get_file_content(filepath, max_bytes=MAX_FILE_BYTES):
+    """
+    Safely reads up to max_bytes of text content from a file (assuming UTF-8).
+    Returns the content and whether it was truncated, or an empty string if it fails to read.
+    """
+    try:
+        with open(filepath, "rb") as f:
+            data = f.read(max_bytes + 1)
+    except OSError:
+        return "", False
+    truncated = len(data) > max_bytes
+    try:
+        # Decoding incrementally drops a multi-byte character cut off by the limit instead of failing on it.
+        content = codecs.getincrementaldecoder("utf-8")().decode(data[:max_bytes], final=not truncated)
+    except UnicodeDecodeError:
+        return "", False
+    return content, truncated
+
+def format_block(filepath, content, note=None):
+    lines = [BLOCK_SEPARATOR, f"{filepath}:", "\"", content, "\""]
+    if note:
+        lines.append(note)
+    lines.append(BLOCK_SEPARATOR)
+    return "\n".join(lines).encode("utf-8")
+
+def read_block(filepath, size):
+    content, truncated = get_file_content(filepath)
+    note = f"[truncated: first {MAX_FILE_BYTES} of {size} bytes shown]" if truncated else None
+    return format_block(filepath, content, note)
+
+def scan_directory(root_dir):
     """
-    Builds a string representation of the directory tree starting from root_dir.
-    Skips any directory in EXCLUDED_DIRS.
+    Walks root_dir once, skipping EXCLUDED_DIRS and EXCLUDED_FILES.
+    Returns the directory tree lines and the (path, stat) of every text file, in tree order.
     """
     tree_lines = []
+    text_files = []
+    skipped_outputs = {os.path.join(root_dir, OUTPUT_FILENAME), os.path.join(root_dir, MANIFEST_FILENAME)}
     for current_path, dirs, files in os.walk(root_dir):
-        # Remove excluded directories so we don't even traverse them
-        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+        # Remove excluded directories so we don't even traverse them; sorting keeps the output stable
+        dirs[:] = sorted(d for d in dirs if d not in EXCLUDED_DIRS)
 
         # Calculate indentation based on directory depth
         depth = current_path.count(os.sep) - root_dir.count(os.sep)
@@ -29,76 +87,113 @@ def build_directory_tree(root_dir):
         folder_name = os.path.basename(current_path) if os.path.basename(current_path) else current_path
         tree_lines.append(f"{indent}[{folder_name}]/")
 
-        # List files in the current folder
-        for f in files:
-            # Skip excluded files
+        for f in sorted(files):
             if f in EXCLUDED_FILES:
                 continue
             tree_lines.append(f"{indent}    {f}")
-
-    return "\n".join(tree_lines)
-
-def is_text_file(filepath):
-    """
-    Checks if a file is considered a text file based on its extension.
+            file_path = os.path.join(current_path, f)
+            if is_text_file(file_path) and file_path not in skipped_outputs:
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    stat = None
+                text_files.append((file_path, stat))
+    return tree_lines, text_files
+
+def load_manifest():
     """
-    _, extension = os.path.splitext(filepath)
-    return extension.lower() in TEXT_EXTENSIONS
-
-def get_file_content(filepath):
-    """
-    Safely reads text content from a file (assuming UTF-8).
-    Returns an empty string if it fails to read.
+    Block positions of the previous scan, or {} if there is none or OUTPUT_FILENAME no longer matches it.
     """
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            return f.read()
-    except:
-        return ""
+        with open(MANIFEST_FILENAME, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        output = os.stat(OUTPUT_FILENAME)
+    except (OSError, ValueError):
+        return {}
+    if (
+        manifest.get("max_file_bytes") != MAX_FILE_BYTES
+        or manifest.get("output_size") != output.st_size
+        or manifest.get("output_mtime_ns") != output.st_mtime_ns
+    ):
+        return {}
+    return manifest.get("files", {})
 
 def main():
     current_dir = os.getcwd()
+    previous = load_manifest()
+    tree_lines, text_files = scan_directory(current_dir)
 
-    # 1. Build the directory structure map (skipping EXCLUDED_DIRS and EXCLUDED_FILES)
-    directory_map = build_directory_tree(current_dir)
-
-    # 2. Gather contents of each text file (excluding sensitive files, and skipping excluded directories)
-    file_contents = []
-    for root, dirs, files in os.walk(current_dir):
-        # Remove excluded directories from traversal
-        dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
-
-        for f in files:
-            # Skip excluded files
-            if f in EXCLUDED_FILES:
-                continue
-
-            file_path = os.path.join(root, f)
-            # Check if it's a text file by extension
-            if is_text_file(file_path):
-                content = get_file_content(file_path)
-                file_block = [
-                    "##############################",
-                    f"{file_path}:",  # you can also just show the filename
-                    "\"",
-                    content,
-                    "\"",
-                    "##############################"
-                ]
-                file_contents.append("\n".join(file_block))
-
-    # Combine everything into a single result
-    final_output = []
-    final_output.append("==== DIRECTORY STRUCTURE ====\n")
-    final_output.append(directory_map)
-    final_output.append("\n\n==== TEXT FILE CONTENTS ====\n")
-    final_output.append("\n\n".join(file_contents))
-
-    # Write the combined result to the output file
-    with open(OUTPUT_FILENAME, "w", encoding="utf-8") as out_file:
-        out_file.write("\n".join(final_output))
-
-    print(f"Directory scan complete. See '{OUTPUT_FILENAME}' for results.")
+    files = {}
+    counts = {"read": 0, "reused": 0, "skipped": 0}
+    temp_filename = OUTPUT_FILENAME + ".tmp"
+    previous_output = open(OUTPUT_FILENAME, "rb") if previous else None
+    try:
+        with open(temp_filename, "wb") as out_file, ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+            out_file.write("==== DIRECTORY STRUCTURE ====\n\n".encode("utf-8"))
+            out_file.write("\n".join(tree_lines).encode("utf-8"))
+            out_file.write("\n\n\n==== TEXT FILE CONTENTS ====\n\n".encode("utf-8"))
+            header_length = out_file.tell()
+
+            # Blocks are written in tree order while up to READ_AHEAD later files are being read.
+            total = 0
+            over_limit = False  # Set by the first file that does not fit; every later file is skipped too
+            pending = deque()  # (path, stat if the block can be cached, block bytes or Future)
+
+            def write_next():
+                file_path, stat, block = pending.popleft()
+                if not isinstance(block, bytes):
+                    block = block.result()
+                if out_file.tell() > header_length:
+                    out_file.write(b"\n\n")
+                if stat is not None:
+                    files[file_path] = {
+                        "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "offset": out_file.tell(), "length": len(block)
+                    }
+                out_file.write(block)
+
+            for file_path, stat in text_files:
+                budget = min(stat.st_size, MAX_FILE_BYTES) if stat is not None else 0
+                cached = previous.get(file_path)
+                if over_limit or total + budget > MAX_TOTAL_BYTES:
+                    over_limit = True
+                    counts["skipped"] += 1
+                    note = f"[skipped: total size limit of {MAX_TOTAL_BYTES} bytes reached]"
+                    pending.append((file_path, None, format_block(file_path, "", note)))
+                elif (
+                    stat is not None and cached
+                    and cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size
+                ):
+                    total += budget
+                    counts["reused"] += 1
+                    previous_output.seek(cached["offset"])
+                    pending.append((file_path, stat, previous_output.read(cached["length"])))
+                else:
+                    total += budget
+                    counts["read"] += 1
+                    size = stat.st_size if stat is not None else 0
+                    pending.append((file_path, stat, executor.submit(read_block, file_path, size)))
+                while len(pending) > READ_AHEAD:
+                    write_next()
+            while pending:
+                write_next()
+    finally:
+        if previous_output is not None:
+            previous_output.close()
+
+    os.replace(temp_filename, OUTPUT_FILENAME)
+    output = os.stat(OUTPUT_FILENAME)
+    with open(MANIFEST_FILENAME, "w", encoding="utf-8") as f:
+        json.dump({
+            "max_file_bytes": MAX_FILE_BYTES,
+            "output_size": output.st_size,
+            "output_mtime_ns": output.st_mtime_ns,
+            "files": files,
+        }, f)
+
+    print(
+        f"Directory scan complete. See '{OUTPUT_FILENAME}' for results. "
+        f"({counts['read']} files read, {counts['reused']} reused from the previous scan, {counts['skipped']} over the size limit)"
+    )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,204 @@
+import re
+import json
+import threading
+from config import STRUCTURED_OUTPUT
+
+# ---------------------------
+# Response schemas per call site
+# ---------------------------
+# Top-level arrays are wrapped in an object, since the provider's JSON modes only produce objects;
+# parse_json() unwraps them again for call sites that expect a list.
+
+SCORE_PROPERTIES = {
+    "logical_coherence": {"type": "number"},
+    "completeness": {"type": "number"},
+    "correctness": {"type": "number"},
+    "clarity": {"type": "number"},
+    "instruction_following": {"type": "number"},
+    "final_verdict": {"type": "string", "enum": ["Accepted", "Rejected"]},
+    "improvement_suggestions": {"type": "string"},
+}
+
+def _object(properties):
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+EVALUATION_SCHEMA = _object(SCORE_PROPERTIES)
+
+SCHEMAS = {
+    "analyze_task": _object({
+        "subtasks": {"type": "array", "items": _object({
+            "id": {"type": "string"},
+            "task": {"type": "string"},
+            "dependencies": {"type": "array", "items": {"type": "string"}},
+        })},
+    }),
+    "assign_execution_nodes": _object({
+        "agents": {"type": "array", "items": {"type": "string"}},
+    }),
+    "process_task": _object({
+        "chain_of_thought": {"type": "string"},
+        "final_answer": {"type": "string"},
+    }),
+    "agent_as_a_judge": EVALUATION_SCHEMA,
+    "validate_with_node": EVALUATION_SCHEMA,
+    "validate_candidates": _object({
+        "evaluations": {"type": "array", "items": _object(dict({"candidate": {"type": "integer"}}, **SCORE_PROPERTIES))},
+    }),
+    "analyze_additional_steps": _object({
+        "steps": {"type": "array", "items": _object({
+            "id": {"type": "string"},
+            "task": {"type": "string"},
+            "blocking": {"type": "boolean"},
+        })},
+    }),
+}
+
+def response_format(call_site):
+    """
+    The response_format argument enforcing the call site's schema, or None if it has none
+    (or structured output is disabled). STRUCTURED_OUTPUT selects "json_schema" or "json_object".
+    """
+    if call_site not in SCHEMAS or not STRUCTURED_OUTPUT:
+        return None
+    if STRUCTURED_OUTPUT == "json_object":
+        return {"type": "json_object"}
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": call_site, "schema": SCHEMAS[call_site], "strict": True},
+    }
+
+# ---------------------------
+# Tolerant parsing
+# ---------------------------
+
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+CLOSERS = {"{": "}", "[": "]"}
+
+def repair_json(text):
+    """
+    Best-effort repair of almost-JSON produced by a model: strips code fences and surrounding prose,
+    escapes raw control characters inside strings, drops trailing commas, converts Python literals
+    and closes brackets left open by a truncated reply. Returns the repaired text.
+    """
+    text = re.sub(r"^\s*```[a-zA-Z]*\s*", "", text.strip())
+    text = re.sub(r"\s*```\s*$", "", text)
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        return text
+    text = text[min(starts):]
+
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            elif char == "\t":
+                char = "\\t"
+            elif char == "\r":
+                char = "\\r"
+            out.append(char)
+            index += 1
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(CLOSERS[char])
+        elif char in "}]":
+            # Drop a trailing comma before the closing bracket.
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(char)
+            if not stack:
+                break  # Anything after the top-level value is prose.
+            index += 1
+            continue
+        elif char.isalpha():
+            # Any letters, not just ASCII: char.isalpha() holds for "ñ" too, so the match must as well.
+            match = re.match(r"[^\W\d_]+", text[index:])
+            word = match.group(0)
+            out.append(PYTHON_LITERALS.get(word, word))
+            index += len(word)
+            continue
+        out.append(char)
+        index += 1
+
+    if in_string:
+        out.append('"')
+    while out and (out[-1].isspace() or out[-1] == ","):
+        out.pop()
+    out.extend(reversed(stack))
+    return "".join(out)
+
+def _unwrap(value, expect):
+    if expect is list and isinstance(value, dict):
+        lists = [item for item in value.values() if isinstance(item, list)]
+        if len(lists) == 1:
+            return lists[0]
+    return value
+
+class ParseStats:
+    """
+    Per-call-site counters of replies parsed directly, parsed after repair, and lost to bad JSON.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def record(self, call_site, outcome):
+        with self.lock:
+            counter = self.counters.setdefault(call_site, {"parsed": 0, "repaired": 0, "failed": 0})
+            counter[outcome] += 1
+
+    def stats(self):
+        with self.lock:
+            return {call_site: dict(counter) for call_site, counter in self.counters.items()}
+
+    def report(self):
+        lines = [
+            f"[Parse] {call_site}: {counter['parsed']} parsed, {counter['repaired']} repaired, {counter['failed']} failed"
+            for call_site, counter in sorted(self.stats().items())
+        ]
+        return "\n".join(lines) if lines else "[Parse] no structured replies parsed"
+
+parse_stats = ParseStats()
+
+def parse_json(text, call_site="default", expect=None):
+    """
+    Parses a model reply as JSON, falling back to repair_json() before giving up.
+    With expect=list, an object wrapping a single list (as produced under a schema) is unwrapped.
+    Raises ValueError if the reply cannot be recovered; every outcome is counted in parse_stats.
+    """
+    try:
+        value = json.loads(text)
+        parse_stats.record(call_site, "parsed")
+        return _unwrap(value, expect)
+    except ValueError:
+        pass
+    try:
+        value = json.loads(repair_json(text))
+    except ValueError as e:
+        parse_stats.record(call_site, "failed")
+        raise ValueError(f"Unparseable JSON reply for {call_site}: {e}")
+    parse_stats.record(call_site, "repaired")
+    return _unwrap(value, expect)
@@ -0,0 +1,335 @@
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+import numpy as np
+
+# ---------------------------
+# Response objects
+# ---------------------------
+# Minimal stand-ins for the OpenAI SDK objects, exposing the fields the nodes and the request pool read.
+
+class StubMessage:
+    def __init__(self, content):
+        self.role = "assistant"
+        self.content = content
+
+class StubChoice:
+    def __init__(self, content):
+        self.index = 0
+        self.message = StubMessage(content)
+        self.finish_reason = "stop"
+
+class StubUsage:
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+
+class StubCompletion:
+    def __init__(self, model, content, usage):
+        self.model = model
+        self.choices = [StubChoice(content)]
+        self.usage = usage
+
+class StubDelta:
+    def __init__(self, content):
+        self.content = content
+
+class StubChunkChoice:
+    def __init__(self, content):
+        self.index = 0
+        self.delta = StubDelta(content)
+
+class StubChunk:
+    def __init__(self, content=None, usage=None):
+        self.choices = [StubChunkChoice(content)] if content is not None else []
+        self.usage = usage
+
+class StubEmbedding:
+    def __init__(self, index, embedding):
+        self.index = index
+        self.embedding = embedding
+
+class StubEmbeddingResponse:
+    def __init__(self, data):
+        self.data = data
+
+class StubAPIError(Exception):
+    """
+    Synthetic provider failure. Carries a status_code so request_pool treats it like a real 429/5xx.
+    """
+    def __init__(self, status_code):
+        super().__init__(f"Stub backend injected HTTP {status_code}")
+        self.status_code = status_code
+        self.response = None
+
+# ---------------------------
+# Synthetic replies
+# ---------------------------
+
+SCORE_KEYS = ["logical_coherence", "completeness", "correctness", "clarity", "instruction_following"]
+
+# System prompts of the call sites, for requests sent without a json_schema response_format.
+SYSTEM_PROMPT_CALL_SITES = [
+    ("task decomposition", "analyze_task"),
+    ("task-agent compatibility", "compute_match_score"),
+    ("task delegation", "assign_execution_nodes"),
+    ("additional task identification", "analyze_additional_steps"),
+    ("synthesizer", "compile_final_answer"),
+    ("summarizer", "summarize_context"),
+    ("AI Judge", "agent_as_a_judge"),
+]
+
+def request_digest(seed, messages):
+    material = json.dumps([seed, messages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def classify(messages, response_format=None):
+    """
+    Works out which call site issued a request: from the schema name when structured output is on,
+    otherwise from the prompts.
+    """
+    if response_format and response_format.get("type") == "json_schema":
+        return response_format["json_schema"]["name"]
+    system = messages[0]["content"] if messages else ""
+    user = messages[-1]["content"] if messages else ""
+    for marker, call_site in SYSTEM_PROMPT_CALL_SITES:
+        if marker in system:
+            return call_site
+    if "candidate answers" in user:
+        return "validate_candidates"
+    if "You are an AI evaluator" in user:
+        return "validate_with_node"
+    return "process_task"
+
+class StubBackend:
+    """
+    Deterministic offline LLM: synthetic decompositions, answers and judge scores, with lognormal
+    latencies and injected failures. Reply content depends only on the seed and the messages; latency
+    and failures depend on the seed, the messages and how often that request has been seen, so runs
+    are reproducible regardless of thread interleaving. Shared by the sync and async clients.
+
+    latency maps call sites (and "default") to (median seconds, lognormal sigma); time_scale
+    multiplies every sampled latency, e.g. 0.01 for fast benchmark runs.
+    """
+    def __init__(self, seed=0, dag_width=3, dag_depth=2, subtask_words=12, score_range=(6, 10),
+                 additional_step_rate=0.0, failure_rate=0.0, latency=None, time_scale=1.0):
+        self.seed = seed
+        self.dag_width = dag_width
+        self.dag_depth = dag_depth
+        self.subtask_words = subtask_words
+        self.score_range = score_range
+        self.additional_step_rate = additional_step_rate
+        self.failure_rate = failure_rate
+        self.latency = dict(latency or {"default": (0.5, 0.4)})
+        self.time_scale = time_scale
+        self.lock = threading.Lock()
+        self.seen = {}
+        self.calls = {}  # { call_site: number of chat completion calls, failures included }
+
+    def reset_counters(self):
+        with self.lock:
+            self.seen = {}
+            self.calls = {}
+
+    def call_counts(self):
+        with self.lock:
+            return dict(self.calls)
+
+    def plan(self, kwargs):
+        """
+        Decides the outcome of one chat completion call.
+        Returns (call site, delay in seconds, failure status code or None, reply content).
+        """
+        messages = kwargs.get("messages", [])
+        call_site = classify(messages, kwargs.get("response_format"))
+        digest = request_digest(self.seed, messages)
+        with self.lock:
+            occurrence = self.seen.get(digest, 0)
+            self.seen[digest] = occurrence + 1
+            self.calls[call_site] = self.calls.get(call_site, 0) + 1
+        timing = random.Random(f"{digest}:{occurrence}")
+        median, sigma = self.latency.get(call_site, self.latency.get("default", (0.5, 0.4)))
+        delay = median * timing.lognormvariate(0, sigma) * self.time_scale
+        if timing.random() < self.failure_rate:
+            return call_site, delay, timing.choice([429, 500, 503]), None
+        return call_site, delay, None, self.reply(call_site, messages, random.Random(digest))
+
+    def reply(self, call_site, messages, rng):
+        user = messages[-1]["content"] if messages else ""
+        if call_site == "analyze_task":
+            return json.dumps({"subtasks": self.decomposition(rng)})
+        if call_site == "compute_match_score":
+            return str(rng.randint(1, 10))
+        if call_site == "assign_execution_nodes":
+            names = re.findall(r"^(\S+): .*\(Reputation score: ", user, re.MULTILINE)
+            return json.dumps({"agents": rng.sample(names, min(len(names), 2)) if names else []})
+        if call_site in ("agent_as_a_judge", "validate_with_node"):
+            return json.dumps(self.evaluation(rng))
+        if call_site == "validate_candidates":
+            count = len(re.findall(r"^Candidate \d+:", user, re.MULTILINE))
+            return json.dumps({"evaluations": [dict(self.evaluation(rng), candidate=index) for index in range(1, count + 1)]})
+        if call_site == "analyze_additional_steps":
+            steps = []
+            if rng.random() < self.additional_step_rate:
+                subtask_id = re.search(r"Subtask ID: (\S+)", user)
+                prefix = subtask_id.group(1) if subtask_id else "X"
+                steps.append({"id": f"{prefix}-A1", "task": f"Double-check the result of {prefix}.", "blocking": rng.random() < 0.5})
+            return json.dumps({"steps": steps})
+        if call_site == "compile_final_answer":
+            return "Synthesized answer: " + self.words(rng, 40)
+        if call_site == "summarize_context":
+            return "Summary: " + self.words(rng, 30)
+        return json.dumps({"chain_of_thought": self.words(rng, 60), "final_answer": self.words(rng, 8)})
+
+    def decomposition(self, rng):
+        """
+        A layered DAG of dag_depth levels with dag_width subtasks each; every subtask depends on
+        the whole previous level.
+        """
+        subtasks = []
+        previous = []
+        for level in range(1, self.dag_depth + 1):
+            current = [f"T{level}_{index}" for index in range(1, self.dag_width + 1)]
+            for task_id in current:
+                subtasks.append({"id": task_id, "task": f"{task_id}: " + self.words(rng, self.subtask_words), "dependencies": list(previous)})
+            previous = current
+        return subtasks
+
+    def evaluation(self, rng):
+        low, high = self.score_range
+        scores = {key: rng.randint(low, high) for key in SCORE_KEYS}
+        verdict = "Accepted" if sum(scores.values()) / len(scores) >= 7 else "Rejected"
+        return dict(scores, final_verdict=verdict, improvement_suggestions="None.")
+
+    @staticmethod
+    def words(rng, count):
+        return " ".join(rng.choice(LOREM) for _ in range(count))
+
+    @staticmethod
+    def usage(kwargs, content):
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in kwargs.get("messages", []))
+        return StubUsage(prompt_chars // 4, len(content) // 4)
+
+    @staticmethod
+    def chunks(content, size=16):
+        return [content[start:start + size] for start in range(0, len(content), size)]
+
+    def embed(self, texts, dim=64):
+        vectors = []
+        for index, text in enumerate(texts):
+            generator = np.random.default_rng(int(request_digest(self.seed, text)[:16], 16))
+            vectors.append(StubEmbedding(index, generator.normal(size=dim).tolist()))
+        return StubEmbeddingResponse(vectors)
+
+LOREM = (
+    "analysis result value compute verify data step check total model estimate reason derive "
+    "summary detail factor input output measure compare trend sample source method answer"
+).split()
+
+# ---------------------------
+# Clients
+# ---------------------------
+
+class StubCompletions:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def create(self, stream=False, stream_options=None, **kwargs):
+        call_site, delay, failure, content = self.backend.plan(kwargs)
+        if not stream:
+            time.sleep(delay)
+            if failure:
+                raise StubAPIError(failure)
+            return StubCompletion(kwargs.get("model"), content, self.backend.usage(kwargs, content))
+        # Streams fail before the first chunk; a third of the latency goes to the first token.
+        time.sleep(delay / 3)
+        if failure:
+            raise StubAPIError(failure)
+        return StubStream(self.backend, kwargs, content, delay * 2 / 3)
+
+class StubStream:
+    def __init__(self, backend, kwargs, content, remaining):
+        self.pieces = backend.chunks(content)
+        self.usage = backend.usage(kwargs, content)
+        self.pause = remaining / max(len(self.pieces), 1)
+        self.closed = False
+
+    def __iter__(self):
+        for piece in self.pieces:
+            if self.closed:
+                return
+            yield StubChunk(piece)
+            time.sleep(self.pause)
+        yield StubChunk(usage=self.usage)
+
+    def close(self):
+        self.closed = True
+
+class StubEmbeddings:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def create(self, input, model=None):
+        return self.backend.embed([input] if isinstance(input, str) else list(input))
+
+class StubChat:
+    def __init__(self, completions):
+        self.completions = completions
+
+class StubClient:
+    """
+    Drop-in for the openai module / OpenAI client: chat.completions.create and embeddings.create.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.chat = StubChat(StubCompletions(backend))
+        self.embeddings = StubEmbeddings(backend)
+
+class AsyncStubCompletions:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def create(self, stream=False, stream_options=None, **kwargs):
+        call_site, delay, failure, content = self.backend.plan(kwargs)
+        if not stream:
+            await asyncio.sleep(delay)
+            if failure:
+                raise StubAPIError(failure)
+            return StubCompletion(kwargs.get("model"), content, self.backend.usage(kwargs, content))
+        await asyncio.sleep(delay / 3)
+        if failure:
+            raise StubAPIError(failure)
+        return AsyncStubStream(self.backend, kwargs, content, delay * 2 / 3)
+
+class AsyncStubStream(StubStream):
+    def __aiter__(self):
+        return self.iterate()
+
+    async def iterate(self):
+        for piece in self.pieces:
+            if self.closed:
+                return
+            yield StubChunk(piece)
+            await asyncio.sleep(self.pause)
+        yield StubChunk(usage=self.usage)
+
+    async def close(self):
+        self.closed = True
+
+class AsyncStubEmbeddings(StubEmbeddings):
+    async def create(self, input, model=None):
+        return super().create(input, model)
+
+class AsyncStubClient:
+    """
+    Drop-in for openai.AsyncOpenAI.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.chat = StubChat(AsyncStubCompletions(backend))
+        self.embeddings = AsyncStubEmbeddings(backend)
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+from answer_store import AnswerStore
+
+class AnswerStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        # Exact matches only, so no embeddings are needed.
+        self.store = AnswerStore(os.path.join(self.directory.name, "answers.sqlite3"), threshold=None, min_score=7)
+
+    def tearDown(self):
+        self.store.connection.close()
+        self.directory.cleanup()
+
+    def test_root_subtask_is_scoped_to_its_complex_task(self):
+        result = {"final_answer": "Sales grew 4%."}
+        self.store.store("Summarize the findings", [], "Node_A", result, 9, "Analyze the 2023 sales report")
+        self.assertEqual(
+            self.store.lookup("summarize the  findings", [], "analyze the 2023 sales report"), ("Node_A", result, 9)
+        )
+        self.assertIsNone(self.store.lookup("Summarize the findings", [], "Review the incident postmortem"))
+
+    def test_dependent_subtask_is_shared_across_complex_tasks(self):
+        upstream = [("T1", "Revenue was 10M.")]
+        self.store.store("Summarize the findings", upstream, "Node_A", {"final_answer": "10M"}, 9, "Task one")
+        self.assertIsNotNone(self.store.lookup("Summarize the findings", [("T7", "revenue was 10M.")], "Task two"))
+
+if __name__ == "__main__":
+    unittest.main()
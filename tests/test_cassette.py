@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs one complex task through the sync engine with the configured backend and prints the cassette counters.
+RUN_TASK = f"""
+import json
+import config
+if getattr(config, "stub_backend", None) is not None:
+    config.stub_backend.time_scale = 0.01
+import main
+main.configure_cassette()
+manager = main.ManagingNode(main.load_execution_nodes({os.path.join(ROOT, "execution_nodes.json")!r}))
+manager.process_complex_task("Estimate the yearly energy use of a small data center.")
+print("COUNTERS " + json.dumps(getattr(config.cassette, "counters", None)))
+"""
+
+def run_task(directory, **env):
+    """
+    Runs RUN_TASK in a fresh interpreter with `directory` as working directory (and cache location).
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", RUN_TASK],
+        cwd=directory,
+        env=dict(os.environ, PYTHONPATH=ROOT, **env),
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    if result.returncode != 0:
+        raise AssertionError(f"task run failed:\n{result.stdout[-2000:]}\n{result.stderr[-2000:]}")
+    counters = [line for line in result.stdout.splitlines() if line.startswith("COUNTERS ")]
+    return json.loads(counters[-1][len("COUNTERS "):])
+
+class CassetteTest(unittest.TestCase):
+    def test_replay_with_empty_embedding_cache(self):
+        with tempfile.TemporaryDirectory() as recorded, tempfile.TemporaryDirectory() as replayed:
+            path = os.path.join(recorded, "llm_cassette.jsonl.gz")
+            # A first run warms the embedding cache the recording then runs with.
+            run_task(recorded, LLM_BACKEND="stub")
+            self.assertTrue(os.path.isdir(os.path.join(recorded, ".embedding_cache")))
+            run_task(recorded, LLM_BACKEND="stub", LLM_RECORD=path)
+
+            counters = run_task(replayed, LLM_BACKEND="replay", LLM_REPLAY=path, REPLAY_TIME_SCALE="0")
+            self.assertEqual(counters["misses"], 0)
+            self.assertGreater(counters["replayed"], 0)
+            self.assertFalse(os.path.exists(os.path.join(replayed, ".embedding_cache")))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+from checkpoint import CheckpointJournal
+
+class CheckpointJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def journal(self, task_id=None):
+        return CheckpointJournal.for_task("Plan a trip", task_id, directory=self.directory.name)
+
+    def test_tasks_with_the_same_text_keep_separate_journals(self):
+        first, second = self.journal("a"), self.journal("b")
+        self.assertNotEqual(first.path, second.path)
+        self.assertNotEqual(first.path, self.journal().path)
+
+        first.record_decomposition([{"id": "1", "task": "Pick a city", "dependencies": []}])
+        self.assertFalse(self.journal("b").resumable)
+        self.assertTrue(self.journal("a").resumable)
+
+        second.discard()
+        self.assertTrue(self.journal("a").resumable)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import json
+import tempfile
+import unittest
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+from decomposition_cache import DecompositionCache
+
+SUBTASKS = [{"id": "1", "task": "Pick a city", "dependencies": []}]
+
+class DecompositionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "decompositions.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_stores_are_flushed_periodically(self):
+        cache = DecompositionCache(path=self.path, flush_interval=3600)
+        cache.store("Plan a trip", SUBTASKS)
+        self.assertFalse(os.path.exists(self.path))
+
+        cache.flush_interval = 0
+        cache.store("Plan a wedding", SUBTASKS)
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(sorted(json.load(f)), ["Plan a trip", "Plan a wedding"])
+
+if __name__ == "__main__":
+    unittest.main()
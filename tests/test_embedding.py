@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+from embedding import EmbeddingStore
+
+class EmbeddingStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def vectors(self, *names):
+        return {name: np.full(4, index, dtype=np.float32) for index, name in enumerate(names, 1)}
+
+    def test_index_is_written_on_flush_not_on_every_put(self):
+        store = EmbeddingStore(self.directory.name, flush_interval=3600)
+        store.put_many(self.vectors("a", "b"))
+        self.assertFalse(os.path.exists(store.index_path))
+
+        store.flush()
+        reloaded = EmbeddingStore(self.directory.name)
+        self.assertEqual(sorted(reloaded.rows), ["a", "b"])
+        np.testing.assert_array_equal(reloaded.get_many(["b"])["b"], np.full(4, 2))
+
+    def test_eviction_is_saved_before_rows_are_reused(self):
+        store = EmbeddingStore(self.directory.name, max_entries=2, flush_interval=3600)
+        store.put_many(self.vectors("a", "b"))
+        store.put_many({"c": np.full(4, 9, dtype=np.float32)})
+        # Without a flush, the index on disk must not map an evicted text to the reused row.
+        reloaded = EmbeddingStore(self.directory.name)
+        self.assertEqual(sorted(reloaded.rows), ["b"])
+        np.testing.assert_array_equal(reloaded.get_many(["b"])["b"], np.full(4, 2))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import os
+import unittest
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+import config
+from json_stream import StreamingJSONObjectParser
+from structured_output import parse_stats
+from ExecutionNode import ExecutionNode
+
+class StreamingParserTest(unittest.TestCase):
+    def test_fields_complete_as_they_arrive(self):
+        parser = StreamingJSONObjectParser()
+        self.assertEqual(parser.feed('```json\n{"chain_of_thought": "add", "final_'), [("chain_of_thought", "add")])
+        self.assertEqual(parser.feed('answer": "4", "steps": [1, 2]'), [("final_answer", "4"), ("steps", [1, 2])])
+        self.assertEqual(parser.feed(', "done": true}'), [("done", True)])
+        self.assertFalse(parser.repaired)
+
+    def test_raw_control_characters_mark_the_reply_repaired(self):
+        parser = StreamingJSONObjectParser()
+        parser.feed('{"final_answer": "line one\nline two"}')
+        self.assertEqual(parser.fields, {"final_answer": "line one\nline two"})
+        self.assertTrue(parser.repaired)
+
+class StreamTaskTest(unittest.TestCase):
+    def test_early_return_is_counted_in_parse_stats(self):
+        config.stub_backend.time_scale = 0.001
+        node = ExecutionNode("Node_Test", "A test node.", 80)
+        call_site = "process_task_stream_test"
+        result = node.stream_task(node.build_messages("Add 2 and 2.", None), call_site, on_event=lambda *args: None)
+        self.assertIn("final_answer", result)
+        self.assertEqual(parse_stats.stats()[call_site], {"parsed": 1, "repaired": 0, "failed": 0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+import embedding
+import reputation
+from reputation import ReputationStore
+
+class ReputationStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "reputation.json")
+        cache_dir = mock.patch.object(embedding, "EMBEDDING_CACHE_DIR", None)
+        cache_dir.start()
+        self.addCleanup(cache_dir.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_domain_cache_is_bounded(self):
+        store = ReputationStore(path=None)
+        with mock.patch.object(reputation, "MAX_CACHED_DOMAINS", 3):
+            for index in range(5):
+                store.domain_of(f"Subtask number {index}")
+            store.domain_of("Subtask number 2")  # Most recently used again
+            store.domain_of("Subtask number 5")
+        self.assertEqual(list(store._domain_cache), ["Subtask number 4", "Subtask number 2", "Subtask number 5"])
+
+    def test_changes_are_flushed_periodically(self):
+        store = ReputationStore(path=self.path, flush_interval=3600)
+        store.record_validation("Node_A", "math", 9, True)
+        self.assertFalse(os.path.exists(self.path))
+
+        store.flush_interval = 0
+        store.record_validation("Node_A", "math", 8, True)
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["Node_A"]["math"]["count"], 2)
+        self.assertFalse(store.dirty)
+
+if __name__ == "__main__":
+    unittest.main()
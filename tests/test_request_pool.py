@@ -0,0 +1,83 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+from request_pool import RequestPool
+from response_cache import ResponseCache
+from cascade import ModelCascade
+from hedging import HedgePolicy
+from single_flight import SingleFlight
+from stub_backend import StubCompletion, StubUsage
+
+class LowConfidenceClient:
+    """
+    Replies "7" from every model; the small model's reply carries log-probabilities low enough to escalate.
+    """
+    def __init__(self):
+        self.models = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.models.append(kwargs["model"])
+        response = StubCompletion(kwargs["model"], "7", StubUsage(10, 1))
+        if kwargs.get("logprobs"):
+            response.choices[0].logprobs = SimpleNamespace(content=[SimpleNamespace(logprob=-5.0)])
+        return response
+
+class RequestPoolCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.client = LowConfidenceClient()
+        self.pool = RequestPool(
+            self.client, None,
+            cache=ResponseCache(path=os.path.join(self.directory.name, "cache.sqlite"), policies={"compute_match_score": None}),
+            hedging=HedgePolicy(call_sites={}),
+            cascade=ModelCascade(tiers={"compute_match_score": ["small", "large"]}, min_mean_logprob=-1.0),
+            single_flight=SingleFlight(call_sites=()),
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_only_the_accepted_tier_is_cached(self):
+        messages = [{"role": "user", "content": "Score this"}]
+        first = self.pool.create("compute_match_score", model="default", messages=messages, temperature=0)
+        second = self.pool.create("compute_match_score", model="default", messages=messages, temperature=0)
+        self.assertEqual(self.client.models, ["small", "large"])
+        self.assertEqual(first.model, "large")
+        self.assertTrue(second.cached)
+        self.assertEqual(second.model, "large")
+
+class SlowFirstAsyncClient:
+    """
+    The first request takes a second, later ones (the hedge) reply at once.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.sleep(1.0)
+        return StubCompletion(kwargs["model"], "done", StubUsage(10, 5))
+
+class RequestPoolHedgingTest(unittest.TestCase):
+    def test_cancelled_hedge_loser_is_settled(self):
+        hedging = HedgePolicy(call_sites={"process_task": 50}, budget=1.0, min_samples=1, min_delay=0.01)
+        hedging.record("model", 0.01)
+        pool = RequestPool(None, SlowFirstAsyncClient(), cache=ResponseCache(path=None), hedging=hedging,
+                           cascade=ModelCascade(tiers={}), single_flight=SingleFlight(call_sites=()))
+        response = asyncio.run(pool.create_async("process_task", model="model", messages=[{"role": "user", "content": "Go"}], max_tokens=100))
+        self.assertEqual(response.choices[0].message.content, "done")
+        site = pool.call_sites["process_task"]
+        self.assertEqual((site["hedges"], site["hedge_wins"]), (1, 1))
+        # Both the winner and the cancelled primary are counted, like in the sync engine.
+        self.assertEqual(site["requests"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
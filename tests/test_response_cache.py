@@ -0,0 +1,25 @@
+import os
+import unittest
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+from response_cache import request_key
+
+class RequestKeyTest(unittest.TestCase):
+    base = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Score this"}], "temperature": 0, "max_tokens": 10}
+
+    def test_output_changing_arguments_are_keyed(self):
+        variants = [
+            {"top_p": 0.5},
+            {"logprobs": True},
+            {"response_format": {"type": "json_object"}},
+            {"seed": 7},
+        ]
+        keys = {request_key(self.base)} | {request_key(dict(self.base, **variant)) for variant in variants}
+        self.assertEqual(len(keys), len(variants) + 1)
+
+    def test_transport_arguments_are_not_keyed(self):
+        self.assertEqual(request_key(self.base), request_key(dict(self.base, timeout=30, stream_options={"include_usage": True})))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import json
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+import main
+from server import TaskService
+from decomposition_cache import DecompositionCache
+from tracing import tracer
+
+class TracedManager:
+    def __init__(self):
+        self.decompositions = DecompositionCache(path=None)
+
+    async def process_complex_task_async(self, complex_task, task_id=None):
+        with tracer.span("subtask", subtask_id="1"):
+            with tracer.span("llm", category="llm", call_site="process_task", prompt_tokens=10, completion_tokens=5):
+                await asyncio.sleep(0)
+        return f"Answer to {complex_task}"
+
+class TaskServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.directory.name, "trace")
+        trace_output = mock.patch.object(main, "TRACE_OUTPUT", self.prefix)
+        trace_output.start()
+        self.addCleanup(trace_output.stop)
+        tracer.reset()
+
+    def tearDown(self):
+        tracer.reset()
+        self.directory.cleanup()
+
+    def test_finished_tasks_leave_the_tracer(self):
+        async def run():
+            service = TaskService(TracedManager(), max_running=2)
+            service.start()
+            records = [service.submit(f"Task {index}", task_id=f"t{index}") for index in range(3)]
+            while not all(record.done for record in records):
+                await asyncio.sleep(0.01)
+            await service.stop()
+            return records
+
+        records = asyncio.run(run())
+        self.assertEqual(tracer.finished_spans(), [])
+        self.assertTrue(all("1 LLM calls" in record.trace for record in records))
+        with open(f"{self.prefix}.tasks.jsonl", "r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(sorted(line["id"] for line in lines), ["t0", "t1", "t2"])
+        self.assertTrue(all(len(line["spans"]) == 3 for line in lines))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import structure
+
+class ScannerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous_cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def tearDown(self):
+        os.chdir(self.previous_cwd)
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        with open(name, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def scan(self):
+        """
+        Runs the scanner and returns the names of the files it read (rather than reused) and the contents section.
+        """
+        read = []
+        def read_block(filepath, size):
+            read.append(os.path.basename(filepath))
+            return original(filepath, size)
+        original = structure.read_block
+        with mock.patch.object(structure, "read_block", read_block), mock.patch("builtins.print"):
+            structure.main()
+        with open(structure.OUTPUT_FILENAME, "r", encoding="utf-8") as f:
+            # The tree lists the previous scan's output files too, so only the contents are compared.
+            return sorted(read), f.read().split("==== TEXT FILE CONTENTS ====", 1)[1]
+
+    def test_rerun_only_reads_changed_files(self):
+        os.mkdir("docs")
+        self.write("a.py", "print('a')\n")
+        self.write("b.md", "# B\n")
+        self.write(os.path.join("docs", "c.txt"), "notes\n")
+        read, first = self.scan()
+        self.assertEqual(read, ["a.py", "b.md", "c.txt"])
+
+        read, second = self.scan()
+        self.assertEqual(read, [])
+        self.assertEqual(second, first)
+
+        self.write("b.md", "# B, revised\n")
+        stat = os.stat("b.md")
+        os.utime("b.md", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        read, third = self.scan()
+        self.assertEqual(read, ["b.md"])
+        self.assertIn("# B, revised", third)
+        self.assertEqual(third.replace("# B, revised", "# B"), first)
+
+    def test_files_after_the_total_limit_are_skipped(self):
+        self.write("a.txt", "a" * 60)
+        self.write("b.txt", "b" * 50)
+        self.write("c.txt", "c" * 10)
+        with mock.patch.object(structure, "MAX_TOTAL_BYTES", 100):
+            read, output = self.scan()
+        # c.txt would still fit after b.txt overflowed, but everything after the first overflow is skipped.
+        self.assertEqual(read, ["a.txt"])
+        self.assertIn("a" * 60, output)
+        self.assertNotIn("c" * 10, output)
+        self.assertEqual(output.count("[skipped: total size limit of 100 bytes reached]"), 2)
+
+if __name__ == "__main__":
+    unittest.main()
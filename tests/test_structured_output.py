@@ -0,0 +1,25 @@
+import os
+import unittest
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+from structured_output import repair_json, parse_json
+
+class RepairJsonTest(unittest.TestCase):
+    def test_python_literals_and_trailing_commas(self):
+        self.assertEqual(repair_json('{"a": True, "b": None, "c": [1, 2,],}'), '{"a": true, "b": null, "c": [1, 2]}')
+
+    def test_truncated_reply_is_closed(self):
+        self.assertEqual(parse_json('```json\n{"final_answer": "42", "steps": ["a"'), {"final_answer": "42", "steps": ["a"]})
+
+    def test_non_ascii_bare_word(self):
+        # A bare non-ASCII word used to crash the repair with AttributeError instead of failing to parse.
+        self.assertEqual(repair_json('{"a": ñandú}'), '{"a": ñandú}')
+        with self.assertRaises(ValueError):
+            parse_json('{"a": ñandú}', "test")
+
+    def test_non_ascii_letters_next_to_literals(self):
+        self.assertEqual(repair_json('[Trueé, True]'), '[Trueé, true]')
+
+if __name__ == "__main__":
+    unittest.main()
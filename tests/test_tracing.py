@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+import main
+from tracing import Tracer, tracer
+
+class TracedManager:
+    def process_complex_task(self, complex_task, task_id=None):
+        with tracer.span("subtask", subtask_id="1", dependencies=[]):
+            pass
+        return f"Answer to {complex_task}"
+
+class TracerTest(unittest.TestCase):
+    def test_critical_path_stays_within_one_run(self):
+        trace = Tracer()
+        # Two concurrent runs reuse subtask ID 1; run "a"'s subtask 2 depends on its own subtask 1.
+        with trace.span("task", task_id="a"):
+            a1 = trace.start_span("subtask", subtask_id="1", dependencies=[])
+            a2 = trace.start_span("subtask", subtask_id="2", dependencies=["1"])
+        with trace.span("task", task_id="b"):
+            b1 = trace.start_span("subtask", subtask_id="1", dependencies=[])
+        for span in (a1, b1, a2):
+            trace.finish_span(span)
+        self.assertEqual(trace.critical_path(), [a1, a2])
+
+    def test_batch_tasks_leave_the_tracer(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.object(main, "TRACE_OUTPUT", os.path.join(directory, "trace")):
+            tracer.reset()
+            record = main.run_task(TracedManager(), "t1", "Task")
+            self.assertEqual(record["status"], "ok")
+            self.assertEqual(tracer.finished_spans(), [])
+            self.assertTrue(os.path.exists(os.path.join(directory, "trace.tasks.jsonl")))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,260 @@
+import json
+import time
+import asyncio
+import functools
+import itertools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from config import MODEL_PRICES
+
+_current_span = ContextVar("current_span", default=None)
+_current_subtask = ContextVar("current_subtask", default=None)
+
+def _lane():
+    """
+    Identifies the timeline a span runs on: the asyncio task under the async engine, the thread otherwise.
+    """
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return ("task", id(task)) if task is not None else ("thread", threading.get_ident())
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """
+    USD cost of a call from MODEL_PRICES, matching the longest model-name prefix (dated snapshots
+    share their base model's price). Unknown models cost 0.
+    """
+    matches = [name for name in MODEL_PRICES if model and model.startswith(name)]
+    if not matches:
+        return 0.0
+    prompt_price, completion_price = MODEL_PRICES[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+class Span:
+    def __init__(self, span_id, name, category, parent, attributes):
+        self.id = span_id
+        self.name = name
+        self.category = category
+        self.parent_id = parent.id if parent is not None else None
+        self.root_id = parent.root_id if parent is not None else span_id
+        self.subtask_id = attributes.pop("subtask_id", None) or _current_subtask.get()
+        self.attributes = attributes
+        self.lane = _lane()
+        self.start = time.perf_counter()
+        self.end = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def to_dict(self, origin):
+        return {
+            "id": self.id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "category": self.category,
+            "subtask_id": self.subtask_id,
+            "start": round(self.start - origin, 6),
+            "duration": round(self.duration, 6),
+            "attributes": self.attributes,
+        }
+
+class Tracer:
+    """
+    Records spans for every LLM call and scheduler phase of a run.
+    Spans nest through context variables, so phases opened in the manager become the parents of the
+    LLM calls made underneath them, on worker threads (when submitted with contextvars.copy_context)
+    and asyncio tasks alike. Traces export as plain JSON or Chrome trace format (chrome://tracing,
+    Perfetto), and summary() reports the critical path and the top token consumers.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.spans = []
+            self.origin = time.perf_counter()
+            self.epoch = time.time()
+
+    def start_span(self, name, category="phase", **attributes):
+        """
+        Opens a span without making it the current one (for generators that yield across contexts).
+        """
+        return Span(next(self.ids), name, category, _current_span.get(), attributes)
+
+    def finish_span(self, span):
+        span.end = time.perf_counter()
+        with self.lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name, category="phase", **attributes):
+        """
+        Context manager recording a span; passing subtask_id makes it the subtask of nested spans.
+        """
+        span = self.start_span(name, category, **attributes)
+        span_token = _current_span.set(span)
+        subtask_token = _current_subtask.set(span.subtask_id)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=f"{e.__class__.__name__}: {e}")
+            raise
+        finally:
+            _current_subtask.reset(subtask_token)
+            _current_span.reset(span_token)
+            self.finish_span(span)
+
+    def traced(self, name, attributes=None):
+        """
+        Decorator recording a span around every call of a function or coroutine function.
+        `attributes`, if given, is called with the same arguments and returns the span attributes.
+        """
+        def decorator(function):
+            if asyncio.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name, **(attributes(*args, **kwargs) if attributes else {})):
+                        return await function(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **(attributes(*args, **kwargs) if attributes else {})):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def finished_spans(self):
+        with self.lock:
+            return list(self.spans)
+
+    def take_run(self, root):
+        """
+        Removes and returns the finished spans recorded under `root` (itself included), so a long-running
+        process can report each task's trace once it is done instead of keeping every task's spans.
+        """
+        with self.lock:
+            taken = [span for span in self.spans if span.root_id == root.id]
+            self.spans = [span for span in self.spans if span.root_id != root.id]
+        return taken
+
+    # ---------------------------
+    # Export
+    # ---------------------------
+
+    def to_json(self, spans=None):
+        spans = self.finished_spans() if spans is None else spans
+        return {
+            "started_at": self.epoch,
+            "spans": [span.to_dict(self.origin) for span in sorted(spans, key=lambda s: s.start)],
+        }
+
+    def to_chrome_trace(self):
+        lanes = {}
+        events = []
+        for span in sorted(self.finished_spans(), key=lambda s: s.start):
+            tid = lanes.setdefault(span.lane, len(lanes) + 1)
+            args = dict(span.attributes)
+            if span.subtask_id is not None:
+                args["subtask_id"] = span.subtask_id
+            events.append({
+                "name": span.name if span.category != "llm" else f"llm:{span.attributes.get('call_site', '')}",
+                "cat": span.category,
+                "ph": "X",
+                "ts": round((span.start - self.origin) * 1e6),
+                "dur": round(span.duration * 1e6),
+                "pid": 1,
+                "tid": tid,
+                "args": args,
+            })
+        for (kind, _), tid in lanes.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": f"{kind} {tid}"}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, prefix):
+        """
+        Writes <prefix>.json (spans) and <prefix>.chrome.json (Chrome trace format).
+        """
+        with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2, default=str)
+        with open(f"{prefix}.chrome.json", "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+        return f"{prefix}.json", f"{prefix}.chrome.json"
+
+    def append_run(self, path, run_id, spans):
+        """
+        Appends one task's spans (from take_run) to a JSONL file, one line per task.
+        """
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"id": run_id, **self.to_json(spans)}, default=str) + "\n")
+
+    # ---------------------------
+    # Summary
+    # ---------------------------
+
+    def critical_path(self, spans=None):
+        """
+        Walks back from the subtask that finished last through whichever dependency finished last.
+        Returns the list of subtask spans on that chain, in execution order. Subtasks are keyed by the
+        run they belong to as well, since concurrent complex tasks reuse the same subtask IDs.
+        """
+        spans = self.finished_spans() if spans is None else spans
+        subtasks = {(span.root_id, span.subtask_id): span for span in spans if span.name == "subtask"}
+        if not subtasks:
+            return []
+        chain = []
+        current = max(subtasks.values(), key=lambda s: s.end)
+        while current is not None:
+            chain.append(current)
+            dependencies = [subtasks[(current.root_id, dep)] for dep in current.attributes.get("dependencies", [])
+                            if (current.root_id, dep) in subtasks]
+            current = max(dependencies, key=lambda s: s.end) if dependencies else None
+        return list(reversed(chain))
+
+    def summary(self, top=5, spans=None):
+        spans = self.finished_spans() if spans is None else spans
+        if not spans:
+            return "[Trace] no spans recorded"
+        wall = max(span.end for span in spans) - min(span.start for span in spans)
+        llm_spans = [span for span in spans if span.category == "llm"]
+        cost = sum(span.attributes.get("cost", 0.0) for span in llm_spans)
+        lines = [f"[Trace] {len(spans)} spans, {len(llm_spans)} LLM calls, {wall:.2f}s wall clock, ${cost:.4f} estimated cost"]
+
+        phases = {}
+        for span in spans:
+            if span.category == "phase" and span.name != "subtask":
+                total = phases.setdefault(span.name, [0, 0.0])
+                total[0] += 1
+                total[1] += span.duration
+        for name, (count, seconds) in sorted(phases.items(), key=lambda item: -item[1][1]):
+            lines.append(f"[Trace] phase {name}: {count} spans, {seconds:.2f}s total")
+
+        chain = self.critical_path(spans)
+        if chain:
+            steps = " -> ".join(f"{span.subtask_id} ({span.duration:.2f}s)" for span in chain)
+            lines.append(f"[Trace] critical path: {steps}")
+
+        def tokens(span):
+            return span.attributes.get("prompt_tokens", 0) + span.attributes.get("completion_tokens", 0)
+
+        by_call_site, by_subtask = {}, {}
+        for span in llm_spans:
+            site = span.attributes.get("call_site", "default")
+            by_call_site[site] = by_call_site.get(site, 0) + tokens(span)
+            if span.subtask_id is not None:
+                by_subtask[span.subtask_id] = by_subtask.get(span.subtask_id, 0) + tokens(span)
+        for label, totals in (("call site", by_call_site), ("subtask", by_subtask)):
+            ranked = sorted(totals.items(), key=lambda item: -item[1])[:top]
+            if ranked:
+                lines.append(f"[Trace] top token consumers by {label}: " + ", ".join(f"{name} ({count})" for name, count in ranked))
+        return "\n".join(lines)
+
+tracer = Tracer()
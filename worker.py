@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import WORKER_BROKER, WORKER_CAPACITY, WORKER_HEARTBEAT_INTERVAL
+from broker import connect, ProtocolError
+from request_pool import request_pool
+from main import load_execution_nodes
+
+# ---------------------------
+# Execution worker
+# ---------------------------
+# Hosts execution nodes in a separate process (or on another host) and serves the manager's broker:
+#   python worker.py --broker tcp://127.0.0.1:7400 --nodes Node_A,Node_B --capacity 4
+# The worker registers its nodes, pulls jobs whenever it has a free slot, runs them with the nodes'
+# normal process_task through its own request pool, and sends heartbeats. It reconnects if the
+# broker goes away; results of jobs that were running at the time are dropped (the broker reassigns them).
+
+class Worker:
+    def __init__(self, address, nodes, capacity=WORKER_CAPACITY, worker_id=None, heartbeat_interval=WORKER_HEARTBEAT_INTERVAL):
+        self.address = address
+        self.nodes = {node.name: node for node in nodes}
+        self.capacity = capacity
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.executor = ThreadPoolExecutor(max_workers=capacity, thread_name_prefix="worker")
+        self.lock = threading.Lock()
+        self.active = 0
+        self.completed = 0
+        self.stopped = threading.Event()
+
+    def run(self, reconnect_delay=2.0):
+        while not self.stopped.is_set():
+            try:
+                self._session()
+            except (OSError, ValueError, ProtocolError) as e:
+                print(f"[Worker] Connection to {self.address} failed: {e}")
+            if not self.stopped.wait(reconnect_delay):
+                print(f"[Worker] Reconnecting to {self.address}...")
+
+    def stop(self):
+        self.stopped.set()
+
+    def _session(self):
+        connection = connect(self.address)
+        session_ended = threading.Event()
+        try:
+            connection.send({
+                "type": "register",
+                "worker": self.worker_id,
+                "capacity": self.capacity,
+                "nodes": [
+                    {"name": node.name, "description": node.description, "reputation_score": node.reputation_score}
+                    for node in self.nodes.values()
+                ],
+            })
+            reply = connection.receive()
+            if not reply or reply.get("type") != "registered":
+                raise ProtocolError("registration was not acknowledged")
+            self.worker_id = reply["worker"]
+            interval = reply.get("heartbeat_interval", self.heartbeat_interval)
+            print(f"[Worker] Registered as {self.worker_id} with nodes {list(self.nodes)}")
+            threading.Thread(target=self._heartbeat, args=(connection, session_ended, interval), daemon=True).start()
+            with self.lock:
+                free_slots = self.capacity - self.active
+            if free_slots > 0:
+                connection.send({"type": "pull", "slots": free_slots})
+            while not self.stopped.is_set():
+                message = connection.receive()
+                if message is None:
+                    print("[Worker] The broker closed the connection.")
+                    return
+                if message.get("type") == "job":
+                    with self.lock:
+                        self.active += 1
+                    self.executor.submit(self._run_job, connection, message)
+        finally:
+            session_ended.set()
+            connection.close()
+
+    def _heartbeat(self, connection, session_ended, interval):
+        while not session_ended.wait(interval):
+            try:
+                connection.send({"type": "heartbeat"})
+            except OSError:
+                return
+
+    def _run_job(self, connection, message):
+        node = self.nodes.get(message["node"])
+        try:
+            if node is None:
+                raise KeyError(f"node {message['node']} is not hosted by this worker")
+            reply = {"type": "result", "job": message["job"], "result": node.process_task(**message["args"])}
+        except Exception as e:
+            reply = {"type": "error", "job": message["job"], "error": f"{e.__class__.__name__}: {e}"}
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.completed += 1
+        try:
+            connection.send(reply)
+            connection.send({"type": "pull", "slots": 1})
+        except (OSError, ProtocolError) as e:
+            print(f"[Worker] Could not return job {message['job']}: {e}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run execution nodes as a worker of a Hive-Mind broker.")
+    parser.add_argument("--broker", default=WORKER_BROKER, help='Broker address, "tcp://host:port" or "unix:/path/to.sock".')
+    parser.add_argument("--nodes", help="Comma-separated node names to host (default: every node in the nodes file).")
+    parser.add_argument("--nodes-file", default="execution_nodes.json", help="JSON file describing the execution nodes.")
+    parser.add_argument("--capacity", type=int, default=WORKER_CAPACITY, help="Jobs run at once.")
+    parser.add_argument("--id", help="Worker ID reported to the broker (default: <hostname>-<pid>).")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not args.broker:
+        sys.exit("No broker address: pass --broker or set WORKER_BROKER in config.py.")
+    nodes = load_execution_nodes(args.nodes_file)
+    if args.nodes:
+        names = set(args.nodes.split(","))
+        nodes = [node for node in nodes if node.name in names]
+        missing = names - {node.name for node in nodes}
+        if missing:
+            sys.exit(f"Unknown node(s) in {args.nodes_file}: {sorted(missing)}")
+    worker = Worker(args.broker, nodes, args.capacity, args.id)
+    started = time.monotonic()
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+    print(f"\n[Worker] {worker.completed} jobs completed in {time.monotonic() - started:.0f}s")
+    print(request_pool.report())
+
+if __name__ == "__main__":
+    main()